@@ -1,29 +1,185 @@
+import copy
 import json
 import os
 import sqlite3
+import threading
+from bisect import bisect_right
+from datetime import date
+
+import numpy as np
+
+from cache_utils import LRUCache
+from log_utils import get_logger
+
+logger = get_logger("analytics")
 
 # Caminho para o arquivo de configuração
 CONFIG_FILE = 'config.json'
 
+# Quantidade máxima de perfis de usuário mantidos em memória
+PROFILE_CACHE_SIZE = 4096
+
+# Janelas (em dias corridos) das médias móveis e percentis dos valores diários
+ROLLING_WINDOWS = (7, 30)
+DAILY_PERCENTILES = (50, 90)
+
+
+def _round_like_python(values, ndigits=2):
+    """
+    Arredonda um array NumPy com exatamente o mesmo resultado do round() do Python.
+    np.round multiplica por 10**ndigits antes de arredondar e pode divergir do round()
+    quando o valor está colado em um empate (...5); nesses poucos casos usamos o round() nativo.
+    """
+    scale = 10.0 ** ndigits
+    scaled = values * scale
+    rounded = np.rint(scaled) / scale
+
+    fraction = np.abs(scaled - np.trunc(scaled))
+    ambiguous = np.abs(fraction - 0.5) < 1e-6
+    if ambiguous.any():
+        rounded[ambiguous] = [round(value, ndigits) for value in values[ambiguous].tolist()]
+    return rounded
+
+
+def _derive_config_values(config):
+    """
+    Pré-calcula os valores usados nos cálculos a partir do config (uma vez por alteração),
+    evitando os .get() aninhados e o .upper() do tipo de combustível a cada chamada.
+    """
+    veiculo = config.get('VEICULO', {})
+    custos = config.get('CUSTOS', {})
+    # Usamos 0.0 como default para garantir que não haja divisão por zero
+    tipo = veiculo.get('TIPO_COMBUSTIVEL', 'N/A')
+    fixo_diario = custos.get('CUSTO_FIXO_DIARIO', 0.0)
+    return {
+        "consumo": veiculo.get('CONSUMO_MEDIO_KM_L', 0.0),
+        "preco": custos.get('PRECO_COMBUSTIVEL_L', 0.0),
+        "tipo": tipo,
+        "eletrico": tipo.upper() in ('ELÉTRICO', 'ELETRICO'),
+        "fixo_diario": fixo_diario,
+        # Converte o valor diário para semanal para exibir
+        "fixo_semanal": round(fixo_diario * 7, 2)
+    }
+
+
+class CostTimeline:
+    """
+    Intervalos de custos de um usuário com data de vigência, ordenados pela data de início.
+    A busca do intervalo vigente em uma data usa bisect: O(log n) no número de intervalos.
+    """
+
+    def __init__(self, intervals=()):
+        # intervals: [(vigente_desde, valores derivados), ...]
+        ordered = sorted(intervals, key=lambda interval: interval[0])
+        self.starts = [start for start, _ in ordered]
+        self.values = [values for _, values in ordered]
+
+    def index_for(self, data):
+        """Índice do intervalo vigente na data (AAAA-MM-DD), ou -1 se ela for anterior a todos."""
+        return bisect_right(self.starts, data) - 1
+
+    def values_for(self, data):
+        """Valores vigentes na data, ou None se a data for anterior ao primeiro intervalo."""
+        index = self.index_for(data)
+        return self.values[index] if index >= 0 else None
+
+
 class AnalyticsManager:
     """
     Responsável por carregar configurações e realizar todos os cálculos de 
     desempenho e custos baseados nos dados brutos do log diário.
     """
     
-    def __init__(self):
+    def __init__(self, history_loader=None, profile_cache_size=PROFILE_CACHE_SIZE):
+        # history_loader(user_id) retorna os intervalos de custos do usuário, no formato
+        # [(vigente_desde, perfil no formato do config.json), ...] (ex: DatabaseManager.get_cost_history)
+        self._history_loader = history_loader
+        self._profiles = LRUCache(profile_cache_size)
+
+        self._config_lock = threading.Lock()
+        self._config_stamp = None # (mtime, tamanho) do config.json carregado
         self.config = self._load_config()
+        self._config_stamp = self._read_config_stamp()
+
+    # --- CACHE DA CONFIGURAÇÃO ---
+
+    @property
+    def config(self):
+        """Configuração atual. O JSON só é relido quando o arquivo muda (mtime/tamanho)."""
+        self._refresh_config()
+        return self._config
+
+    @config.setter
+    def config(self, new_config):
+        self._config = new_config
+        self._values = _derive_config_values(new_config)
+
+    @property
+    def values(self):
+        """Valores derivados da configuração atual (consumo, preço, tipo, eletrico, fixo diário/semanal)."""
+        self._refresh_config()
+        return self._values
+
+    def _read_config_stamp(self):
+        """Retorna (mtime_ns, tamanho) do config.json, ou None se ele não existir."""
+        try:
+            stat = os.stat(CONFIG_FILE)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh_config(self):
+        """Recarrega o config.json apenas se ele mudou desde a última leitura."""
+        stamp = self._read_config_stamp()
+        if stamp == self._config_stamp:
+            return
+        with self._config_lock:
+            if stamp == self._config_stamp:
+                return
+            self.config = self._load_config()
+            self._config_stamp = stamp
+
+    # --- PERFIS POR USUÁRIO ---
+
+    def get_user_timeline(self, user_id):
+        """
+        Retorna o CostTimeline do usuário. O histórico é lido do banco apenas na primeira
+        vez e fica no cache LRU até ser invalidado.
+        """
+        timeline = self._profiles.get(user_id)
+        if timeline is None:
+            intervals = self._history_loader(user_id) if self._history_loader else []
+            timeline = CostTimeline(
+                (start, _derive_config_values(profile)) for start, profile in intervals
+            )
+            self._profiles.put(user_id, timeline)
+        return timeline
+
+    def get_user_values(self, user_id, data=None):
+        """
+        Retorna os valores de custo do usuário vigentes na data (padrão: hoje), no mesmo
+        formato de `values`. Datas sem perfil do usuário usam a configuração global.
+        """
+        if user_id is None or self._history_loader is None:
+            return self.values
+
+        data = data or date.today().isoformat()
+        return self.get_user_timeline(user_id).values_for(data) or self.values
+
+    def invalidate_user_values(self, user_id):
+        """Descarta o histórico de custos do usuário do cache (chamar após alterá-lo no banco)."""
+        self._profiles.invalidate(user_id)
 
     def _load_config(self):
         """Carrega e retorna os dados do arquivo config.json."""
         if not os.path.exists(CONFIG_FILE):
-            print(f"ERRO: Arquivo de configuração '{CONFIG_FILE}' não encontrado.")
+            logger.error("ERRO: Arquivo de configuração não encontrado.", extra={"arquivo": CONFIG_FILE})
             return {}
         try:
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except json.JSONDecodeError as e:
-            print(f"ERRO: Formato inválido no arquivo JSON: {e}")
+            logger.error("ERRO: Formato inválido no arquivo JSON: %s", e)
             return {}
         except KeyError:
             # Garante que as chaves de topo existam, mesmo que vazias
@@ -32,29 +188,36 @@ class AnalyticsManager:
     
     def _save_config(self, new_consumption, new_price, new_type, new_fixed_daily_cost):
         """Salva as novas configurações de combustível e custos fixos diários no config.json."""
+        # Trabalha numa cópia: o cache só muda se o arquivo for gravado com sucesso
+        new_config = copy.deepcopy(self.config)
+
         # Se as chaves VEICULO ou CUSTOS não existirem, cria
-        if 'VEICULO' not in self.config: self.config['VEICULO'] = {}
-        if 'CUSTOS' not in self.config: self.config['CUSTOS'] = {}
+        if 'VEICULO' not in new_config: new_config['VEICULO'] = {}
+        if 'CUSTOS' not in new_config: new_config['CUSTOS'] = {}
+
+        new_config['VEICULO']['CONSUMO_MEDIO_KM_L'] = new_consumption
+        new_config['VEICULO']['TIPO_COMBUSTIVEL'] = new_type
+        new_config['CUSTOS']['PRECO_COMBUSTIVEL_L'] = new_price
+        new_config['CUSTOS']['CUSTO_FIXO_DIARIO'] = new_fixed_daily_cost
 
-        self.config['VEICULO']['CONSUMO_MEDIO_KM_L'] = new_consumption
-        self.config['VEICULO']['TIPO_COMBUSTIVEL'] = new_type
-        self.config['CUSTOS']['PRECO_COMBUSTIVEL_L'] = new_price
-        self.config['CUSTOS']['CUSTO_FIXO_DIARIO'] = new_fixed_daily_cost 
-        
         try:
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, indent=4)
-            self.config = self._load_config()
+            with self._config_lock:
+                with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+                    json.dump(new_config, f, indent=4)
+                # Já sabemos o conteúdo gravado: atualiza o cache sem reler o arquivo
+                self.config = new_config
+                self._config_stamp = self._read_config_stamp()
             return True
         except Exception as e:
-            print(f"ERRO ao salvar as configurações no JSON: {e}")
+            logger.error("ERRO ao salvar as configurações no JSON: %s", e)
             return False
 
     # --- FUNÇÕES DE CÁLCULO DENTRO DA CLASSE ---
 
-    def calculate_performance_metrics(self, km_rodados, faturamento_total, horas_trabalhadas):
+    def calculate_performance_metrics(self, km_rodados, faturamento_total, horas_trabalhadas, values=None):
         """
         Calcula as métricas de performance e o Lucro Líquido Real (subtraindo Combustível e Custo Fixo Diário).
+        `values` são os valores de configuração a usar (ex: get_user_values); por padrão, a configuração global.
         """
         metrics = {
             "reais_por_km": 0.0,
@@ -64,12 +227,11 @@ class AnalyticsManager:
             "lucro_liquido": 0.0 
         }
 
-        # 1. Obter dados de configuração
-        # Usamos 0.0 como default para garantir que não haja divisão por zero
-        consumo_km_l = self.config.get('VEICULO', {}).get('CONSUMO_MEDIO_KM_L', 0.0)
-        preco_combustivel = self.config.get('CUSTOS', {}).get('PRECO_COMBUSTIVEL_L', 0.0)
-        custo_fixo_diario = self.config.get('CUSTOS', {}).get('CUSTO_FIXO_DIARIO', 0.0) 
-        tipo_combustivel = self.config.get('VEICULO', {}).get('TIPO_COMBUSTIVEL', 'N/A')
+        # 1. Obter dados de configuração (pré-calculados a cada alteração do config)
+        values = values or self.values
+        consumo_km_l = values["consumo"]
+        preco_combustivel = values["preco"]
+        custo_fixo_diario = values["fixo_diario"]
 
         # 2. Reais por Km e Reais por Hora (Cálculo Básico)
         if km_rodados > 0:
@@ -78,7 +240,7 @@ class AnalyticsManager:
             metrics["reais_por_hora"] = round(faturamento_total / horas_trabalhadas, 2)
 
         # 3. Custo Estimado de Combustível (Condicional para Elétrico)
-        if tipo_combustivel.upper() not in ('ELÉTRICO', 'ELETRICO'):
+        if not values["eletrico"]:
             if km_rodados > 0 and consumo_km_l > 0:
                 metrics["litros_gastos"] = km_rodados / consumo_km_l
                 metrics["custo_combustivel_estimado"] = round(metrics["litros_gastos"] * preco_combustivel, 2)
@@ -91,7 +253,154 @@ class AnalyticsManager:
 
         return metrics
     
-    def calculate_overall_metrics(self, all_logs):
+    def calculate_performance_metrics_batch(self, km_rodados, faturamento_total=None, horas_trabalhadas=None, values=None):
+        """
+        Versão vetorizada de calculate_performance_metrics: calcula as métricas de todos
+        os dias de uma vez. Recebe três sequências/arrays (km, faturamento, horas) ou um
+        DataFrame com as colunas km_rodados, faturamento_total e horas_trabalhadas.
+
+        Retorna um dicionário com as mesmas chaves do método escalar, cada uma com um
+        array NumPy (um valor por dia), arredondado exatamente como no método escalar.
+        `values` tem o mesmo significado que em calculate_performance_metrics.
+        """
+        if faturamento_total is None and hasattr(km_rodados, 'columns'):
+            frame = km_rodados
+            km_rodados = frame['km_rodados']
+            faturamento_total = frame['faturamento_total']
+            horas_trabalhadas = frame['horas_trabalhadas']
+
+        km = np.asarray(km_rodados, dtype=float)
+        fat = np.asarray(faturamento_total, dtype=float)
+        hrs = np.asarray(horas_trabalhadas, dtype=float)
+
+        # 1. Obter dados de configuração (uma única vez para todos os dias)
+        values = values or self.values
+        consumo_km_l = values["consumo"]
+        preco_combustivel = values["preco"]
+        custo_fixo_diario = values["fixo_diario"]
+
+        reais_por_km = np.zeros(km.shape)
+        reais_por_hora = np.zeros(km.shape)
+        litros_gastos = np.zeros(km.shape)
+        custo_combustivel = np.zeros(km.shape)
+
+        # 2. Reais por Km e Reais por Hora (apenas onde o divisor é positivo)
+        with_km = km > 0
+        reais_por_km[with_km] = _round_like_python(fat[with_km] / km[with_km])
+        with_hours = hrs > 0
+        reais_por_hora[with_hours] = _round_like_python(fat[with_hours] / hrs[with_hours])
+
+        # 3. Custo Estimado de Combustível (zero para carro elétrico)
+        if not values["eletrico"] and consumo_km_l > 0:
+            litros_gastos[with_km] = km[with_km] / consumo_km_l
+            custo_combustivel[with_km] = _round_like_python(litros_gastos[with_km] * preco_combustivel)
+
+        # 4. LUCRO LÍQUIDO REAL
+        lucro_liquido = _round_like_python(fat - custo_combustivel - custo_fixo_diario)
+
+        return {
+            "reais_por_km": reais_por_km,
+            "reais_por_hora": reais_por_hora,
+            "custo_combustivel_estimado": custo_combustivel,
+            "litros_gastos": litros_gastos,
+            "lucro_liquido": lucro_liquido
+        }
+
+    def calculate_performance_metrics_by_date(self, user_id, datas, km_rodados, faturamento_total, horas_trabalhadas):
+        """
+        Calcula as métricas de cada dia com os custos vigentes NAQUELA data (histórico do
+        usuário), em vez dos valores de hoje. Agrupa os dias por intervalo de vigência e
+        usa a versão vetorizada em cada grupo.
+        Retorna as mesmas chaves de calculate_performance_metrics_batch e também
+        "custo_fixo" (custo fixo diário aplicado a cada dia).
+        """
+        km = np.asarray(km_rodados, dtype=float)
+        fat = np.asarray(faturamento_total, dtype=float)
+        hrs = np.asarray(horas_trabalhadas, dtype=float)
+
+        timeline = self.get_user_timeline(user_id) if user_id is not None and self._history_loader else CostTimeline()
+        indexes = np.fromiter((timeline.index_for(data) for data in datas), dtype=int, count=len(km))
+
+        result = None
+        custo_fixo = np.zeros(km.shape)
+        for index in np.unique(indexes):
+            group = indexes == index
+            values = timeline.values[index] if index >= 0 else self.values
+            partial = self.calculate_performance_metrics_batch(km[group], fat[group], hrs[group], values)
+            if result is None:
+                result = {key: np.zeros(km.shape) for key in partial}
+            for key, column in partial.items():
+                result[key][group] = column
+            custo_fixo[group] = values["fixo_diario"]
+
+        if result is None:
+            result = self.calculate_performance_metrics_batch(km, fat, hrs)
+        result["custo_fixo"] = custo_fixo
+        return result
+
+    def calculate_rolling_metrics(self, datas, km_rodados, faturamento_total, horas_trabalhadas, lucro_liquido,
+                                  windows=ROLLING_WINDOWS, percentiles=DAILY_PERCENTILES):
+        """
+        Estatísticas móveis por dia registrado: para cada janela de `w` dias corridos terminando
+        na data do log (folgas contam como dias sem valores), R$/km e R$/hora da janela (somas
+        de faturamento / somas de km e horas), lucro líquido somado e dias trabalhados.
+
+        As somas saem de um acumulado por dia do calendário (bincount + cumsum): cada janela é
+        a diferença de dois acumulados, então todas as janelas custam O(n + dias do período),
+        sem somar cada janela de novo. Os logs podem vir em qualquer ordem, e `datas` pode ser
+        uma sequência de textos AAAA-MM-DD ou um array datetime64 (ex.: de um snapshot).
+
+        Retorna {"datas": [...] (ordem crescente), "janelas": {w: {métrica: array}},
+        "percentis": {"faturamento": {"p50": ...}, "lucro_liquido": {...}}}, ou None sem logs.
+        """
+        if not len(datas):
+            return None
+
+        dates = np.asarray(datas, dtype="datetime64[D]")
+        order = np.argsort(dates, kind="stable")
+        dates = dates[order]
+        days = dates.astype(np.int64)
+        series = {
+            "km": np.asarray(km_rodados, dtype=float)[order],
+            "fat": np.asarray(faturamento_total, dtype=float)[order],
+            "horas": np.asarray(horas_trabalhadas, dtype=float)[order],
+            "lucro": np.asarray(lucro_liquido, dtype=float)[order],
+            "dias": np.ones(len(days)),
+        }
+
+        # Acumulado até cada dia do calendário: cumulative[k][d + 1] = soma dos dias <= first + d
+        offsets = days - days[0]
+        span = int(offsets[-1]) + 1
+        cumulative = {
+            key: np.concatenate(([0.0], np.cumsum(np.bincount(offsets, weights=values, minlength=span))))
+            for key, values in series.items()
+        }
+
+        result = {"datas": np.datetime_as_string(dates).tolist(), "janelas": {}}
+        for window in windows:
+            end = offsets + 1
+            start = np.maximum(end - window, 0)
+            sums = {key: cum[end] - cum[start] for key, cum in cumulative.items()}
+            reais_por_km = np.zeros(len(days))
+            reais_por_hora = np.zeros(len(days))
+            with_km = sums["km"] > 0
+            reais_por_km[with_km] = sums["fat"][with_km] / sums["km"][with_km]
+            with_hours = sums["horas"] > 0
+            reais_por_hora[with_hours] = sums["fat"][with_hours] / sums["horas"][with_hours]
+            result["janelas"][window] = {
+                "reais_por_km": _round_like_python(reais_por_km),
+                "reais_por_hora": _round_like_python(reais_por_hora),
+                "lucro_liquido": _round_like_python(sums["lucro"]),
+                "dias": np.rint(sums["dias"]).astype(int),
+            }
+
+        result["percentis"] = {
+            name: {f"p{pct}": round(float(value), 2) for pct, value in zip(percentiles, np.percentile(series[key], percentiles))}
+            for name, key in (("faturamento", "fat"), ("lucro_liquido", "lucro"))
+        }
+        return result
+
+    def calculate_overall_metrics(self, all_logs, values=None):
         """
         Calcula os totais e as métricas médias de performance de todos os logs fornecidos.
         Retorna um dicionário com os resultados.
@@ -100,10 +409,32 @@ class AnalyticsManager:
             return None
 
         # log[1] = km_rodados, log[2] = faturamento_total, log[3] = horas_trabalhadas
-        total_km = sum(log[1] for log in all_logs)
-        total_faturamento = sum(log[2] for log in all_logs)
-        total_horas = sum(log[3] for log in all_logs)
-        num_dias = len(all_logs)
+        total_km = total_faturamento = total_horas = 0.0
+        for log in all_logs:
+            total_km += log[1]
+            total_faturamento += log[2]
+            total_horas += log[3]
+
+        return self.calculate_overall_metrics_from_totals({
+            "total_dias": len(all_logs),
+            "total_km": total_km,
+            "total_faturamento": total_faturamento,
+            "total_horas": total_horas
+        }, values)
+
+    def calculate_overall_metrics_from_totals(self, totals, values=None):
+        """
+        Calcula as métricas gerais a partir de totais já agregados
+        (ex: DatabaseManager.get_log_totals), sem precisar percorrer os logs.
+        `totals` deve conter total_dias, total_km, total_faturamento e total_horas.
+        """
+        if not totals or not totals.get("total_dias"):
+            return None
+
+        total_km = totals["total_km"] or 0.0
+        total_faturamento = totals["total_faturamento"] or 0.0
+        total_horas = totals["total_horas"] or 0.0
+        num_dias = totals["total_dias"]
 
         metrics = {
             "total_dias": num_dias,
@@ -115,12 +446,12 @@ class AnalyticsManager:
 
         # Reutiliza a função calculate_performance_metrics para calcular as médias GERAIS
         overall_performance = self.calculate_performance_metrics(
-            total_km, total_faturamento, total_horas
+            total_km, total_faturamento, total_horas, values
         )
-        
+
         # O resultado será Reais/Km GERAL e Custo Estimado GERAL
         metrics["reais_por_km_medio"] = overall_performance["reais_por_km"]
         metrics["reais_por_hora_medio"] = overall_performance["reais_por_hora"]
         metrics["custo_total_estimado"] = overall_performance["custo_combustivel_estimado"]
 
-        return metrics
\ No newline at end of file
+        return metrics
@@ -0,0 +1,142 @@
+# api_async.py
+# Versão assíncrona do api_core para frontends asyncio (ex.: servidor HTTP assíncrono).
+#
+# As funções do api_core (que bloqueiam no sqlite3) rodam num executor de threads limitado:
+# o event loop nunca espera pelo banco. Cada worker abre a sua própria conexão, fora do pool do
+# api_core, então as chamadas não disputam conexões entre si nem com as demais threads.
+#
+# Toda função aceita `timeout` (segundos). Se estourar ou se a tarefa for cancelada, a consulta
+# em andamento na thread é interrompida (sqlite3 interrupt) e a chamada levanta
+# asyncio.TimeoutError / asyncio.CancelledError. Na thread, a consulta interrompida levanta
+# database_manager.QueryInterrupted, então o resultado incompleto nunca vai para o cache.
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import api_core
+from log_utils import get_logger
+
+logger = get_logger("api_async")
+
+# Threads que executam o trabalho de banco (cada uma com a sua conexão exclusiva)
+ASYNC_WORKERS = api_core.DB_POOL_SIZE
+
+# Chamadas aguardando um worker, por event loop; acima disso, quem chama espera a vez
+# (backpressure) em vez de enfileirar trabalho sem limite
+MAX_PENDING_CALLS = ASYNC_WORKERS * 16
+
+# Timeout padrão de cada chamada (segundos); None = sem limite
+DEFAULT_TIMEOUT = 30.0
+
+
+class BoundedExecutor:
+    """
+    Executor de threads com limite de chamadas pendentes por event loop e cancelamento
+    cooperativo: se quem aguarda desiste, a consulta SQLite da thread é interrompida.
+    Cada thread abre uma conexão exclusiva no `db_manager` ao iniciar, fechada em shutdown().
+    """
+
+    def __init__(self, workers=ASYNC_WORKERS, max_pending=MAX_PENDING_CALLS, db_manager=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.db_manager = db_manager or api_core.DB_MANAGER
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="ddl-async-db", initializer=self._start_worker
+        )
+        self._semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+        self._worker_threads = set()
+        self._lock = threading.Lock()
+
+    def _start_worker(self):
+        # Sem a conexão exclusiva (erro ao abrir), a thread usa o pool do db_manager
+        if self.db_manager.open_thread_connection():
+            with self._lock:
+                self._worker_threads.add(threading.get_ident())
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+        return semaphore
+
+    async def run(self, func, *args, timeout=DEFAULT_TIMEOUT, **kwargs):
+        """Executa func(*args, **kwargs) numa thread do executor e aguarda o resultado."""
+        loop = asyncio.get_running_loop()
+        # Preenchido pela thread quando a chamada começa a rodar. O lock impede que a thread
+        # termine esta chamada (e comece outra) entre a verificação e a interrupção.
+        worker = {"lock": threading.Lock()}
+
+        def call():
+            worker["thread_id"] = threading.get_ident()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with worker["lock"]:
+                    worker["done"] = True
+
+        async with self._semaphore():
+            future = loop.run_in_executor(self._executor, call)
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # Ainda na fila: wait_for já cancelou. Rodando: interrompe a consulta SQLite.
+                with worker["lock"]:
+                    thread_id = worker.get("thread_id")
+                    running = thread_id is not None and not worker.get("done")
+                    interrupted = running and self.db_manager.interrupt_thread(thread_id)
+                if interrupted:
+                    logger.warning("Consulta interrompida por timeout/cancelamento.", extra={"funcao": func.__name__})
+                raise
+
+    def shutdown(self, wait=True):
+        """
+        Encerra as threads do executor (as chamadas pendentes são canceladas) e fecha as suas
+        conexões. Com wait=False, as consultas ainda em andamento são interrompidas.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        with self._lock:
+            thread_ids, self._worker_threads = self._worker_threads, set()
+        for thread_id in thread_ids:
+            if not wait:
+                self.db_manager.interrupt_thread(thread_id)
+            self.db_manager.close_thread_connection(thread_id)
+
+
+EXECUTOR = BoundedExecutor()
+
+
+def _async_version(sync_func):
+    """Cria a versão assíncrona de uma função do api_core (mesmos argumentos + `timeout`)."""
+    @functools.wraps(sync_func)
+    async def wrapper(*args, timeout=DEFAULT_TIMEOUT, **kwargs):
+        return await EXECUTOR.run(sync_func, *args, timeout=timeout, **kwargs)
+    wrapper.__doc__ = f"Versão assíncrona de api_core.{sync_func.__name__}.\n\n{sync_func.__doc__ or ''}"
+    return wrapper
+
+
+# --- AUTENTICAÇÃO E USUÁRIOS ---
+
+verify_login = _async_version(api_core.verify_login_web)
+login = _async_version(api_core.login_web)
+register_user = _async_version(api_core.register_user_web)
+
+# --- LOGS E DADOS ---
+
+get_config = _async_version(api_core.get_config_for_display)
+update_config = _async_version(api_core.update_config_web)
+upsert_log = _async_version(api_core.upsert_log_web)
+upsert_logs_bulk = _async_version(api_core.upsert_logs_bulk_web)
+
+# --- RELATÓRIOS ---
+
+get_report = _async_version(api_core.get_report_web)
+get_report_summary = _async_version(api_core.get_report_summary_web)
+get_report_page = _async_version(api_core.get_report_page_web)
+get_weekly_summary = _async_version(api_core.get_weekly_summary_web)
+get_monthly_summary = _async_version(api_core.get_monthly_summary_web)
+get_rolling_stats = _async_version(api_core.get_rolling_stats_web)
+get_changes_since = _async_version(api_core.get_changes_since)
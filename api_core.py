@@ -1,18 +1,137 @@
 # api_core.py
+import atexit
+import csv
+import io
+import json
+import os
+import threading
+
+import numpy as np
+
 import database_manager
-from analytics import AnalyticsManager
+import fleet_analytics
+import instrumentation
+from analytics import ROLLING_WINDOWS, AnalyticsManager
+from cache_utils import LRUCache
+from instrumentation import KIND_API, instrumented
+from log_utils import get_logger
+from sessions import SessionManager
+from snapshot_store import SNAPSHOT_DIR_ENV, SnapshotStore
+from write_behind import WRITE_BEHIND_ENV, WriteBehindQueue
 from datetime import date
 
+logger = get_logger("api")
+
+# Tamanho do pool de conexões persistentes compartilhado pelas sessões web
+DB_POOL_SIZE = 5
+
+# Perfil de armazenamento do banco compartilhado pelas sessões (WAL: leituras não esperam escritas)
+DB_STORAGE_PROFILE = "concorrente"
+
+# Quantidade de dias por página no relatório paginado
+REPORT_PAGE_SIZE = 50
+# Maior página aceita (valores de `limit` fora de [1, MAX_REPORT_PAGE_SIZE] são ajustados)
+MAX_REPORT_PAGE_SIZE = 500
+
+# Maior quantidade de períodos (semanas ou meses) por resumo; `limit` fora de
+# [1, MAX_ROLLUP_PERIODS] é ajustado, e sem `limit` vêm os MAX_ROLLUP_PERIODS mais recentes
+MAX_ROLLUP_PERIODS = 520
+
+# Quantidade máxima de alterações por chamada ao feed (get_changes_since)
+CHANGE_FEED_PAGE_SIZE = 500
+
+# Cache de relatórios: quantidade de entradas e validade (segundos). O TTL limita o tempo que
+# um relatório fica desatualizado se o banco for alterado por outro processo (ex.: importer.py)
+REPORT_CACHE_SIZE = 512
+REPORT_CACHE_TTL = 300
+
+# Formatos da exportação do histórico e colunas de cada linha exportada (na ordem do CSV)
+EXPORT_FORMATS = ("csv", "jsonl")
+EXPORT_COLUMNS = ("data", "km", "fat", "horas", "custo_comb", "custo_fixo", "lucro_liquido")
+
+# Write-behind: espera máxima (segundos) pelos logs ainda no journal antes das gravações que não
+# podem ser sobrescritas por eles depois (lote de logs, perfil de custos)
+WRITE_BEHIND_FLUSH_TIMEOUT = 5.0
+
 # Inicializa os gerenciadores globais
-DB_MANAGER = database_manager.DatabaseManager()
-ANALYTICS_MANAGER = AnalyticsManager()
+DB_MANAGER = database_manager.DatabaseManager(pool_size=DB_POOL_SIZE, storage_profile=DB_STORAGE_PROFILE)
+# Históricos de custos por usuário: lidos do banco e mantidos num cache LRU em memória
+ANALYTICS_MANAGER = AnalyticsManager(history_loader=DB_MANAGER.get_cost_history)
+
+# Relatórios prontos por (função, user_id, versão dos dados, argumentos)
+REPORT_CACHE = LRUCache(REPORT_CACHE_SIZE, ttl=REPORT_CACHE_TTL)
+
+# Tokens de sessão assinados: requisições autenticadas não consultam o banco
+SESSIONS = SessionManager()
+
+# --- VERSÃO DOS DADOS (INVALIDAÇÃO DO CACHE DE RELATÓRIOS) ---
+
+# Versão dos dados de cada usuário: muda a cada gravação, e os relatórios em cache da versão
+# anterior deixam de ser encontrados (e saem do cache pelo LRU/TTL)
+_DATA_VERSIONS = {}
+# Versão da configuração global (config.json), usada por todos os usuários sem perfil próprio
+_GLOBAL_VERSION = 0
+_VERSION_LOCK = threading.Lock()
+_NOT_CACHED = object()
+
+def get_data_version(user_id):
+    """Versão atual dos dados do usuário (muda a cada log gravado ou configuração salva)."""
+    with _VERSION_LOCK:
+        return (_GLOBAL_VERSION, _DATA_VERSIONS.get(user_id, 0))
+
+def _bump_data_version(user_id=None):
+    """Invalida os relatórios do usuário; sem `user_id`, os de todos (configuração global)."""
+    global _GLOBAL_VERSION
+    with _VERSION_LOCK:
+        if user_id is None:
+            _GLOBAL_VERSION += 1
+        else:
+            _DATA_VERSIONS[user_id] = _DATA_VERSIONS.get(user_id, 0) + 1
+
+def _cached_report(name, user_id, args, compute):
+    """
+    Retorna o resultado em cache para a versão atual dos dados do usuário ou calcula e guarda.
+    O resultado é compartilhado entre as chamadas: quem o recebe não deve alterá-lo.
+    """
+    key = (name, user_id, get_data_version(user_id), args)
+    result = REPORT_CACHE.get(key, _NOT_CACHED)
+    if result is _NOT_CACHED:
+        result = compute()
+        REPORT_CACHE.put(key, result)
+    return result
 
 # --- AUTENTICAÇÃO E USUÁRIOS ---
 
+@instrumented(KIND_API)
 def verify_login_web(username, password):
     """Verifica login e retorna o user_id se for sucesso, ou None."""
-    return DB_MANAGER.verify_login(username, password)
+    user_id = DB_MANAGER.verify_login(username, password)
+    if user_id is None:
+        logger.info("Login recusado.", extra={"username": username})
+    return user_id
+
+@instrumented(KIND_API)
+def login_web(username, password):
+    """
+    Verifica o login e emite um token de sessão assinado.
+    Retorna {"token", "user_id"} ou None se as credenciais forem inválidas.
+    """
+    user_id = verify_login_web(username, password)
+    if user_id is None:
+        return None
+    return {"token": SESSIONS.issue(user_id), "user_id": user_id}
+
+@instrumented(KIND_API)
+def authenticate_web(token):
+    """Retorna o user_id de um token de sessão válido, ou None. Valida só em memória (HMAC)."""
+    return SESSIONS.validate(token)
+
+@instrumented(KIND_API)
+def logout_web(token):
+    """Revoga o token de sessão. Retorna False se ele já não era válido."""
+    return SESSIONS.revoke(token)
 
+@instrumented(KIND_API)
 def register_user_web(username, password):
     """Tenta registrar novo usuário. Retorna True/False."""
     if not username or not password:
@@ -21,31 +140,28 @@ def register_user_web(username, password):
 
 # --- LOGS E DADOS ---
 
+@instrumented(KIND_API)
 def get_config_for_display(user_id):
     """Retorna as configurações do usuário no formato de display (Semanal e Diário)."""
-    # Recarrega a config para garantir que é a mais recente
-    ANALYTICS_MANAGER.config = ANALYTICS_MANAGER._load_config() 
-    
-    current_config = ANALYTICS_MANAGER.config
-    current_consumo = current_config.get('VEICULO', {}).get('CONSUMO_MEDIO_KM_L', 0.0)
-    current_preco = current_config.get('CUSTOS', {}).get('PRECO_COMBUSTIVEL_L', 0.0)
-    current_tipo = current_config.get('VEICULO', {}).get('TIPO_COMBUSTIVEL', 'N/A')
-    current_fixed_daily = current_config.get('CUSTOS', {}).get('CUSTO_FIXO_DIARIO', 0.0)
-    
-    # Converte o valor diário para semanal para exibir
-    current_fixed_weekly = round(current_fixed_daily * 7, 2)
+    # Perfil vigente hoje (cache LRU) ou, se ele não tiver um, o config.json global
+    values = ANALYTICS_MANAGER.get_user_values(user_id)
 
     return {
-        "consumo": current_consumo,
-        "preco": current_preco,
-        "tipo": current_tipo,
-        "fixo_semanal": current_fixed_weekly,
-        "fixo_diario": current_fixed_daily
+        "consumo": values["consumo"],
+        "preco": values["preco"],
+        "tipo": values["tipo"],
+        "fixo_semanal": values["fixo_semanal"],
+        "fixo_diario": values["fixo_diario"]
     }
 
 
-def update_config_web(consumo, preco, tipo, aluguel_semanal):
-    """Atualiza as configurações e salva no JSON."""
+@instrumented(KIND_API)
+def update_config_web(consumo, preco, tipo, aluguel_semanal, user_id=None, vigente_desde=None):
+    """
+    Atualiza as configurações. Com `user_id`, salva no banco um novo perfil do usuário
+    válido a partir de `vigente_desde` (padrão: hoje); os dias anteriores mantêm os custos
+    da sua época. Sem `user_id`, altera a configuração global (config.json).
+    """
     
     # 1. Trata o valor de Custo Fixo Semanal para Diário
     fixed_daily_cost = round(aluguel_semanal / 7, 2) if aluguel_semanal > 0 else 0.0
@@ -58,22 +174,66 @@ def update_config_web(consumo, preco, tipo, aluguel_semanal):
         new_consumo = 0.0
         new_preco = 0.0
         
-    # 3. Salva no config.json (aqui chamamos o método do AnalyticsManager)
-    return ANALYTICS_MANAGER._save_config(
+    # 3. Salva o perfil do usuário e descarta a versão antiga do cache
+    if user_id is not None:
+        vigente_desde = vigente_desde or date.today().isoformat()
+        if not flush_writes(WRITE_BEHIND_FLUSH_TIMEOUT):
+            # Logs no journal têm métricas com os custos antigos e seriam gravados depois do recálculo
+            logger.warning("Logs pendentes no write-behind; perfil de custos não salvo.", extra={"user_id": user_id})
+            return False
+        saved = DB_MANAGER.save_user_config(user_id, new_consumo, new_preco, tipo, fixed_daily_cost, vigente_desde)
+        ANALYTICS_MANAGER.invalidate_user_values(user_id)
+        _bump_data_version(user_id)
+        if saved:
+            # Apenas os dias a partir da vigência mudam de custo
+            recalculated = _store_metrics(user_id, DB_MANAGER.get_logs_by_user_range(user_id, start_date=vigente_desde))
+            logger.info(
+                "Perfil de custos atualizado.",
+                extra={"user_id": user_id, "vigente_desde": vigente_desde, "dias_recalculados": len(recalculated)}
+            )
+        else:
+            logger.warning("Falha ao salvar o perfil de custos.", extra={"user_id": user_id})
+        return saved
+
+    # 4. Sem usuário: salva no config.json (aqui chamamos o método do AnalyticsManager)
+    saved = ANALYTICS_MANAGER._save_config(
         new_consumo, new_preco, tipo, fixed_daily_cost
     )
+    _bump_data_version()
+    return saved
 
+@instrumented(KIND_API)
 def upsert_log_web(user_id, data, km_rodados, faturamento_total, horas_trabalhadas):
     """Insere/Atualiza log e retorna o resumo de métricas do dia."""
     
-    # 1. Salva/Atualiza no BD
-    if not DB_MANAGER.upsert_daily_log(user_id, data, km_rodados, faturamento_total, horas_trabalhadas):
-        return None
-    
-    # 2. Calcula e retorna as métricas
+    # 1. Calcula as métricas com os custos vigentes na data do log
+    values = ANALYTICS_MANAGER.get_user_values(user_id, data)
     metrics = ANALYTICS_MANAGER.calculate_performance_metrics(
-        km_rodados, faturamento_total, horas_trabalhadas
+        km_rodados, faturamento_total, horas_trabalhadas, values
     )
+
+    # 2a. Write-behind: registra no journal e retorna; a thread gravadora grava no BD
+    if WRITE_BEHIND is not None:
+        try:
+            row = (user_id, *database_manager.normalize_log_row(data, km_rodados, faturamento_total, horas_trabalhadas),
+                   metrics["custo_combustivel_estimado"], values["fixo_diario"], metrics["lucro_liquido"])
+            WRITE_BEHIND.submit(row)
+        except (ValueError, OSError, RuntimeError) as e:
+            logger.warning("Falha ao registrar o log do dia no journal: %s", e, extra={"user_id": user_id, "data": data})
+            return None
+        return {"km": km_rodados, "fat": faturamento_total, "horas": horas_trabalhadas, **metrics}
+
+    # 2b. Salva/Atualiza no BD, já com as métricas do dia
+    row = (
+        data, km_rodados, faturamento_total, horas_trabalhadas,
+        metrics["custo_combustivel_estimado"], values["fixo_diario"], metrics["lucro_liquido"]
+    )
+    versions = DB_MANAGER.upsert_log_rows_with_stamp([(user_id, *row)])
+    _bump_data_version(user_id)
+    if versions is None:
+        logger.warning("Falha ao gravar o log do dia.", extra={"user_id": user_id, "data": data})
+        return None
+    _update_snapshot(user_id, [row], versions.get(user_id))
     
     # Inclui os dados brutos
     return {
@@ -83,40 +243,445 @@ def upsert_log_web(user_id, data, km_rodados, faturamento_total, horas_trabalhad
         **metrics
     }
 
-def get_report_web(user_id):
-    """Busca todos os logs, calcula as métricas diárias e gerais, e retorna tudo em um dicionário."""
-    
-    all_logs = DB_MANAGER.get_all_logs_by_user(user_id)
-    if not all_logs:
-        return {"logs_diarios": [], "geral": None}
-    
-    # 1. Logs diários com métricas
+@instrumented(KIND_API)
+def upsert_logs_bulk_web(user_id, rows):
+    """
+    Insere/Atualiza vários dias de uma vez (backfill, sincronização offline) numa única transação.
+    `rows` é uma lista de (data, km_rodados, faturamento_total, horas_trabalhadas).
+    Retorna, para cada linha, o resultado da gravação e as métricas do dia quando gravada com sucesso.
+    """
+    outcomes, valid_rows = database_manager.validate_log_rows(rows)
+    if not valid_rows:
+        return outcomes
+
+    # Métricas de todas as linhas numa única passada vetorizada (com os custos de cada data)
+    datas, kms, fats, hrss = zip(*valid_rows)
+    metrics = ANALYTICS_MANAGER.calculate_performance_metrics_by_date(user_id, datas, kms, fats, hrss)
+    metric_columns = {key: values.tolist() for key, values in metrics.items()}
+
+    stored_rows = [
+        (user_id, *row, metric_columns["custo_combustivel_estimado"][i], metric_columns["custo_fixo"][i], metric_columns["lucro_liquido"][i])
+        for i, row in enumerate(valid_rows)
+    ]
+    # Linhas ainda no journal (write-behind) são mais antigas que o lote e não podem sobrescrevê-lo depois
+    versions = DB_MANAGER.upsert_log_rows_with_stamp(stored_rows) if flush_writes(WRITE_BEHIND_FLUSH_TIMEOUT) else None
+    saved = versions is not None
+    _bump_data_version(user_id)
+    fields = {"user_id": user_id, "linhas": len(stored_rows), "rejeitadas": len(outcomes) - len(valid_rows)}
+    if saved:
+        logger.info("Lote de logs gravado.", extra={**fields, "amostrado": True})
+        _update_snapshot(user_id, [row[1:] for row in stored_rows], versions.get(user_id))
+    else:
+        logger.warning("Falha ao gravar o lote de logs.", extra=fields)
+
+    stored = [outcome for outcome in outcomes if outcome["ok"]]
+    for i, outcome in enumerate(stored):
+        if not saved:
+            outcome["ok"] = False
+            outcome["erro"] = "Falha ao gravar o lote no banco de dados."
+            continue
+        for key, values in metric_columns.items():
+            if key != "custo_fixo":
+                outcome[key] = values[i]
+
+    return outcomes
+
+def _compute_metrics(user_id, logs):
+    """
+    Calcula (com os custos vigentes em cada data) as métricas dos logs informados, sem gravar.
+    Retorna [(data, custo_comb, custo_fixo, lucro_liquido), ...].
+    """
+    if not logs:
+        return []
+
+    datas, kms, fats, hrss = zip(*(log[:4] for log in logs))
+    metrics = ANALYTICS_MANAGER.calculate_performance_metrics_by_date(user_id, datas, kms, fats, hrss)
+    return list(zip(
+        datas,
+        metrics["custo_combustivel_estimado"].tolist(),
+        metrics["custo_fixo"].tolist(),
+        metrics["lucro_liquido"].tolist()
+    ))
+
+def _store_metrics(user_id, logs):
+    """
+    Calcula e grava as métricas dos logs informados.
+    Retorna {data: (custo_comb, custo_fixo, lucro_liquido)}.
+    """
+    rows = _compute_metrics(user_id, logs)
+    if rows:
+        DB_MANAGER.update_log_metrics(user_id, rows)
+    return {data: stored for data, *stored in rows}
+
+def _build_daily_rows(user_id, logs):
+    """
+    Converte as tuplas (data, km, fat, hrs, custo_comb, custo_fixo, lucro) em linhas do relatório.
+    Usa as métricas gravadas; logs antigos sem métricas são calculados uma única vez e gravados.
+    """
+    missing = [log for log in logs if log[6] is None]
+    computed = _store_metrics(user_id, missing)
+
     daily_logs_with_metrics = []
-    for log in all_logs:
-        data, km, fat, hrs = log
-        daily_metrics = ANALYTICS_MANAGER.calculate_performance_metrics(km, fat, hrs)
-        
+    for data, km, fat, hrs, custo_comb, custo_fixo, lucro_liquido in logs:
+        if lucro_liquido is None:
+            custo_comb, custo_fixo, lucro_liquido = computed[data]
+
         daily_logs_with_metrics.append({
             "data": data,
             "km": km,
             "fat": fat,
-            "custo_comb": daily_metrics['custo_combustivel_estimado'],
-            "lucro_liquido": daily_metrics['lucro_liquido'],
+            "custo_comb": custo_comb,
+            "lucro_liquido": lucro_liquido,
             "horas": hrs
         })
-        
-    # 2. Totais gerais
-    overall_metrics = ANALYTICS_MANAGER.calculate_overall_metrics(all_logs)
+    return daily_logs_with_metrics
+
+# --- SNAPSHOTS COLUNARES ---
+
+def _snapshot_rows(user_id):
+    """Logs do usuário (com métricas, em ordem de data) e a versão do banco, para montar o snapshot."""
+    version, logs = DB_MANAGER.get_logs_with_stamp(user_id)
+    missing = [log for log in logs if log[6] is None]
+    if missing:
+        _store_metrics(user_id, missing)
+        version, logs = DB_MANAGER.get_logs_with_stamp(user_id)
+    return version, logs
+
+# Snapshots colunares do histórico (opcionais: ligados com DDL_SNAPSHOTS=<diretório>)
+SNAPSHOT_DIR = os.environ.get(SNAPSHOT_DIR_ENV)
+SNAPSHOTS = SnapshotStore(SNAPSHOT_DIR, lambda user_id: DB_MANAGER.get_data_stamp(user_id), _snapshot_rows) if SNAPSHOT_DIR else None
+
+def _update_snapshot(user_id, rows, version):
+    """
+    Aplica no snapshot (se ligado) as linhas (data, km, fat, hrs, custo_comb, custo_fixo, lucro)
+    recém-gravadas. `version` é a versão dos dados lida na transação da gravação (não depois
+    dela: outra gravação no meio faria o snapshot pular as linhas dela).
+    """
+    if SNAPSHOTS is not None:
+        SNAPSHOTS.apply_rows(user_id, version, rows)
+
+def _snapshot_columns(user_id, start_date=None, end_date=None):
+    """
+    Colunas do histórico do usuário no intervalo, lidas do snapshot (fatias dos arrays mapeados,
+    sem cópia). Retorna None se os snapshots estiverem desligados ou indisponíveis.
+    """
+    if SNAPSHOTS is None:
+        return None
+    columns = SNAPSHOTS.load(user_id)
+    if columns is None:
+        return None
+    dates = columns["data"]
+    first = np.searchsorted(dates, np.datetime64(start_date, "D")) if start_date else 0
+    last = np.searchsorted(dates, np.datetime64(end_date, "D"), side="right") if end_date else len(dates)
+    return {column: values[first:last] for column, values in columns.items()}
+
+def _daily_rows_from_columns(columns):
+    """Linhas do relatório (do mais recente ao mais antigo) a partir das colunas do snapshot, convertendo cada coluna de uma vez."""
+    keys = ("km", "fat", "custo_comb", "lucro_liquido", "horas")
+    return [
+        dict(zip(("data", *keys), row))
+        for row in zip(np.datetime_as_string(columns["data"][::-1]).tolist(), *(columns[key][::-1].tolist() for key in keys))
+    ]
+
+def get_snapshot_stats():
+    """Contadores dos snapshots colunares (refeitos, acréscimos, regravações), ou None se desligados."""
+    return SNAPSHOTS.stats() if SNAPSHOTS is not None else None
+
+# --- GRAVAÇÃO ASSÍNCRONA (WRITE-BEHIND) ---
 
-    # 3. Cálculo do Lucro Líquido TOTAL
-    fixed_daily_cost = ANALYTICS_MANAGER.config.get('CUSTOS', {}).get('CUSTO_FIXO_DIARIO', 0.0)
-    fixed_cost_total = overall_metrics['total_dias'] * fixed_daily_cost
-    total_lucro_liquido = overall_metrics['total_faturamento'] - overall_metrics['custo_total_estimado'] - fixed_cost_total
+def _write_behind_applied(rows, versions):
+    """
+    Depois de cada lote gravado pela thread gravadora: invalida os relatórios e atualiza os
+    snapshots com as versões ({user_id: versão}) lidas na transação do lote.
+    """
+    rows_by_user = {}
+    for row in rows:
+        rows_by_user.setdefault(row[0], []).append(row[1:])
+    for user_id, user_rows in rows_by_user.items():
+        _bump_data_version(user_id)
+        _update_snapshot(user_id, user_rows, versions.get(user_id))
+
+# Write-behind dos logs diários (opcional: ligado com DDL_WRITE_BEHIND=<arquivo do journal>).
+# Ao iniciar, o journal deixado por uma execução interrompida é reaplicado no banco.
+WRITE_BEHIND_JOURNAL = os.environ.get(WRITE_BEHIND_ENV)
+WRITE_BEHIND = WriteBehindQueue(
+    WRITE_BEHIND_JOURNAL, lambda rows: DB_MANAGER.upsert_log_rows_with_stamp(rows), on_applied=_write_behind_applied
+) if WRITE_BEHIND_JOURNAL else None
+if WRITE_BEHIND is not None:
+    atexit.register(WRITE_BEHIND.close)
+
+def flush_writes(timeout=None):
+    """Espera a gravação no banco dos logs ainda no journal (write-behind). Retorna False se o timeout estourar."""
+    return WRITE_BEHIND.flush(timeout) if WRITE_BEHIND is not None else True
+
+def get_write_behind_stats():
+    """Contadores do write-behind (enviadas, coalescidas, pendentes, lotes), ou None se desligado."""
+    return WRITE_BEHIND.stats() if WRITE_BEHIND is not None else None
+
+@instrumented(KIND_API)
+def get_report_summary_web(user_id, start_date=None, end_date=None):
+    """
+    Retorna apenas o bloco de Totais e Médias Gerais do período (ou de todo o histórico),
+    calculado a partir de uma única consulta agregada. Retorna None se não houver logs.
+    """
+    return _cached_report(
+        "resumo", user_id, (start_date, end_date),
+        lambda: _compute_report_summary(user_id, start_date, end_date)
+    )
+
+def _compute_report_summary(user_id, start_date, end_date):
+    # 1. Totais gerais (agregados direto no SQL, sem percorrer os logs em Python)
+    totals = DB_MANAGER.get_log_totals(user_id, start_date, end_date)
+    if totals and totals["dias_com_metricas"] < totals["total_dias"]:
+        # Logs antigos sem métricas gravadas: calcula uma vez e agrega de novo
+        backfilled = _store_metrics(user_id, DB_MANAGER.get_logs_missing_metrics(user_id))
+        logger.info("Métricas de logs antigos calculadas e gravadas.", extra={"user_id": user_id, "linhas": len(backfilled)})
+        totals = DB_MANAGER.get_log_totals(user_id, start_date, end_date)
+
+    values = ANALYTICS_MANAGER.get_user_values(user_id)
+    overall_metrics = ANALYTICS_MANAGER.calculate_overall_metrics_from_totals(totals, values)
+    if not overall_metrics:
+        return None
+
+    # 2. Custos e Lucro Líquido TOTAL a partir das métricas gravadas de cada dia
+    # (cada dia com os preços e o custo fixo vigentes na sua data)
+    overall_metrics['custo_total_estimado'] = round(totals['total_custo_combustivel'], 2)
+    fixed_cost_total = round(totals['total_custo_fixo'], 2)
+    total_lucro_liquido = round(overall_metrics['total_faturamento'] - overall_metrics['custo_total_estimado'] - fixed_cost_total, 2)
     
     overall_metrics['custo_fixo_total'] = fixed_cost_total
     overall_metrics['total_lucro_liquido'] = total_lucro_liquido
-    
+
+    return overall_metrics
+
+@instrumented(KIND_API)
+def get_report_web(user_id, start_date=None, end_date=None):
+    """Busca todos os logs (opcionalmente de um período), calcula as métricas diárias e gerais, e retorna tudo em um dicionário."""
+    return _cached_report(
+        "relatorio", user_id, (start_date, end_date),
+        lambda: _compute_report(user_id, start_date, end_date)
+    )
+
+def _compute_report(user_id, start_date, end_date):
+    columns = _snapshot_columns(user_id, start_date, end_date)
+    if columns is not None:
+        if not len(columns["data"]):
+            return {"logs_diarios": [], "geral": None}
+        return {"logs_diarios": _daily_rows_from_columns(columns), "geral": get_report_summary_web(user_id, start_date, end_date)}
+
+    all_logs = DB_MANAGER.get_logs_by_user_range(user_id, start_date, end_date, with_metrics=True)
+    if not all_logs:
+        return {"logs_diarios": [], "geral": None}
+
+    return {
+        "logs_diarios": _build_daily_rows(user_id, all_logs),
+        "geral": get_report_summary_web(user_id, start_date, end_date)
+    }
+
+@instrumented(KIND_API)
+def get_report_page_web(user_id, cursor=None, limit=REPORT_PAGE_SIZE, start_date=None, end_date=None):
+    """
+    Retorna uma página de logs diários com métricas, do mais recente ao mais antigo.
+    Passe o `proximo_cursor` da página anterior em `cursor` para buscar os dias mais antigos;
+    ele vem None quando não há mais páginas.
+    """
+    limit = min(max(int(limit), 1), MAX_REPORT_PAGE_SIZE)
+    return _cached_report(
+        "pagina", user_id, (cursor, limit, start_date, end_date),
+        lambda: _compute_report_page(user_id, cursor, limit, start_date, end_date)
+    )
+
+def _compute_report_page(user_id, cursor, limit, start_date, end_date):
+    columns = _snapshot_columns(user_id, start_date, end_date)
+    if columns is not None:
+        # Mesma paginação por chave, sobre o snapshot: os `limit` dias anteriores ao cursor
+        end = np.searchsorted(columns["data"], np.datetime64(cursor, "D")) if cursor else len(columns["data"])
+        start = max(0, end - limit)
+        rows = _daily_rows_from_columns({column: values[start:end] for column, values in columns.items()})
+        return {"logs_diarios": rows, "proximo_cursor": rows[-1]["data"] if len(rows) == limit else None}
+
+    logs, next_cursor = DB_MANAGER.get_logs_page(user_id, cursor, limit, start_date, end_date, with_metrics=True)
+    return {
+        "logs_diarios": _build_daily_rows(user_id, logs),
+        "proximo_cursor": next_cursor
+    }
+
+@instrumented(KIND_API)
+def get_rolling_stats_web(user_id, start_date=None, end_date=None, windows=ROLLING_WINDOWS):
+    """
+    Médias móveis (R$/km, R$/hora e lucro líquido de cada janela de `windows` dias corridos)
+    por dia registrado, do mais antigo ao mais recente, e a mediana/p90 dos valores diários.
+    Retorna {"dias": [{"data", "reais_por_km_7d", "reais_por_hora_7d", "lucro_liquido_7d",
+    "dias_7d", ...}], "percentis": {...}}, ou None se não houver logs.
+    """
+    return _cached_report(
+        "moveis", user_id, (start_date, end_date, tuple(windows)),
+        lambda: _compute_rolling_stats(user_id, start_date, end_date, windows)
+    )
+
+def _compute_rolling_stats(user_id, start_date, end_date, windows):
+    columns = _snapshot_columns(user_id, start_date, end_date)
+    if columns is not None:
+        stats = ANALYTICS_MANAGER.calculate_rolling_metrics(
+            columns["data"], columns["km"], columns["fat"], columns["horas"], columns["lucro_liquido"], windows
+        )
+    else:
+        logs = DB_MANAGER.get_logs_by_user_range(user_id, start_date, end_date, with_metrics=True)
+        computed = _store_metrics(user_id, [log for log in logs if log[6] is None])
+        lucros = [computed[log[0]][2] if log[6] is None else log[6] for log in logs]
+        stats = ANALYTICS_MANAGER.calculate_rolling_metrics(*zip(*(log[:4] for log in logs)), lucros, windows) if logs else None
+    if stats is None:
+        return None
+
+    columns = {"data": stats["datas"]}
+    for window, metrics in stats["janelas"].items():
+        for key, values in metrics.items():
+            columns[f"{key}_{window}d"] = values.tolist()
+    return {
+        "dias": [dict(zip(columns, row)) for row in zip(*columns.values())],
+        "percentis": stats["percentis"]
+    }
+
+def _rollup_limit(limit):
+    return MAX_ROLLUP_PERIODS if limit is None else min(max(int(limit), 1), MAX_ROLLUP_PERIODS)
+
+def _rollup_rows(user_id, table, limit=None, start_period=None, end_period=None):
+    """Lê os totais por período (mais recente primeiro) e calcula as médias de cada um."""
+    rollups = DB_MANAGER.get_rollups(user_id, table, limit, start_period, end_period)
+    if any(row[-1] for row in rollups):
+        # Períodos com logs antigos ainda sem métricas: calcula uma vez e lê de novo
+        _store_metrics(user_id, DB_MANAGER.get_logs_missing_metrics(user_id))
+        rollups = DB_MANAGER.get_rollups(user_id, table, limit, start_period, end_period)
+
+    periods = []
+    for periodo, km, fat, hrs, custo_comb, lucro, dias, _ in rollups:
+        periods.append({
+            "periodo": periodo,
+            "dias": dias,
+            "km": round(km, 2),
+            "fat": round(fat, 2),
+            "horas": round(hrs, 2),
+            "custo_comb": round(custo_comb, 2),
+            "lucro_liquido": round(lucro, 2),
+            "reais_por_km": round(fat / km, 2) if km > 0 else 0.0,
+            "reais_por_hora": round(fat / hrs, 2) if hrs > 0 else 0.0
+        })
+    return periods
+
+@instrumented(KIND_API)
+def get_weekly_summary_web(user_id, limit=None, start_week=None, end_week=None):
+    """
+    Totais por semana ISO ('AAAA-Www'), da mais recente para a mais antiga.
+    Lidos das tabelas de rollup: o custo é proporcional ao número de semanas, não de dias.
+    """
+    limit = _rollup_limit(limit)
+    return _cached_report(
+        "semanal", user_id, (limit, start_week, end_week),
+        lambda: _rollup_rows(user_id, "RollupSemanal", limit, start_week, end_week)
+    )
+
+@instrumented(KIND_API)
+def get_monthly_summary_web(user_id, limit=None, start_month=None, end_month=None):
+    """Totais por mês ('AAAA-MM'), do mais recente para o mais antigo (lidos das tabelas de rollup)."""
+    limit = _rollup_limit(limit)
+    return _cached_report(
+        "mensal", user_id, (limit, start_month, end_month),
+        lambda: _rollup_rows(user_id, "RollupMensal", limit, start_month, end_month)
+    )
+
+# --- FROTA ---
+
+@instrumented(KIND_API)
+def get_fleet_summary_web(start_date=None, end_date=None, workers=fleet_analytics.FLEET_WORKERS):
+    """
+    Totais, rankings e percentis de todos os motoristas no período (fleet_analytics.fleet_summary),
+    calculados em paralelo por faixas de user_id. Retorna None se não houver logs no período.
+    """
+    summary = fleet_analytics.fleet_summary(DB_MANAGER.db_file, start_date, end_date, workers)
+    if summary and summary["sem_metricas"]:
+        # Os workers só leem: as métricas que faltam são gravadas aqui, uma vez, e a frota é lida de novo
+        for user_id in summary["sem_metricas"]:
+            _store_metrics(user_id, DB_MANAGER.get_logs_missing_metrics(user_id))
+        summary = fleet_analytics.fleet_summary(DB_MANAGER.db_file, start_date, end_date, workers)
+    return summary
+
+# --- FEED DE ALTERAÇÕES ---
+
+@instrumented(KIND_API)
+def get_changes_since(seq=0, limit=CHANGE_FEED_PAGE_SIZE, user_id=None):
+    """
+    Alterações do LogDiario depois de `seq`, em ordem: cada uma traz o estado do log gravado
+    (o `id` do log não muda entre gravações). Quem sincroniza guarda o `proximo_seq` e o passa
+    na chamada seguinte; `mais` indica que pode haver alterações além desta página. Começando
+    do seq 0, o feed traz o histórico inteiro. Com `user_id`, só os logs do usuário.
+    """
+    changes = DB_MANAGER.get_changes(seq, limit, user_id)
     return {
-        "logs_diarios": daily_logs_with_metrics,
-        "geral": overall_metrics
-    }
\ No newline at end of file
+        "alteracoes": [dict(zip(database_manager.CHANGE_COLUMNS, change)) for change in changes],
+        "proximo_seq": changes[-1][0] if changes else seq,
+        "mais": len(changes) == limit,
+    }
+
+# --- EXPORTAÇÃO ---
+
+def export_report_web(user_id, fmt="csv", start_date=None, end_date=None, batch_size=database_manager.EXPORT_BATCH_SIZE):
+    """
+    Exporta o histórico do usuário (do dia mais antigo ao mais recente) como um gerador de
+    trechos de texto em CSV (com cabeçalho) ou JSONL (um objeto por linha), com as colunas
+    de EXPORT_COLUMNS. Os logs são lidos e convertidos em lotes, então a memória usada não
+    depende do tamanho do histórico. Levanta ValueError se o formato não for suportado.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação inválido: {fmt}. Use {', '.join(EXPORT_FORMATS)}.")
+    batches = _export_batches(user_id, start_date, end_date, batch_size)
+    return _csv_chunks(batches) if fmt == "csv" else _jsonl_chunks(batches)
+
+def _export_batches(user_id, start_date, end_date, batch_size):
+    """Lotes de tuplas no formato de EXPORT_COLUMNS, lidos com um cursor no banco."""
+    for logs in DB_MANAGER.iter_logs_by_user(user_id, start_date, end_date, batch_size):
+        # Logs antigos sem métricas gravadas: calculadas só em memória (a leitura ainda
+        # está em andamento e a exportação não deve disputar a escrita com ela)
+        computed = {data: metrics for data, *metrics in _compute_metrics(user_id, [log for log in logs if log[6] is None])}
+        batch = []
+        for data, km, fat, hrs, custo_comb, custo_fixo, lucro_liquido in logs:
+            if lucro_liquido is None:
+                custo_comb, custo_fixo, lucro_liquido = computed[data]
+            batch.append((data, km, fat, hrs, custo_comb, custo_fixo, lucro_liquido))
+        yield batch
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # Histórico vazio: só o cabeçalho
+        yield buffer.getvalue()
+
+def _jsonl_chunks(batches):
+    for batch in batches:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in batch)
+
+# --- DIAGNÓSTICO ---
+
+def get_db_pool_stats():
+    """Retorna os contadores do pool de conexões (hits, misses, esperas e tempo de espera)."""
+    return DB_MANAGER.pool_stats()
+
+def get_instrumentation_snapshot():
+    """
+    Contadores da instrumentação (chamadas, histograma de latência, linhas e tempo de banco
+    vs. Python) de cada função do api_core e do DatabaseManager. Vazio se estiver desligada.
+    """
+    return instrumentation.snapshot()
+
+def get_report_cache_stats():
+    """Retorna os contadores do cache de relatórios (tamanho, hits, misses e expirados)."""
+    return REPORT_CACHE.stats()
+
+def reset_instrumentation():
+    """Zera os contadores da instrumentação."""
+    instrumentation.reset()
@@ -1,15 +1,20 @@
-import database_manager
-from analytics import AnalyticsManager
 from datetime import date, datetime # Importado datetime para validação de data
+import atexit
 import sys 
+import instrumentation
+# Mesma camada de lógica usada pelo web_app.py (métricas gravadas, custos com vigência)
+import api_core as core
 
-# Inicializa os gerenciadores no escopo global
-DB_MANAGER = database_manager.DatabaseManager()
-ANALYTICS_MANAGER = AnalyticsManager()
+# Usa os gerenciadores globais da api_core
+DB_MANAGER = core.DB_MANAGER
+ANALYTICS_MANAGER = core.ANALYTICS_MANAGER
 
 # Variável global para armazenar o ID do usuário logado
 LOGGED_IN_USER_ID = None 
 
+# Quantidade de dias exibidos por página no relatório
+REPORT_PAGE_SIZE = 20
+
 
 # --- CONSTANTES DE INFORMAÇÃO ---
 INSTRUCTION_POPUP = """
@@ -134,16 +139,13 @@ def register_daily_log_upsert():
     faturamento_total = get_valid_input("TOTAL Faturado (R$) nesse dia: ")
     horas_trabalhadas_total = get_valid_input("TOTAL de Horas Trabalhadas nesse dia: ")
     
-    # 4. Executa o UPSERT (Atualiza ou Insere)
-    if DB_MANAGER.upsert_daily_log(user_id, target_date, km_rodados_total, faturamento_total, horas_trabalhadas_total):
+    # 4. Executa o UPSERT (Atualiza ou Insere) e calcula as métricas com os custos da data
+    metrics = core.upsert_log_web(user_id, target_date, km_rodados_total, faturamento_total, horas_trabalhadas_total)
+    if metrics:
         
-        # 5. Realiza e exibe a Análise CONSOLIDADA dos novos totais
+        # 5. Exibe a Análise CONSOLIDADA dos novos totais
         print(f"\n--- 📊 Resumo e Análise do Dia {target_date} ---")
         
-        metrics = ANALYTICS_MANAGER.calculate_performance_metrics(
-            km_rodados_total, faturamento_total, horas_trabalhadas_total
-        )
-        
         print(f"KM Total do Dia: {km_rodados_total:.2f} km")
         print(f"Faturamento Total Bruto: R${faturamento_total:.2f}")
         print(f"Horas Totais: {horas_trabalhadas_total:.2f} h")
@@ -160,17 +162,19 @@ def register_daily_log_upsert():
 
 def config_menu_flow():
     """Permite ao usuário editar as configurações de combustível e custos fixos."""
+    global LOGGED_IN_USER_ID
+    user_id = LOGGED_IN_USER_ID
+
     print("\n--- ⚙️ Configurações de Custos e Consumo ---")
     
-    # Exibir as configurações atuais
-    current_config = ANALYTICS_MANAGER.config
-    current_consumo = current_config.get('VEICULO', {}).get('CONSUMO_MEDIO_KM_L', 0.0)
-    current_preco = current_config.get('CUSTOS', {}).get('PRECO_COMBUSTIVEL_L', 0.0)
-    current_tipo = current_config.get('VEICULO', {}).get('TIPO_COMBUSTIVEL', 'N/A')
+    # Exibir as configurações atuais (perfil do usuário ou, se não houver, o config.json)
+    current_config = core.get_config_for_display(user_id)
+    current_consumo = current_config['consumo']
+    current_preco = current_config['preco']
+    current_tipo = current_config['tipo']
     
     # NOVO: Tentativa de converter custo fixo diário para semanal para exibir
-    current_fixed_daily = current_config.get('CUSTOS', {}).get('CUSTO_FIXO_DIARIO', 0.0)
-    current_fixed_weekly = round(current_fixed_daily * 7, 2)
+    current_fixed_weekly = current_config['fixo_semanal']
 
     print(f"\n[Valores Atuais]")
     print(f"Tipo de Combustível: {current_tipo}")
@@ -211,8 +215,9 @@ def config_menu_flow():
         new_preco = get_valid_input(f"Novo Preço do Combustível (R$/L) (Atual: {current_preco}): ", data_type=float)
 
 
-    # 3. Salvar as configurações (Passando o custo DIÁRIO)
-    if ANALYTICS_MANAGER._save_config(new_consumo, new_preco, new_type, new_fixed_daily_cost):
+    # 3. Salvar as configurações no perfil do usuário, válidas a partir de hoje
+    # (a api_core converte o custo SEMANAL para o DIÁRIO)
+    if core.update_config_web(new_consumo, new_preco, new_type, new_aluguel_semanal, user_id):
         print("\n✅ Configurações atualizadas com sucesso!")
     else:
         print("\n❌ Falha ao salvar as configurações.")
@@ -227,40 +232,42 @@ def display_full_report():
     
     print("\n--- 📑 Relatório Completo de Logs ---")
     
-    # 1. Busca os logs
-    all_logs = DB_MANAGER.get_all_logs_by_user(user_id)
-    
-    if not all_logs:
+    # 1. Totais agregados direto no SQL (também indica se há algum log)
+    overall_metrics = core.get_report_summary_web(user_id)
+
+    if not overall_metrics:
         print("Nenhum registro de log encontrado. Comece registrando seu primeiro dia!")
         print("-" * 50)
         return
 
-    # 2. Exibir Logs Individuais (Tabela simples com Lucro Líquido)
+    # 2. Exibir Logs Individuais (Tabela simples com Lucro Líquido), uma página por vez
     print(f"| {'Data':<12} | {'KM':<6} | {'Fat. Bruto':<12} | {'Custo Comb':<12} | {'Lucro Líquido':<15} | {'Horas':<6} |")
     print("-" * 76)
-    
-    # Recalcula as métricas para cada log para exibir o Lucro Líquido
-    for log in all_logs:
-        data, km, fat, hrs = log
-        daily_metrics = ANALYTICS_MANAGER.calculate_performance_metrics(km, fat, hrs)
-        
-        lucro_liquido = daily_metrics['lucro_liquido']
-        custo_comb = daily_metrics['custo_combustivel_estimado']
-        
-        # Apenas arredondamos KM e Horas para o print, os dados brutos são REAIS
-        print(f"| {data:<12} | {km:<6.0f} | {fat:<12.2f} | {custo_comb:<12.2f} | {lucro_liquido:<15.2f} | {hrs:<6.1f} |")
+
+    cursor = None
+    while True:
+        # Métricas gravadas com cada log (custos vigentes na data de cada dia)
+        page = core.get_report_page_web(user_id, cursor, REPORT_PAGE_SIZE)
+        cursor = page['proximo_cursor']
+
+        for log in page['logs_diarios']:
+            data, km, fat, hrs = log['data'], log['km'], log['fat'], log['horas']
+            custo_comb, lucro_liquido = log['custo_comb'], log['lucro_liquido']
+
+            # Apenas arredondamos KM e Horas para o print, os dados brutos são REAIS
+            print(f"| {data:<12} | {km:<6.0f} | {fat:<12.2f} | {custo_comb:<12.2f} | {lucro_liquido:<15.2f} | {hrs:<6.1f} |")
+
+        if not cursor:
+            break
+        if input("-- Enter para ver dias anteriores, 'q' para ir aos totais: ").strip().lower() == 'q':
+            break
     print("-" * 76)
-    
-    # 3. Calcular e Exibir Médias Gerais
-    overall_metrics = ANALYTICS_MANAGER.calculate_overall_metrics(all_logs)
 
+    # 3. Exibir Médias Gerais
     if overall_metrics:
-        # Custo Fixo Diário (Recupera para o cálculo total)
-        fixed_daily_cost = ANALYTICS_MANAGER.config.get('CUSTOS', {}).get('CUSTO_FIXO_DIARIO', 0.0)
-        fixed_cost_total = overall_metrics['total_dias'] * fixed_daily_cost
-        
-        # CÁLCULO GERAL DE LUCRO LÍQUIDO
-        total_lucro_liquido = overall_metrics['total_faturamento'] - overall_metrics['custo_total_estimado'] - fixed_cost_total
+        # Custo Fixo e Lucro Líquido totais (somados dos valores de cada dia)
+        fixed_cost_total = overall_metrics['custo_fixo_total']
+        total_lucro_liquido = overall_metrics['total_lucro_liquido']
         
         print("\n--- 📈 Totais e Médias Gerais ---")
         print(f"🗓️ Total de Dias Registrados: {overall_metrics['total_dias']}")
@@ -277,6 +284,32 @@ def display_full_report():
     print("-" * 50)
 
 
+def export_history_flow():
+    """Exporta todo o histórico do usuário logado para um arquivo CSV ou JSONL."""
+    global LOGGED_IN_USER_ID
+    user_id = LOGGED_IN_USER_ID
+
+    print("\n--- 💾 Exportar Histórico ---")
+    fmt = (input(f"Formato ({'/'.join(core.EXPORT_FORMATS)}, Enter para csv): ").strip().lower() or "csv")
+    if fmt not in core.EXPORT_FORMATS:
+        print("❌ Formato inválido.")
+        return
+
+    default_path = f"historico_{user_id}.{fmt}"
+    path = input(f"Arquivo de destino (Enter para {default_path}): ").strip() or default_path
+
+    # Os trechos são gravados conforme chegam do banco: o histórico nunca fica inteiro na memória
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for chunk in core.export_report_web(user_id, fmt):
+                f.write(chunk)
+    except OSError as e:
+        print(f"❌ Não foi possível gravar o arquivo: {e}")
+        return
+    print(f"✅ Histórico exportado para {path}")
+    print("-" * 50)
+
+
 # --- FLUXO PRINCIPAL E MENUS ---
 
 def display_menu():
@@ -285,9 +318,10 @@ def display_menu():
     print("1. 📝 Registrar/Atualizar Log (Data Flexível)")
     print("2. 📑 Visualizar Todos os Logs e Relatório Geral")
     print("3. ⚙️ Configurações de Custos") 
-    print("4. ❌ Logout") 
+    print("4. 💾 Exportar Histórico (CSV/JSONL)")
+    print("5. ❌ Logout") 
     
-    choice = get_valid_input("Escolha uma opção (1-4): ", data_type=str) 
+    choice = get_valid_input("Escolha uma opção (1-5): ", data_type=str) 
     return choice
 
 def main():
@@ -310,7 +344,9 @@ def main():
             display_full_report()
         elif choice == '3':
             config_menu_flow() 
-        elif choice == '4': 
+        elif choice == '4':
+            export_history_flow()
+        elif choice == '5': 
             print(f"👋 Usuário {LOGGED_IN_USER_ID} desconectado.")
             LOGGED_IN_USER_ID = None 
             while not LOGGED_IN_USER_ID:
@@ -319,7 +355,26 @@ def main():
             print("Opção inválida. Tente novamente.")
 
 
+def enable_instrumentation(dump_path=None):
+    """Liga a instrumentação e, ao sair do programa, exibe o resumo (e grava o JSON, se pedido)."""
+    instrumentation.enable()
+
+    def report():
+        instrumentation.print_summary()
+        if dump_path:
+            instrumentation.dump(dump_path)
+            print(f"📊 Instrumentação gravada em {dump_path}")
+
+    atexit.register(report)
+
+
 if __name__ == "__main__":
+    # --instrumentacao [arquivo.json]: mede as chamadas ao api_core e ao banco nesta sessão
+    if '--instrumentacao' in sys.argv:
+        position = sys.argv.index('--instrumentacao')
+        next_arg = sys.argv[position + 1] if position + 1 < len(sys.argv) else None
+        enable_instrumentation(next_arg if next_arg and not next_arg.startswith('--') else None)
+
     # Garante que as tabelas existem antes de qualquer operação
     DB_MANAGER._connect() 
     DB_MANAGER._disconnect()
@@ -0,0 +1,3 @@
+# benchmarks/
+# Scripts de medição de desempenho. Rodar a partir da raiz do repositório, por exemplo:
+#   python -m benchmarks.mixed_load
@@ -0,0 +1,58 @@
+# benchmarks/common.py
+# Funções compartilhadas pelos benchmarks: percentis, resumo de tempos e metadados do ambiente.
+import json
+import platform
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+
+
+def percentile(sorted_values, pct):
+    """Percentil (nearest-rank) de uma lista já ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize_latencies(latencies, errors=0):
+    """Resumo de uma lista de tempos (em segundos), convertido para ms."""
+    latencies = sorted(latencies)
+    return {
+        "operacoes": len(latencies),
+        "erros": errors,
+        "media_ms": round(sum(latencies) / len(latencies) * 1000, 4) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4) if latencies else 0.0,
+    }
+
+
+def git_commit():
+    """Commit atual do repositório (ou None fora de um checkout git)."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def environment_info():
+    """Metadados gravados junto com os resultados, para comparar execuções."""
+    return {
+        "commit": git_commit(),
+        "data_hora": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+    }
+
+
+def write_json(path, report):
+    """Grava o relatório do benchmark em JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,43 @@
+# benchmarks/compare.py
+# Compara dois resultados JSON do benchmarks.micro (ex.: antes e depois de uma mudança).
+#
+# Uso:
+#   python -m benchmarks.compare antes.json depois.json [--limite 10]
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return report.get("ambiente", {}), {(r["nome"], r["dias"]): r for r in report["resultados"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara a mediana de dois resultados do benchmarks.micro.")
+    parser.add_argument("antes")
+    parser.add_argument("depois")
+    parser.add_argument("--limite", type=float, default=10.0, help="Variação (%%) a partir da qual marcar regressão")
+    args = parser.parse_args(argv)
+
+    env_before, before = load_results(args.antes)
+    env_after, after = load_results(args.depois)
+    print(f"Antes: {env_before.get('commit')}  Depois: {env_after.get('commit')}")
+    print(f"\n{'Benchmark':<32}{'Dias':>6}{'antes ms':>11}{'depois ms':>11}{'variação':>10}")
+
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key]["p50_ms"], after[key]["p50_ms"]
+        change = (new - old) / old * 100 if old else 0.0
+        flag = ""
+        if change > args.limite:
+            flag = "  ⚠️ regressão"
+            regressions += 1
+        print(f"{key[0]:<32}{key[1]:>6}{old:>11.4f}{new:>11.4f}{change:>+9.1f}%{flag}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# benchmarks/datagen.py
+# Gerador determinístico (com semente) de frotas sintéticas: N motoristas x M dias de LogDiario.
+#
+# Uso:
+#   python -m benchmarks.datagen --motoristas 100 --dias 365 --db frota.db
+#   python -m benchmarks.datagen --motoristas 100 --dias 365 --csv frota.csv   (formato do importer.py)
+import argparse
+import csv
+import random
+import sys
+from datetime import date, timedelta
+
+import database_manager
+
+DEFAULT_SEED = 42
+DEFAULT_START_DATE = date(2024, 1, 1)
+
+# Perfis de veículo sorteados para os motoristas: (tipo, consumo km/l, preço/l, aluguel semanal)
+VEHICLE_PROFILES = [
+    ("Flex", 11.5, 5.79, 650.0),
+    ("Gasolina", 10.0, 6.09, 700.0),
+    ("GNV", 13.0, 4.39, 600.0),
+    ("Elétrico", 0.0, 0.0, 900.0),
+]
+
+
+def driver_username(index):
+    return f"motorista{index:05d}"
+
+
+def generate_drivers(drivers, seed=DEFAULT_SEED):
+    """
+    Gera os parâmetros de cada motorista: perfil do veículo, km médio por dia de trabalho,
+    faturamento por km, velocidade média e dias da semana de folga.
+    """
+    rng = random.Random(seed)
+    for index in range(drivers):
+        tipo, consumo, preco, aluguel = rng.choice(VEHICLE_PROFILES)
+        yield {
+            "username": driver_username(index),
+            "tipo": tipo,
+            "consumo": consumo,
+            "preco": preco,
+            "aluguel_semanal": aluguel,
+            "km_medio": rng.uniform(120, 280),
+            "reais_por_km": rng.uniform(1.6, 2.6),
+            "km_por_hora": rng.uniform(18, 32),
+            "folgas": set(rng.sample(range(7), rng.choice((0, 1, 1, 2)))),
+        }
+
+
+def generate_logs(driver, days, seed=DEFAULT_SEED, start_date=DEFAULT_START_DATE):
+    """
+    Gera (data, km_rodados, faturamento_total, horas_trabalhadas) de um motorista ao longo de
+    `days` dias corridos, pulando folgas e alguns dias aleatórios; sexta e sábado rendem mais.
+    """
+    rng = random.Random(f"{seed}-{driver['username']}")
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        if day.weekday() in driver["folgas"] or rng.random() < 0.05:
+            continue
+        demand = 1.2 if day.weekday() in (4, 5) else 1.0
+        km = max(10.0, rng.gauss(driver["km_medio"] * demand, driver["km_medio"] * 0.2))
+        fat = km * driver["reais_por_km"] * rng.uniform(0.85, 1.15)
+        hrs = km / driver["km_por_hora"] * rng.uniform(0.9, 1.1)
+        yield day.isoformat(), round(km, 1), round(fat, 2), round(hrs, 2)
+
+
+def populate(db, drivers, days, seed=DEFAULT_SEED, start_date=DEFAULT_START_DATE, chunk_size=5000):
+    """
+    Cria os motoristas (com perfil de custos vigente desde o primeiro dia) e grava o histórico
+    no banco do DatabaseManager `db`. Retorna os user_ids na ordem dos motoristas.
+    """
+    user_ids = []
+    batch = []
+    for driver in generate_drivers(drivers, seed):
+        db.register_user(driver["username"], "senha")
+        user_id = db.get_user_id(driver["username"])
+        user_ids.append(user_id)
+        db.save_user_config(
+            user_id, driver["consumo"], driver["preco"], driver["tipo"],
+            round(driver["aluguel_semanal"] / 7, 2), database_manager.VIGENCIA_INICIAL
+        )
+        for row in generate_logs(driver, days, seed, start_date):
+            batch.append((user_id, *row))
+            if len(batch) >= chunk_size:
+                db.upsert_log_rows(batch)
+                batch = []
+    if batch:
+        db.upsert_log_rows(batch)
+    return user_ids
+
+
+def write_csv(path, drivers, days, seed=DEFAULT_SEED, start_date=DEFAULT_START_DATE):
+    """Grava o histórico gerado num CSV no formato aceito pelo importer.py. Retorna o nº de linhas."""
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["username", "data", "km_rodados", "faturamento_total", "horas_trabalhadas"])
+        for driver in generate_drivers(drivers, seed):
+            for row in generate_logs(driver, days, seed, start_date):
+                writer.writerow([driver["username"], *row])
+                count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos de motoristas para testes de carga.")
+    parser.add_argument("--motoristas", type=int, default=100)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--semente", type=int, default=DEFAULT_SEED)
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--db", help="Grava direto neste banco SQLite")
+    destino.add_argument("--csv", help="Grava um CSV para o importer.py (os usuários precisam existir no banco)")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        count = write_csv(args.csv, args.motoristas, args.dias, args.semente)
+        print(f"✅ {count} linhas gravadas em {args.csv}")
+        return 0
+
+    db = database_manager.DatabaseManager(args.db, pool_size=1)
+    try:
+        user_ids = populate(db, args.motoristas, args.dias, args.semente)
+    finally:
+        db.close()
+    print(f"✅ {len(user_ids)} motoristas x {args.dias} dias gravados em {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# benchmarks/fleet.py
+# Tempo da análise da frota (fleet_analytics.fleet_summary) com 1, 2, 4... processos,
+# para conferir o ganho da varredura particionada por faixas de user_id.
+#
+# Uso:
+#   python -m benchmarks.fleet [--motoristas 200] [--dias 365] [--workers 1 2 4] [--repeticoes 3]
+#                              [--db frota.db] [--json resultado.json]
+# Com --db, usa um banco já existente (ex.: gerado uma vez com `python -m benchmarks.datagen`),
+# o que permite medir tabelas grandes (10M de linhas = 10000 motoristas x 1000 dias) sem
+# gerá-las a cada execução.
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import database_manager
+import fleet_analytics
+from benchmarks import datagen
+from benchmarks.common import environment_info, write_json
+from log_utils import configure_logging
+
+
+def measure(db_file, workers, repetitions):
+    """Melhor tempo (s) de `repetitions` execuções da análise da frota."""
+    best = None
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        summary = fleet_analytics.fleet_summary(db_file, workers=workers)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, summary
+
+
+def run(db_file, args):
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute("SELECT COUNT(*) FROM LogDiario").fetchone()[0]
+    conn.close()
+
+    results = []
+    for workers in args.workers:
+        seconds, summary = measure(db_file, workers, args.repeticoes)
+        results.append({
+            "workers": workers,
+            "segundos": round(seconds, 4),
+            "linhas_por_segundo": round(rows / seconds),
+            "motoristas": summary["totais"]["motoristas"] if summary else 0,
+        })
+    base = results[0]["segundos"]
+    for result in results:
+        result["aceleracao"] = round(base / result["segundos"], 2)
+    return rows, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo da análise da frota por quantidade de processos.")
+    parser.add_argument("--motoristas", type=int, default=200)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, fleet_analytics.FLEET_WORKERS}))
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--db", help="Banco já populado (não gera dados)")
+    parser.add_argument("--json", help="Grava o resultado neste arquivo JSON")
+    args = parser.parse_args(argv)
+    configure_logging(level="WARNING")
+
+    if args.db:
+        rows, results = run(args.db, args)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, "frota.db")
+            db = database_manager.DatabaseManager(db_file, storage_profile="concorrente")
+            datagen.populate(db, args.motoristas, args.dias)
+            rows, results = run(db_file, args)
+
+    print(f"\n{rows} linhas no LogDiario, {os.cpu_count()} núcleo(s)")
+    print(f"{'Workers':>8}{'Segundos':>11}{'Linhas/s':>14}{'Aceleração':>12}")
+    for r in results:
+        print(f"{r['workers']:>8}{r['segundos']:>11.3f}{r['linhas_por_segundo']:>14}{r['aceleracao']:>11.2f}x")
+    if args.json:
+        write_json(args.json, {"ambiente": environment_info(), "parametros": vars(args), "linhas": rows, "resultados": results})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# benchmarks/http_load.py
+# Teste de carga local do http_server.py: clientes concorrentes com conexões keep-alive
+# fazendo uma mistura de leituras de relatório (com If-None-Match) e gravações de log.
+#
+# Uso:
+#   python -m benchmarks.http_load [--clientes 16] [--segundos 10] [--motoristas 50] [--dias 365]
+#                                  [--url http://127.0.0.1:8000] [--json http_load.json]
+# Sem --url, sobe um servidor numa thread com um banco sintético temporário.
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from benchmarks import datagen
+from benchmarks.common import environment_info, summarize_latencies, write_json
+from log_utils import configure_logging
+
+# Proporção de cada operação na mistura
+OPERATIONS = (
+    ("relatorio", 0.35),
+    ("resumo", 0.25),
+    ("pagina", 0.2),
+    ("semanal", 0.1),
+    ("gravar_log", 0.1),
+)
+
+
+class Client:
+    """Cliente HTTP com uma conexão keep-alive e cache de ETags."""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.etags = {}
+        self.token = None
+
+    def request(self, method, path, body=None):
+        headers = {"Accept-Encoding": "gzip", "Connection": "keep-alive"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        elif method == "GET" and path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        try:
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError):
+            # Conexão fechada pelo servidor (ex.: keep-alive ocioso): reabre uma vez
+            self.conn.close()
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            payload = response.read()
+        if response.status == 200 and method == "GET" and response.getheader("ETag"):
+            self.etags[path] = response.getheader("ETag")
+        return response.status, payload
+
+
+def start_local_server(args, tmp):
+    """Sobe o http_server numa thread, com o api_core apontando para um banco sintético."""
+    import api_core
+    import database_manager
+    import http_server
+    from analytics import AnalyticsManager
+
+    db = database_manager.DatabaseManager(
+        os.path.join(tmp, "http_load.db"), pool_size=api_core.DB_POOL_SIZE,
+        storage_profile=api_core.DB_STORAGE_PROFILE
+    )
+    datagen.populate(db, args.motoristas, args.dias)
+    api_core.DB_MANAGER = db
+    api_core.ANALYTICS_MANAGER = AnalyticsManager(history_loader=db.get_cost_history)
+    return http_server.serve_in_thread(workers=args.workers)
+
+
+def run_client(host, port, username, args, deadline, results, errors, lock):
+    rng = random.Random(username)
+    client = Client(host, port)
+    status, payload = client.request("POST", "/api/login", {"username": username, "password": "senha"})
+    if status != 200:
+        with lock:
+            errors["login"] = errors.get("login", 0) + 1
+        return
+    client.token = json.loads(payload)["token"]
+
+    names, weights = zip(*OPERATIONS)
+    local = {name: [] for name in names}
+    local_errors = {}
+    not_modified = 0
+    while time.perf_counter() < deadline:
+        operation = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        if operation == "gravar_log":
+            day = datagen.DEFAULT_START_DATE + timedelta(days=rng.randrange(args.dias))
+            status, _ = client.request("POST", "/api/logs", {
+                "data": day.isoformat(), "km_rodados": rng.uniform(80, 300),
+                "faturamento_total": rng.uniform(150, 600), "horas_trabalhadas": rng.uniform(4, 12)
+            })
+        else:
+            path = {
+                "relatorio": "/api/relatorio",
+                "resumo": "/api/relatorio/resumo",
+                "pagina": "/api/relatorio/pagina?limite=50",
+                "semanal": "/api/relatorio/semanal?limite=12",
+            }[operation]
+            status, _ = client.request("GET", path)
+        elapsed = time.perf_counter() - start
+        if status in (200, 304):
+            local[operation].append(elapsed)
+            not_modified += status == 304
+        else:
+            local_errors[operation] = local_errors.get(operation, 0) + 1
+    client.conn.close()
+
+    with lock:
+        for name, latencies in local.items():
+            results[name].extend(latencies)
+        for name, count in local_errors.items():
+            errors[name] = errors.get(name, 0) + count
+        errors["_304"] = errors.get("_304", 0) + not_modified
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga do serviço HTTP/JSON.")
+    parser.add_argument("--url", help="Servidor já em execução (padrão: sobe um local com dados sintéticos)")
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument("--motoristas", type=int, default=50, help="Motoristas sintéticos (servidor local)")
+    parser.add_argument("--dias", type=int, default=365, help="Dias de histórico por motorista")
+    parser.add_argument("--workers", type=int, default=16, help="Workers do servidor local")
+    parser.add_argument("--json", help="Grava o resultado neste arquivo JSON")
+    args = parser.parse_args(argv)
+    configure_logging(level="WARNING")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            server = start_local_server(args, tmp)
+            host, port = server.server_address[:2]
+
+        results = {name: [] for name, _ in OPERATIONS}
+        errors = {}
+        lock = threading.Lock()
+        started = time.perf_counter()
+        deadline = started + args.segundos
+        clients = [
+            threading.Thread(target=run_client, args=(
+                host, port, datagen.driver_username(i % args.motoristas), args, deadline, results, errors, lock
+            ))
+            for i in range(args.clientes)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - started
+
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    total = sum(len(latencies) for latencies in results.values())
+    report = {
+        "ambiente": environment_info(),
+        "parametros": vars(args),
+        "requisicoes": total,
+        "requisicoes_por_segundo": round(total / elapsed, 1),
+        "respostas_304": errors.pop("_304", 0),
+        "erros": errors,
+        "operacoes": {name: summarize_latencies(latencies, errors.get(name, 0)) for name, latencies in results.items()},
+    }
+
+    print(f"\n{report['requisicoes']} requisições em {elapsed:.1f}s ({report['requisicoes_por_segundo']} req/s), "
+          f"{report['respostas_304']} respostas 304, erros: {errors or 0}")
+    print(f"{'Operação':<12}{'Qtd':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for name, r in report["operacoes"].items():
+        print(f"{name:<12}{r['operacoes']:>8}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}")
+    if args.json:
+        write_json(args.json, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# benchmarks/login.py
+# Vazão de logins (scrypt no pool do PasswordHasher) e o efeito de uma rajada de logins
+# sobre a latência das leituras de relatório.
+#
+# Uso:
+#   python -m benchmarks.login [--clientes 16] [--leitores 2] [--segundos 5] [--workers N]
+#                              [--modo thread|process] [--log2n 14] [--r 8] [--p 1] [--json resultado.json]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import database_manager
+import password_hashing
+from benchmarks import datagen
+from benchmarks.common import environment_info, summarize_latencies, write_json
+from log_utils import configure_logging
+
+# Senha usada pelo datagen para todos os motoristas
+PASSWORD = "senha"
+
+# Dias lidos por consulta de relatório (uma página do relatório web)
+PAGE_SIZE = 50
+
+
+def run_phase(db, user_ids, usernames, args, logins):
+    """Roda os leitores de relatório (e, se `logins`, os clientes de login) por args.segundos."""
+    results = {"leitura": [], "login": []}
+    stop = threading.Event()
+
+    def reader(seed_value):
+        rng = random.Random(seed_value)
+        latencies, errors = [], 0
+        while not stop.is_set():
+            user_id = rng.choice(user_ids)
+            start = time.perf_counter()
+            totals = db.get_log_totals(user_id)
+            logs, _ = db.get_logs_page(user_id, limit=PAGE_SIZE, with_metrics=True)
+            elapsed = time.perf_counter() - start
+            if totals is None or not logs:
+                errors += 1
+            else:
+                latencies.append(elapsed)
+        results["leitura"].append((latencies, errors))
+
+    def client(seed_value):
+        rng = random.Random(seed_value)
+        latencies, errors = [], 0
+        while not stop.is_set():
+            username = rng.choice(usernames)
+            start = time.perf_counter()
+            ok = db.verify_login(username, PASSWORD)
+            elapsed = time.perf_counter() - start
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+        results["login"].append((latencies, errors))
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.leitores)]
+    if logins:
+        threads += [threading.Thread(target=client, args=(1000 + i,)) for i in range(args.clientes)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.segundos)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    summary = {
+        op: summarize_latencies([lat for lats, _ in measured for lat in lats], sum(errors for _, errors in measured))
+        for op, measured in results.items() if measured
+    }
+    if logins:
+        total = summary["login"]["operacoes"]
+        cores = min(args.workers, os.cpu_count() or 1)
+        summary["logins_por_segundo"] = round(total / args.segundos, 2)
+        summary["logins_por_segundo_por_nucleo"] = round(total / args.segundos / cores, 2)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vazão de logins com scrypt e impacto nas leituras de relatório.")
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--clientes", type=int, default=16, help="Threads fazendo login sem parar")
+    parser.add_argument("--leitores", type=int, default=2, help="Threads lendo relatórios")
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=password_hashing.HASH_WORKERS)
+    parser.add_argument("--modo", choices=(password_hashing.HASH_POOL_THREAD, password_hashing.HASH_POOL_PROCESS),
+                        default=password_hashing.HASH_POOL_THREAD)
+    parser.add_argument("--log2n", type=int, default=password_hashing.SCRYPT_N.bit_length() - 1)
+    parser.add_argument("--r", type=int, default=password_hashing.SCRYPT_R)
+    parser.add_argument("--p", type=int, default=password_hashing.SCRYPT_P)
+    parser.add_argument("--json", help="Grava o resultado neste arquivo JSON")
+    args = parser.parse_args(argv)
+    configure_logging(level="WARNING")
+
+    hasher = password_hashing.PasswordHasher(2 ** args.log2n, args.r, args.p, workers=args.workers, mode=args.modo)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database_manager.DatabaseManager(
+            os.path.join(tmp, "bench.db"), pool_size=args.leitores + args.clientes,
+            storage_profile="concorrente", password_hasher=hasher
+        )
+        user_ids = datagen.populate(db, args.usuarios, args.dias)
+        usernames = [datagen.driver_username(i) for i in range(args.usuarios)]
+
+        start = time.perf_counter()
+        db.verify_login(usernames[0], PASSWORD)
+        single_ms = (time.perf_counter() - start) * 1000
+
+        report = {
+            "ambiente": environment_info(),
+            "parametros": vars(args),
+            "login_isolado_ms": round(single_ms, 2),
+            "sem_logins": run_phase(db, user_ids, usernames, args, logins=False),
+            "com_logins": run_phase(db, user_ids, usernames, args, logins=True),
+        }
+        db.close()
+    hasher.shutdown()
+
+    storm = report["com_logins"]
+    print(f"\nscrypt n=2**{args.log2n} r={args.r} p={args.p}, {args.workers} worker(s) ({args.modo}); "
+          f"login isolado: {report['login_isolado_ms']:.1f} ms")
+    print(f"Logins: {storm['logins_por_segundo']:.1f}/s ({storm['logins_por_segundo_por_nucleo']:.1f}/s por núcleo), "
+          f"p50 {storm['login']['p50_ms']:.1f} ms, p99 {storm['login']['p99_ms']:.1f} ms")
+    print(f"{'Leitura de relatório':<24}{'Qtd':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for phase in ("sem_logins", "com_logins"):
+        r = report[phase]["leitura"]
+        print(f"{phase:<24}{r['operacoes']:>8}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+    if args.json:
+        write_json(args.json, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# benchmarks/micro.py
+# Microbenchmarks dos caminhos críticos em vários tamanhos de histórico (dias por motorista).
+#
+# Uso:
+#   python -m benchmarks.micro [--tamanhos 30 365 1825] [--repeticoes 20] [--json micro.json]
+#   python -m benchmarks.compare antes.json depois.json
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+import api_core
+import database_manager
+from analytics import AnalyticsManager
+from benchmarks import datagen
+from benchmarks.common import environment_info, summarize_latencies, write_json
+from log_utils import configure_logging
+
+DEFAULT_SIZES = (30, 365, 1825)
+DEFAULT_REPEAT = 20
+
+# Motoristas extras no banco, para as consultas não rodarem numa tabela com um usuário só
+BACKGROUND_DRIVERS = 20
+
+
+def measure(fn, repeat, number=1):
+    """
+    Executa `fn` `number` vezes por amostra, em `repeat` amostras. Retorna o tempo por chamada.
+    A primeira chamada (aquecimento de caches e métricas ainda não gravadas) fica de fora.
+    """
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+@contextlib.contextmanager
+def api_core_on(db):
+    """Aponta os gerenciadores globais do api_core para o banco do benchmark."""
+    original = api_core.DB_MANAGER, api_core.ANALYTICS_MANAGER
+    api_core.DB_MANAGER = db
+    api_core.ANALYTICS_MANAGER = AnalyticsManager(history_loader=db.get_cost_history)
+    # Relatórios em cache de outro banco teriam os mesmos user_ids
+    api_core.REPORT_CACHE.clear()
+    try:
+        yield
+    finally:
+        api_core.DB_MANAGER, api_core.ANALYTICS_MANAGER = original
+        api_core.REPORT_CACHE.clear()
+
+
+def run_size(days, repeat):
+    """Roda todos os microbenchmarks num banco novo com históricos de `days` dias."""
+    results = []
+
+    def record(name, samples, rows=None):
+        result = {"nome": name, "dias": days, **summarize_latencies(samples)}
+        if rows is not None:
+            result["linhas"] = rows
+        results.append(result)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database_manager.DatabaseManager(os.path.join(tmp, "bench.db"), pool_size=1)
+        user_ids = datagen.populate(db, BACKGROUND_DRIVERS + 1, days)
+        user_id = user_ids[0]
+
+        with api_core_on(db):
+            analytics = api_core.ANALYTICS_MANAGER
+            values = analytics.get_user_values(user_id)
+            logs = db.get_all_logs_by_user(user_id)
+
+            # Cálculo de um dia: barato demais para uma chamada por amostra
+            km, fat, hrs = logs[0][1:4]
+            record("calculate_performance_metrics",
+                   measure(lambda: analytics.calculate_performance_metrics(km, fat, hrs, values), repeat, number=1000))
+
+            record("calculate_overall_metrics",
+                   measure(lambda: analytics.calculate_overall_metrics(logs, values), repeat), len(logs))
+
+            record("get_all_logs_by_user",
+                   measure(lambda: db.get_all_logs_by_user(user_id), repeat), len(logs))
+
+            # Regrava dias já existentes (o caso comum: corrigir o dia atual)
+            dates = iter([log[0] for log in logs] * (repeat + 1))
+            record("upsert_daily_log",
+                   measure(lambda: db.upsert_daily_log(user_id, next(dates), km, fat, hrs), repeat))
+            # Relatório montado do zero (cache limpo) e rerun com os dados inalterados (cache)
+            def uncached_report():
+                api_core.REPORT_CACHE.clear()
+                return api_core.get_report_web(user_id)
+            record("api_core.get_report_web",
+                   measure(uncached_report, repeat), len(logs))
+            record("api_core.get_report_web[cache]",
+                   measure(lambda: api_core.get_report_web(user_id), repeat, number=1000), len(logs))
+
+        db.close()
+    return results
+
+
+def print_results(results):
+    print(f"\n{'Benchmark':<32}{'Dias':>6}{'Linhas':>8}{'média ms':>11}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in results:
+        print(f"{r['nome']:<32}{r['dias']:>6}{r.get('linhas', ''):>8}{r['media_ms']:>11.4f}{r['p50_ms']:>10.4f}{r['p95_ms']:>10.4f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks de analytics, banco e api_core.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Dias de histórico por motorista")
+    parser.add_argument("--repeticoes", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--json", help="Grava o resultado neste arquivo JSON")
+    args = parser.parse_args(argv)
+    # Só avisos e erros: as mensagens de sucesso de cada gravação distorceriam a medição
+    configure_logging(level="WARNING")
+
+    results = []
+    for days in args.tamanhos:
+        results.extend(run_size(days, args.repeticoes))
+
+    print_results(results)
+    if args.json:
+        write_json(args.json, {"ambiente": environment_info(), "parametros": vars(args), "resultados": results})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
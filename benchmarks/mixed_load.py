@@ -0,0 +1,131 @@
+# benchmarks/mixed_load.py
+# Latência (p50/p95/p99) de leituras de relatório e gravações de log concorrentes,
+# comparando o journal de rollback com o perfil WAL ("concorrente").
+#
+# Uso:
+#   python -m benchmarks.mixed_load [--usuarios 50] [--dias 365] [--leitores 8] [--escritores 2]
+#                                   [--segundos 10] [--json resultado.json]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+import database_manager
+from benchmarks import datagen
+from benchmarks.common import environment_info, summarize_latencies, write_json
+from log_utils import configure_logging
+
+# Dias lidos por consulta de relatório (uma página do relatório web)
+PAGE_SIZE = 50
+
+# Perfis comparados: o primeiro reproduz o comportamento antigo (journal de rollback)
+PROFILES = {
+    "rollback": {"journal_mode": "DELETE"},
+    "concorrente": "concorrente",
+}
+
+
+def run_profile(name, profile, args):
+    """Roda a carga mista num banco novo com o perfil informado."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        threads_total = args.leitores + args.escritores
+        db = database_manager.DatabaseManager(db_file, pool_size=threads_total, storage_profile=profile)
+        user_ids = datagen.populate(db, args.usuarios, args.dias)
+        dates = [(datagen.DEFAULT_START_DATE + timedelta(days=d)).isoformat() for d in range(args.dias)]
+
+        # Cada thread registra as suas medições: {op: [(latências, erros), ...]}
+        results = {"leitura": [], "escrita": []}
+        stop = threading.Event()
+
+        def reader(seed_value):
+            rng = random.Random(seed_value)
+            latencies, errors = [], 0
+            while not stop.is_set():
+                user_id = rng.choice(user_ids)
+                start = time.perf_counter()
+                # Mesmas consultas do relatório: totais + primeira página de dias
+                totals = db.get_log_totals(user_id)
+                logs, _ = db.get_logs_page(user_id, limit=PAGE_SIZE, with_metrics=True)
+                elapsed = time.perf_counter() - start
+                if totals is None or not logs:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+            results["leitura"].append((latencies, errors))
+
+        def writer(seed_value):
+            rng = random.Random(seed_value)
+            latencies, errors = [], 0
+            while not stop.is_set():
+                user_id = rng.choice(user_ids)
+                data = rng.choice(dates)
+                start = time.perf_counter()
+                ok = db.upsert_log_rows([(user_id, data, rng.uniform(80, 300), rng.uniform(150, 600), rng.uniform(4, 12))])
+                elapsed = time.perf_counter() - start
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+            results["escrita"].append((latencies, errors))
+
+        workers = [threading.Thread(target=reader, args=(i,)) for i in range(args.leitores)]
+        workers += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(args.escritores)]
+        for worker in workers:
+            worker.start()
+        time.sleep(args.segundos)
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+        journal_mode = db.storage_info()["journal_mode"]
+        db.close()
+
+    return {
+        "perfil": name,
+        "journal_mode": journal_mode,
+        **{
+            op: summarize_latencies([lat for lats, _ in measured for lat in lats], sum(errors for _, errors in measured))
+            for op, measured in results.items()
+        }
+    }
+
+
+def print_report(report):
+    print(f"\n{'Perfil':<14}{'Op.':<10}{'Qtd':>8}{'Erros':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for result in report["resultados"]:
+        for op in ("leitura", "escrita"):
+            r = result[op]
+            print(f"{result['perfil']:<14}{op:<10}{r['operacoes']:>8}{r['erros']:>7}"
+                  f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latência de leituras e gravações concorrentes por perfil de armazenamento.")
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--leitores", type=int, default=8)
+    parser.add_argument("--escritores", type=int, default=2)
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument("--perfis", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--json", help="Grava o resultado neste arquivo JSON")
+    args = parser.parse_args(argv)
+    configure_logging(level="WARNING")
+
+    report = {
+        "ambiente": environment_info(),
+        "parametros": vars(args),
+        "resultados": [run_profile(name, PROFILES[name], args) for name in args.perfis],
+    }
+    print_report(report)
+    if args.json:
+        write_json(args.json, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+# cache_utils.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Cache em memória thread-safe com limite de tamanho: ao passar de `maxsize`
+    entradas, descarta a usada há mais tempo (Least Recently Used).
+    Com `ttl` (segundos), as entradas também expiram após esse tempo desde a gravação.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        if maxsize < 1:
+            raise ValueError("O tamanho do cache deve ser pelo menos 1.")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("O TTL do cache deve ser positivo.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # chave -> (valor, expira_em)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key, default=None):
+        """Retorna o valor da chave (marcando-a como usada recentemente) ou `default`."""
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Grava o valor, descartando a entrada mais antiga se o cache estiver cheio."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """Remove a chave do cache (se existir)."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Esvazia o cache."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """Retorna os contadores de uso do cache."""
+        with self._lock:
+            return {
+                "size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "expired": self.expired
+            }
@@ -1,36 +1,594 @@
 import sqlite3
 import os
+import queue
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import password_hashing
+from instrumentation import KIND_DB, instrumented
+from log_utils import get_logger
+
+logger = get_logger("database")
 
 # 1. Definir o caminho do banco de dados
 DB_FILE = 'daily_log.db'
 
+# Modos de operação do pool de conexões
+POOL_MODE_CHECKOUT = 'checkout' # Conexões compartilhadas: retira da fila e devolve ao final
+POOL_MODE_THREAD = 'thread'     # Cada thread mantém a sua própria conexão
+
+# Perfis de armazenamento: PRAGMAs aplicados em cada conexão aberta
+STORAGE_PROFILES = {
+    # Padrões do SQLite; mantém o journal_mode gravado no arquivo (None = não altera), para
+    # não desfazer o WAL de um banco compartilhado com a aplicação web
+    "padrao": {
+        "journal_mode": None,
+        "synchronous": "FULL",
+        "busy_timeout": 5000,   # ms esperando um lock antes de "database is locked"
+        "cache_size": -2000,    # Negativo = KiB (2 MB)
+        "mmap_size": 0,
+    },
+    # Várias sessões web no mesmo arquivo: WAL deixa leitores e o escritor rodarem juntos
+    "concorrente": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL", # Seguro com WAL; só perde as últimas transações numa queda de energia
+        "busy_timeout": 10000,
+        "cache_size": -16000,    # 16 MB por conexão
+        "mmap_size": 64 * 1024 * 1024,
+    },
+}
+DEFAULT_STORAGE_PROFILE = "padrao"
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+# Colunas de métricas calculadas e gravadas junto com o log (NULL em logs antigos)
+LOG_METRIC_COLUMNS = {
+    "custo_combustivel": "REAL",
+    "custo_fixo": "REAL",
+    "lucro_liquido": "REAL",
+}
+
+# Tabelas de totais por período (mantidas a cada gravação de log) e a coluna do período
+ROLLUP_TABLES = {
+    "RollupSemanal": "semana",  # Semana ISO: AAAA-Www
+    "RollupMensal": "mes",      # Mês: AAAA-MM
+}
+
+# Colunas somadas nos rollups; dias_sem_metricas conta os logs antigos ainda sem métricas gravadas
+ROLLUP_VALUE_COLUMNS = (
+    "km_rodados", "faturamento_total", "horas_trabalhadas", "custo_combustivel", "lucro_liquido",
+    "dias", "dias_sem_metricas"
+)
+
+# Linhas lidas por vez (fetchmany) ao percorrer o histórico inteiro, ex.: na exportação
+EXPORT_BATCH_SIZE = 1000
+
+# Colunas de cada alteração do feed (LogAlteracoes), na ordem das tuplas de get_changes
+CHANGE_COLUMNS = ("seq", "user_id", "id", "data", "km", "fat", "horas", "custo_comb", "custo_fixo", "lucro_liquido")
+
+# Registra no feed o estado atual do log (user_id, data), na transação que acabou de gravá-lo
+_RECORD_CHANGE_QUERY = """
+INSERT INTO LogAlteracoes
+    (user_id, data, log_id, km_rodados, faturamento_total, horas_trabalhadas, custo_combustivel, custo_fixo, lucro_liquido)
+SELECT user_id, data, id, km_rodados, faturamento_total, horas_trabalhadas, custo_combustivel, custo_fixo, lucro_liquido
+FROM LogDiario
+"""
+
+# Bancos (caminho absoluto) cujo schema já foi garantido neste processo
+_SCHEMA_READY = set()
+_SCHEMA_LOCK = threading.Lock()
+
+
+def normalize_log_row(data, km_rodados, faturamento_total, horas_trabalhadas):
+    """
+    Valida e converte os campos de um log diário.
+    Aceita a data como date/datetime ou texto AAAA-MM-DD, e números com vírgula decimal.
+    Retorna (data, km, faturamento, horas) ou lança ValueError.
+    """
+    if isinstance(data, datetime):
+        data = data.date().isoformat()
+    elif isinstance(data, date):
+        data = data.isoformat()
+    else:
+        data = str(data).strip()
+        try:
+            # Mesma validação do app.py: formato AAAA-MM-DD
+            datetime.strptime(data, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"Formato de data inválido: '{data}'. Use AAAA-MM-DD.")
+
+    values = []
+    for field, value in (('km_rodados', km_rodados),
+                         ('faturamento_total', faturamento_total),
+                         ('horas_trabalhadas', horas_trabalhadas)):
+        try:
+            number = float(str(value).strip().replace(',', '.'))
+        except ValueError:
+            raise ValueError(f"Valor inválido para {field}: '{value}'.")
+        if number < 0 or number != number:
+            raise ValueError(f"Valor inválido para {field}: '{value}'.")
+        values.append(number)
+
+    return (data, *values)
+
+
+def validate_log_rows(rows):
+    """
+    Valida uma sequência de (data, km_rodados, faturamento_total, horas_trabalhadas).
+    Retorna (resultados, linhas_validas): um resultado por linha, na ordem recebida
+    ({"data", "km", "fat", "horas", "ok", "erro"}), e as linhas válidas já convertidas.
+    """
+    outcomes = []
+    valid_rows = []
+    for row in rows:
+        try:
+            data, km, fat, hrs = normalize_log_row(*row)
+        except (TypeError, ValueError) as e:
+            outcomes.append({
+                "data": row[0] if row else None,
+                "km": None, "fat": None, "horas": None,
+                "ok": False, "erro": str(e)
+            })
+            continue
+        outcomes.append({"data": data, "km": km, "fat": fat, "horas": hrs, "ok": True, "erro": None})
+        valid_rows.append((data, km, fat, hrs))
+    return outcomes, valid_rows
+
+
+def period_keys(data):
+    """Retorna a semana ISO ('AAAA-Www') e o mês ('AAAA-MM') de uma data AAAA-MM-DD."""
+    year, week, _ = date.fromisoformat(data).isocalendar()
+    return f"{year}-W{week:02d}", data[:7]
+
+
+def resolve_storage_profile(profile=DEFAULT_STORAGE_PROFILE):
+    """
+    Retorna os PRAGMAs validados de um perfil: o nome de um STORAGE_PROFILES ou um dicionário
+    com os valores a sobrescrever no perfil padrão (ex.: {"journal_mode": "WAL"}).
+    """
+    if isinstance(profile, str):
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f"Perfil de armazenamento desconhecido: {profile}")
+        settings = dict(STORAGE_PROFILES[profile])
+    else:
+        unknown = set(profile) - set(STORAGE_PROFILES[DEFAULT_STORAGE_PROFILE])
+        if unknown:
+            raise ValueError(f"PRAGMAs não suportados no perfil: {', '.join(sorted(unknown))}")
+        settings = {**STORAGE_PROFILES[DEFAULT_STORAGE_PROFILE], **profile}
+
+    if settings["journal_mode"] is not None:
+        settings["journal_mode"] = str(settings["journal_mode"]).upper()
+    settings["synchronous"] = str(settings["synchronous"]).upper()
+    if settings["journal_mode"] not in JOURNAL_MODES + (None,):
+        raise ValueError(f"journal_mode inválido: {settings['journal_mode']}")
+    if settings["synchronous"] not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f"synchronous inválido: {settings['synchronous']}")
+    for key in ("busy_timeout", "cache_size", "mmap_size"):
+        settings[key] = int(settings[key])
+    return settings
+
+
+def _apply_storage_profile(conn, settings):
+    """Aplica os PRAGMAs do perfil numa conexão recém-aberta."""
+    # busy_timeout primeiro: trocar o journal_mode também precisa esperar por locks
+    conn.execute(f"PRAGMA busy_timeout = {settings['busy_timeout']}")
+    if settings["journal_mode"]:
+        conn.execute(f"PRAGMA journal_mode = {settings['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {settings['cache_size']}")
+    conn.execute(f"PRAGMA mmap_size = {settings['mmap_size']}")
+
+
+def _log_columns(with_metrics=False):
+    """Colunas das consultas de logs: dados brutos e, opcionalmente, as métricas gravadas."""
+    columns = "data, km_rodados, faturamento_total, horas_trabalhadas"
+    if with_metrics:
+        columns += ", " + ", ".join(LOG_METRIC_COLUMNS)
+    return columns
+
+
+def _date_range_clause(start_date=None, end_date=None):
+    """Monta o filtro SQL opcional de intervalo de datas (inclusivo) e seus parâmetros."""
+    clause = ""
+    params = []
+    if start_date:
+        clause += " AND data >= ?"
+        params.append(start_date)
+    if end_date:
+        clause += " AND data <= ?"
+        params.append(end_date)
+    return clause, params
+
+
+def _rollup_upsert_query(table):
+    """UPSERT que soma (delta) os valores ao total do período."""
+    period_column = ROLLUP_TABLES[table]
+    updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in ROLLUP_VALUE_COLUMNS)
+    return f"""
+    INSERT INTO {table} (user_id, {period_column}, {", ".join(ROLLUP_VALUE_COLUMNS)})
+    VALUES (?, ?, {", ".join("?" for _ in ROLLUP_VALUE_COLUMNS)})
+    ON CONFLICT(user_id, {period_column}) DO UPDATE SET {updates};
+    """
+
+
+def _rollup_contribution(km, fat, hrs, custo_comb, lucro):
+    """Quanto um log soma em cada coluna de ROLLUP_VALUE_COLUMNS."""
+    return (km, fat, hrs, custo_comb or 0.0, lucro or 0.0, 1, 1 if lucro is None else 0)
+
+
+def _new_rollup_totals():
+    return {table: defaultdict(lambda: [0] * len(ROLLUP_VALUE_COLUMNS)) for table in ROLLUP_TABLES}
+
+
+def _rebuild_rollups(cursor):
+    """Recalcula todas as tabelas de rollup a partir do LogDiario."""
+    totals = _new_rollup_totals()
+    rows = cursor.execute("""
+        SELECT user_id, data, km_rodados, faturamento_total, horas_trabalhadas, custo_combustivel, lucro_liquido
+        FROM LogDiario
+    """).fetchall()
+    for user_id, data, *values in rows:
+        contribution = _rollup_contribution(*values)
+        for table, period in zip(ROLLUP_TABLES, period_keys(data)):
+            total = totals[table][(user_id, period)]
+            for i, value in enumerate(contribution):
+                total[i] += value
+
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.executemany(
+            _rollup_upsert_query(table),
+            [(user_id, period, *total) for (user_id, period), total in totals[table].items()]
+        )
+
+
+class QueryInterrupted(Exception):
+    """
+    Consulta cancelada com DatabaseManager.interrupt_thread (timeout/cancelamento de quem aguardava).
+    Não é sqlite3.Error de propósito: atravessa o tratamento de erros dos métodos, que
+    devolveriam um resultado vazio como se fosse o real (e ele poderia ir para o cache).
+    """
+
+
+@contextmanager
+def _raise_query_interrupted():
+    """Converte o sqlite3.OperationalError "interrupted" (conn.interrupt) em QueryInterrupted."""
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if str(e) == "interrupted":
+            raise QueryInterrupted("Consulta interrompida.") from e
+        raise
+
+
+class _ThreadConnection:
+    """Conexão de uma thread no modo 'thread'; coletada (e a conexão fechada) quando a thread termina."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """
+    Pool thread-safe de conexões SQLite persistentes.
+
+    - Modo 'checkout': as conexões livres ficam numa fila. Cada operação retira
+      uma conexão (ou cria uma nova, até `size`) e a devolve ao terminar.
+    - Modo 'thread': cada thread reaproveita a sua própria conexão. `size` limita
+      quantas operações podem usar o banco ao mesmo tempo. A conexão é fechada quando a
+      thread termina (ex.: as threads de cada rerun do Streamlit), então as conexões abertas
+      acompanham as threads vivas, não todas as que já usaram o pool.
+
+    Nos dois modos, se todas as vagas estiverem ocupadas a chamada espera até
+    `timeout` segundos antes de falhar com sqlite3.OperationalError.
+    """
+
+    def __init__(self, connection_factory, size=5, mode=POOL_MODE_CHECKOUT, timeout=30.0):
+        if mode not in (POOL_MODE_CHECKOUT, POOL_MODE_THREAD):
+            raise ValueError(f"Modo de pool inválido: {mode}")
+        if size < 1:
+            raise ValueError("O tamanho do pool deve ser pelo menos 1.")
+
+        self._factory = connection_factory
+        self.size = size
+        self.mode = mode
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()           # Modo checkout: conexões livres
+        self._slots = threading.BoundedSemaphore(size) # Modo thread: operações simultâneas
+        self._local = threading.local()          # Modo thread: conexão da thread atual
+        self._all_connections = []
+        self._owners = {}                        # thread id -> conexões emprestadas a ela
+        self._open_count = 0
+        self._closed = False
+
+        self._stats = {
+            "hits": 0,         # Conexão reaproveitada
+            "misses": 0,       # Conexão nova precisou ser aberta
+            "waits": 0,        # Chamadas que esperaram por uma vaga
+            "timeouts": 0,     # Chamadas que desistiram de esperar
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "in_use": 0,
+        }
+
+    # --- CONTROLE INTERNO ---
+
+    def _new_connection(self):
+        conn = self._factory()
+        with self._lock:
+            self._all_connections.append(conn)
+            self._stats["misses"] += 1
+        return conn
+
+    def _record_wait(self, waited):
+        with self._lock:
+            self._stats["waits"] += 1
+            self._stats["wait_time_total"] += waited
+            if waited > self._stats["wait_time_max"]:
+                self._stats["wait_time_max"] = waited
+
+    def _pool_exhausted(self):
+        with self._lock:
+            self._stats["timeouts"] += 1
+        return sqlite3.OperationalError(
+            f"Pool de conexões esgotado: nenhuma conexão livre em {self.timeout}s."
+        )
+
+    def _acquire_checkout(self):
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats["hits"] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        # Ainda há espaço no pool: reserva a vaga e abre uma conexão nova
+        with self._lock:
+            can_create = self._open_count < self.size
+            if can_create:
+                self._open_count += 1
+        if can_create:
+            try:
+                return self._new_connection()
+            except Exception:
+                with self._lock:
+                    self._open_count -= 1
+                raise
+
+        # Pool cheio: espera alguma conexão ser devolvida
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise self._pool_exhausted()
+        self._record_wait(time.perf_counter() - start)
+        with self._lock:
+            self._stats["hits"] += 1
+        return conn
+
+    def _acquire_thread(self):
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            if not self._slots.acquire(timeout=self.timeout):
+                raise self._pool_exhausted()
+            self._record_wait(time.perf_counter() - start)
+
+        holder = getattr(self._local, "holder", None)
+        conn = holder.conn if holder is not None else None
+        if conn is None:
+            try:
+                conn = self._new_connection()
+            except Exception:
+                self._slots.release()
+                raise
+            holder = self._local.holder = _ThreadConnection(conn)
+            # Os dados do threading.local somem quando a thread termina: fecha a conexão junto
+            weakref.finalize(holder, self._close_thread_connection, conn)
+        else:
+            with self._lock:
+                self._stats["hits"] += 1
+        return conn
+
+    def _discard(self, conn):
+        """Remove do pool uma conexão que não pode mais ser reaproveitada."""
+        with self._lock:
+            if conn in self._all_connections:
+                self._all_connections.remove(conn)
+                if self.mode == POOL_MODE_CHECKOUT:
+                    # _open_count é a reserva de vagas do modo 'checkout' (no 'thread', o limite é o semáforo)
+                    self._open_count -= 1
+        if self.mode == POOL_MODE_THREAD:
+            self._local.holder = None
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _close_thread_connection(self, conn):
+        """Fecha a conexão de uma thread que terminou (modo 'thread')."""
+        with self._lock:
+            if conn not in self._all_connections:
+                return  # Já descartada ou fechada por close_all
+            self._all_connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    # --- API PÚBLICA ---
+
+    def acquire(self):
+        """Retorna uma conexão do pool. Deve ser devolvida com release()."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("O pool de conexões já foi fechado.")
+
+        if self.mode == POOL_MODE_CHECKOUT:
+            conn = self._acquire_checkout()
+        else:
+            conn = self._acquire_thread()
+
+        with self._lock:
+            self._stats["in_use"] += 1
+            self._owners.setdefault(threading.get_ident(), []).append(conn)
+        return conn
+
+    def release(self, conn, broken=False):
+        """Devolve a conexão ao pool (ou a descarta se `broken` for True)."""
+        with self._lock:
+            self._stats["in_use"] -= 1
+            owned = self._owners.get(threading.get_ident(), [])
+            if conn in owned:
+                owned.remove(conn)
+            if not owned:
+                self._owners.pop(threading.get_ident(), None)
+
+        if broken or self._closed:
+            self._discard(conn)
+        elif self.mode == POOL_MODE_CHECKOUT:
+            self._idle.put(conn)
+
+        if self.mode == POOL_MODE_THREAD:
+            self._slots.release()
+
+    def interrupt(self, thread_id):
+        """
+        Interrompe a consulta em andamento nas conexões emprestadas à thread `thread_id`
+        (ela recebe sqlite3.OperationalError "interrupted"). Retorna True se havia alguma.
+        """
+        with self._lock:
+            connections = list(self._owners.get(thread_id, []))
+        for conn in connections:
+            conn.interrupt()
+        return bool(connections)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager que empresta uma conexão do pool.
+        Em caso de erro, desfaz a transação pendente antes de devolver a conexão.
+        """
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def stats(self):
+        """Retorna um snapshot dos contadores do pool."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["open_connections"] = len(self._all_connections)
+        snapshot["size"] = self.size
+        snapshot["mode"] = self.mode
+        snapshot["wait_time_avg"] = (
+            snapshot["wait_time_total"] / snapshot["waits"] if snapshot["waits"] else 0.0
+        )
+        return snapshot
+
+    def close_all(self):
+        """Fecha todas as conexões abertas pelo pool."""
+        self._closed = True
+        with self._lock:
+            connections = self._all_connections
+            self._all_connections = []
+            self._open_count = 0
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
 class DatabaseManager:
     """
     Gerencia a conexão e as operações de CRUD (Create, Read, Update, Delete)
     com o banco de dados SQLite.
+
+    Com `pool_size` > 0, as operações reaproveitam conexões persistentes de um
+    ConnectionPool em vez de abrir e fechar uma conexão a cada chamada.
+
+    `storage_profile` define os PRAGMAs de cada conexão (journal_mode, synchronous,
+    busy_timeout, cache_size e mmap_size): o nome de um STORAGE_PROFILES ou um dicionário.
+
+    `password_hasher` (PasswordHasher) calcula e verifica os hashes de senha no seu próprio
+    pool de workers; o padrão é o hasher compartilhado password_hashing.DEFAULT_HASHER.
     """
 
-    def __init__(self, db_file=DB_FILE):
+    def __init__(self, db_file=DB_FILE, pool_size=0, pool_mode=POOL_MODE_CHECKOUT, pool_timeout=30.0,
+                 storage_profile=DEFAULT_STORAGE_PROFILE, password_hasher=None):
         self.db_file = db_file
+        self.storage = resolve_storage_profile(storage_profile)
+        self.hasher = password_hasher or password_hashing.DEFAULT_HASHER
         self.conn = None
         self.cursor = None
+        self.pool = None
+        if pool_size > 0:
+            self.pool = ConnectionPool(
+                self._open_connection, size=pool_size, mode=pool_mode, timeout=pool_timeout
+            )
+        # Conexões exclusivas de threads, fora do pool (open_thread_connection)
+        self._thread_local = threading.local()
+        self._thread_connections = {}  # thread_id -> conexão
+        self._thread_lock = threading.Lock()
         # Apenas inicializa, sem tentar se conectar aqui.
 
+    def _open_connection(self):
+        """Abre uma nova conexão e garante (uma vez por processo) que as tabelas existam."""
+        # check_same_thread=False: no modo pool a conexão pode ser usada por outra thread,
+        # mas o pool garante que apenas uma thread a utilize por vez.
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        try:
+            _apply_storage_profile(conn, self.storage)
+            self._ensure_schema(conn)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _ensure_schema(self, conn):
+        """Executa o _setup_db apenas na primeira conexão do processo a cada banco."""
+        if self.db_file == ':memory:':
+            # Cada conexão em memória é um banco novo
+            self._setup_db(conn.cursor())
+            return
+
+        key = os.path.abspath(self.db_file)
+        if key in _SCHEMA_READY:
+            return
+        with _SCHEMA_LOCK:
+            if key not in _SCHEMA_READY:
+                self._setup_db(conn.cursor())
+                _SCHEMA_READY.add(key)
+
     def _connect(self):
         """Conecta-se ao banco de dados e garante que as tabelas existam."""
         try:
             # Garante que a conexão está fechada antes de abrir
             if self.conn:
                 self.conn.close()
-            
-            self.conn = sqlite3.connect(self.db_file)
+
+            self.conn = self._open_connection()
             self.cursor = self.conn.cursor()
-            
-            # CHAMA O SETUP AQUI: Garante que as tabelas são criadas
-            self._setup_db() 
-            
+
         except sqlite3.Error as e:
-            print(f"Erro ao conectar ao banco de dados: {e}")
+            logger.error("Erro ao conectar ao banco de dados: %s", e)
 
     def _disconnect(self):
         """Fecha a conexão com o banco de dados."""
@@ -39,12 +597,114 @@ class DatabaseManager:
             self.conn = None
             self.cursor = None
 
-    def _setup_db(self):
+    @contextmanager
+    def _connection(self):
+        """
+        Fornece uma conexão para uma operação: a exclusiva da thread (open_thread_connection),
+        se houver; senão, emprestada do pool, se ativo, ou uma conexão avulsa que é fechada ao final.
         """
-        Cria as tabelas (Usuários e Log Diário) se elas não existirem.
+        thread_conn = getattr(self._thread_local, "conn", None)
+        if thread_conn is not None and self._thread_connections.get(threading.get_ident()) is thread_conn:
+            try:
+                with _raise_query_interrupted():
+                    yield thread_conn
+            except Exception:
+                # Como no pool: a próxima operação da thread não herda a transação pela metade
+                try:
+                    thread_conn.rollback()
+                except sqlite3.Error:
+                    pass
+                raise
+            return
+
+        if self.pool is not None:
+            with self.pool.connection() as conn:
+                with _raise_query_interrupted():
+                    yield conn
+            return
+
+        conn = self._open_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def pool_stats(self):
+        """Retorna os contadores de hit/miss/espera do pool, ou None se o pool não estiver ativo."""
+        if self.pool is None:
+            return None
+        return self.pool.stats()
+
+    def interrupt_thread(self, thread_id):
+        """
+        Cancela a consulta que a thread `thread_id` está executando na sua conexão exclusiva
+        ou numa conexão do pool.
+        """
+        with self._thread_lock:
+            thread_conn = self._thread_connections.get(thread_id)
+        if thread_conn is not None:
+            thread_conn.interrupt()
+            return True
+        if self.pool is None:
+            return False
+        return self.pool.interrupt(thread_id)
+
+    def open_thread_connection(self):
+        """
+        Abre uma conexão exclusiva para a thread atual, fora do pool: as operações da thread
+        passam a usar só ela, sem disputar as conexões do pool com as demais threads.
+        Retorna True se abriu (se falhar, a thread continua usando o pool).
+        """
+        try:
+            conn = self._open_connection()
+        except sqlite3.Error as e:
+            logger.error("Erro ao abrir a conexão exclusiva da thread: %s", e)
+            return False
+        thread_id = threading.get_ident()
+        self.close_thread_connection(thread_id)
+        self._thread_local.conn = conn
+        with self._thread_lock:
+            self._thread_connections[thread_id] = conn
+        return True
+
+    def close_thread_connection(self, thread_id=None):
+        """Fecha a conexão exclusiva da thread `thread_id` (padrão: a atual). Retorna True se havia uma."""
+        with self._thread_lock:
+            conn = self._thread_connections.pop(threading.get_ident() if thread_id is None else thread_id, None)
+        if conn is None:
+            return False
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.error("Erro ao fechar a conexão exclusiva da thread: %s", e)
+        return True
+
+    def storage_info(self):
+        """Retorna os PRAGMAs efetivamente em uso por uma conexão (ex.: journal_mode 'wal')."""
+        with self._connection() as conn:
+            return {
+                pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+                for pragma in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size")
+            }
+
+    def close(self):
+        """Fecha a conexão avulsa, as conexões exclusivas de threads e todas as conexões do pool."""
+        self._disconnect()
+        with self._thread_lock:
+            thread_ids = list(self._thread_connections)
+        for thread_id in thread_ids:
+            self.close_thread_connection(thread_id)
+        if self.pool is not None:
+            self.pool.close_all()
+
+    def _setup_db(self, cursor=None):
+        """
+        Cria as tabelas (Usuários, Log Diário, Histórico de Custos, Rollups, Versão dos Dados e
+        Feed de Alterações) se elas não existirem, e adiciona as colunas novas em bancos criados antes delas.
         EXECUTA DIRETO, SEM CHAMAR _execute_query para evitar recursão.
         """
-        
+        cursor = cursor or self.cursor
+
         # 1. Tabela de Usuários
         create_user_table = """
         CREATE TABLE IF NOT EXISTS Usuarios (
@@ -58,21 +718,120 @@ class DatabaseManager:
         CREATE TABLE IF NOT EXISTS LogDiario (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
-            data TEXT NOT NULL, 
+            data TEXT NOT NULL,
             km_rodados REAL NOT NULL,
             faturamento_total REAL NOT NULL,
             horas_trabalhadas REAL NOT NULL,
-            
+            custo_combustivel REAL,
+            custo_fixo REAL,
+            lucro_liquido REAL,
+
+            FOREIGN KEY (user_id) REFERENCES Usuarios(id),
+            UNIQUE(user_id, data)
+        );
+        """
+
+        # 3. Tabela HistoricoCustos (Perfis com data de vigência: cada dia usa os preços da sua época)
+        create_cost_history_table = """
+        CREATE TABLE IF NOT EXISTS HistoricoCustos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            vigente_desde TEXT NOT NULL,
+            consumo_medio_km_l REAL NOT NULL,
+            tipo_combustivel TEXT NOT NULL,
+            preco_combustivel_l REAL NOT NULL,
+            custo_fixo_diario REAL NOT NULL,
+
             FOREIGN KEY (user_id) REFERENCES Usuarios(id),
-            UNIQUE(user_id, data) 
+            UNIQUE(user_id, vigente_desde)
+        );
+        """
+        # 4. Tabelas de Rollup (totais por usuário por semana ISO e por mês)
+        create_rollup_tables = [
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INTEGER NOT NULL,
+                {period_column} TEXT NOT NULL,
+                km_rodados REAL NOT NULL DEFAULT 0,
+                faturamento_total REAL NOT NULL DEFAULT 0,
+                horas_trabalhadas REAL NOT NULL DEFAULT 0,
+                custo_combustivel REAL NOT NULL DEFAULT 0,
+                lucro_liquido REAL NOT NULL DEFAULT 0,
+                dias INTEGER NOT NULL DEFAULT 0,
+                dias_sem_metricas INTEGER NOT NULL DEFAULT 0,
+
+                PRIMARY KEY (user_id, {period_column})
+            );
+            """
+            for table, period_column in ROLLUP_TABLES.items()
+        ]
+
+        # 5. Versão dos dados de cada usuário: muda na mesma transação de cada gravação de logs,
+        # e as cópias derivadas (ex.: snapshots colunares) conferem se ainda estão atualizadas
+        create_version_table = """
+        CREATE TABLE IF NOT EXISTS VersaoDados (
+            user_id INTEGER PRIMARY KEY,
+            versao INTEGER NOT NULL
         );
         """
-        
+
+        # 6. Feed de alterações do LogDiario: uma linha por log gravado, com o estado gravado, na
+        # mesma transação. O seq (AUTOINCREMENT) só cresce e nunca é reutilizado, então serve de
+        # cursor para quem sincroniza só o que mudou (get_changes)
+        create_change_table = """
+        CREATE TABLE IF NOT EXISTS LogAlteracoes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            log_id INTEGER NOT NULL,
+            km_rodados REAL NOT NULL,
+            faturamento_total REAL NOT NULL,
+            horas_trabalhadas REAL NOT NULL,
+            custo_combustivel REAL,
+            custo_fixo REAL,
+            lucro_liquido REAL
+        );
+        """
+        create_change_user_index = """
+        CREATE INDEX IF NOT EXISTS idx_logalteracoes_usuario ON LogAlteracoes (user_id, seq);
+        """
+
+        # 7. Índice de cobertura dos relatórios: as leituras por usuário/período (dados brutos
+        # e métricas gravadas) são respondidas só pelo índice, sem ler as páginas da tabela
+        create_log_covering_index = """
+        CREATE INDEX IF NOT EXISTS idx_logdiario_relatorio ON LogDiario
+            (user_id, data, km_rodados, faturamento_total, horas_trabalhadas,
+             custo_combustivel, custo_fixo, lucro_liquido);
+        """
+
         # Executa as queries diretamente na conexão ativa
-        if self.cursor:
-            self.cursor.execute(create_user_table)
-            self.cursor.execute(create_log_table_query)
-            self.conn.commit()
+        if cursor:
+            cursor.execute(create_user_table)
+            cursor.execute(create_log_table_query)
+            cursor.execute(create_cost_history_table)
+
+            # Bancos antigos: adiciona as colunas de métricas que faltarem no LogDiario
+            existing = {row[1] for row in cursor.execute("PRAGMA table_info(LogDiario)")}
+            for column, column_type in LOG_METRIC_COLUMNS.items():
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE LogDiario ADD COLUMN {column} {column_type}")
+            cursor.execute(create_log_covering_index)
+            cursor.execute(create_version_table)
+
+            # Rollups e feed criados agora num banco que já tem logs: partem do histórico
+            existing_tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            cursor.execute(create_change_table)
+            cursor.execute(create_change_user_index)
+            if "LogAlteracoes" not in existing_tables:
+                # Quem lê o feed desde o início (seq 0) recebe o histórico inteiro
+                cursor.execute(_RECORD_CHANGE_QUERY + " ORDER BY user_id, data")
+            missing_rollups = [table for table in ROLLUP_TABLES if table not in existing_tables]
+            for create_rollup_table in create_rollup_tables:
+                cursor.execute(create_rollup_table)
+            if missing_rollups:
+                _rebuild_rollups(cursor)
+
+            cursor.connection.commit()
 
 
     def _execute_query(self, query, params=()):
@@ -80,99 +839,597 @@ class DatabaseManager:
         Método auxiliar privado para executar uma query e tratar a conexão.
         Retorna o lastrowid (ID da linha inserida) ou True/False para outras operações.
         """
-        self._connect()
         try:
-            self.cursor.execute(query, params)
-            self.conn.commit()
-            
-            # Se for uma inserção, retorna o ID da nova linha
-            if query.strip().upper().startswith('INSERT'):
-                return self.cursor.lastrowid
-            
-            return True # Retorna True para outras operações de sucesso
-            
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                conn.commit()
+
+                # Se for uma inserção, retorna o ID da nova linha
+                if query.strip().upper().startswith('INSERT'):
+                    return cursor.lastrowid
+
+                return True # Retorna True para outras operações de sucesso
+
         except sqlite3.Error as e:
             # Não exibe a query, apenas a mensagem do erro para o usuário
-            print(f"Erro na execução da query: {e}")
-            return False 
-        finally:
-            self._disconnect()
-            
-            
+            logger.error("Erro na execução da query: %s", e)
+            return False
+
+
     # --- MÉTODOS DE LOGIN/USUÁRIO ---
-    
+
+    @instrumented(KIND_DB)
     def register_user(self, username, password):
-        """Insere um novo usuário."""
-        # NOTA DE SEGURANÇA: Em produção, o password NUNCA seria armazenado em texto puro. 
-        # Deveríamos usar bcrypt/scrypt e armazenar um hash.
+        """Insere um novo usuário, com a senha gravada como hash scrypt."""
+        # O hash é calculado no pool do hasher, antes de pegar uma conexão do banco
+        password_hash = self.hasher.hash(password)
         query = "INSERT INTO Usuarios (username, password_hash) VALUES (?, ?)"
         # Retorna True se for inserido com sucesso, False se falhar (ex: usuário já existe)
-        return self._execute_query(query, (username, password))
+        return self._execute_query(query, (username, password_hash))
 
+    @instrumented(KIND_DB)
     def verify_login(self, username, password):
-        """Verifica as credenciais e retorna o ID do usuário se for válido."""
-        self._connect()
-        try:
-            self.cursor.execute("SELECT id, password_hash FROM Usuarios WHERE username = ?", (username,))
-            result = self.cursor.fetchone()
-            
-            if result and result[1] == password:
-                return result[0] # Retorna o user_id
-            
+        """
+        Verifica as credenciais e retorna o ID do usuário se for válido.
+        Senhas legadas (texto puro) ou com parâmetros de custo antigos são regravadas
+        como hash atual no primeiro login bem-sucedido.
+        """
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT id, password_hash FROM Usuarios WHERE username = ?", (username,))
+                result = cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error("Erro ao verificar login: %s", e)
+            return None
+
+        # A verificação (cara) roda no pool do hasher, sem segurar a conexão
+        if not result:
+            return self.hasher.verify_dummy(password) or None
+        user_id, stored_hash = result
+        valid, new_hash = self.hasher.verify_and_update(password, stored_hash)
+        if not valid:
             return None
+
+        if new_hash:
+            # Só regrava se ninguém alterou a senha enquanto o hash era calculado
+            if self._execute_query(
+                "UPDATE Usuarios SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                (new_hash, user_id, stored_hash)
+            ):
+                logger.info("Hash de senha atualizado.", extra={"user_id": user_id})
+        return user_id # Retorna o user_id
+
+
+    @instrumented(KIND_DB)
+    def get_user_id(self, username):
+        """Retorna o ID do usuário com esse username, ou None se não existir."""
+        try:
+            with self._connection() as conn:
+                result = conn.execute("SELECT id FROM Usuarios WHERE username = ?", (username,)).fetchone()
+            return result[0] if result else None
         except sqlite3.Error as e:
-            print(f"Erro ao verificar login: {e}")
+            logger.error("Erro ao buscar usuário: %s", e)
             return None
-        finally:
-            self._disconnect()
+
+    @instrumented(KIND_DB)
+    def user_exists(self, user_id):
+        """Verifica se existe um usuário com esse ID."""
+        try:
+            with self._connection() as conn:
+                result = conn.execute("SELECT 1 FROM Usuarios WHERE id = ?", (user_id,)).fetchone()
+            return result is not None
+        except sqlite3.Error as e:
+            logger.error("Erro ao buscar usuário: %s", e)
+            return False
+
+
+    # --- MÉTODOS DE CONFIGURAÇÃO POR USUÁRIO ---
+
+    @instrumented(KIND_DB)
+    def save_user_config(self, user_id, consumo, preco, tipo, custo_fixo_diario, vigente_desde=None):
+        """
+        Cria ou atualiza o perfil de veículo/custos do usuário, válido a partir de
+        `vigente_desde` (padrão: hoje). Os dias anteriores continuam com os valores da sua época.
+        O perfil em vigor em cada data vem do HistoricoCustos (get_cost_history).
+        """
+        vigente_desde = vigente_desde or date.today().isoformat()
+        insert_interval = """
+        INSERT INTO HistoricoCustos
+            (user_id, vigente_desde, consumo_medio_km_l, tipo_combustivel, preco_combustivel_l, custo_fixo_diario)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, vigente_desde) DO UPDATE SET
+            consumo_medio_km_l = excluded.consumo_medio_km_l,
+            tipo_combustivel = excluded.tipo_combustivel,
+            preco_combustivel_l = excluded.preco_combustivel_l,
+            custo_fixo_diario = excluded.custo_fixo_diario;
+        """
+        try:
+            with self._connection() as conn:
+                with conn:
+                    conn.execute(insert_interval, (user_id, vigente_desde, consumo, tipo, preco, custo_fixo_diario))
+            return True
+        except sqlite3.Error as e:
+            logger.error("Erro ao salvar configurações do usuário: %s", e)
+            return False
+
+    @instrumented(KIND_DB)
+    def get_cost_history(self, user_id):
+        """
+        Busca os intervalos de custos do usuário, ordenados pela data de vigência:
+        [(vigente_desde, perfil no formato do config.json), ...].
+        """
+        query = """
+        SELECT vigente_desde, consumo_medio_km_l, tipo_combustivel, preco_combustivel_l, custo_fixo_diario
+        FROM HistoricoCustos WHERE user_id = ? ORDER BY vigente_desde
+        """
+        try:
+            with self._connection() as conn:
+                rows = conn.execute(query, (user_id,)).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Erro ao buscar histórico de custos: %s", e)
+            return []
+
+        return [
+            (vigente_desde, {
+                'VEICULO': {'CONSUMO_MEDIO_KM_L': consumo, 'TIPO_COMBUSTIVEL': tipo},
+                'CUSTOS': {'PRECO_COMBUSTIVEL_L': preco, 'CUSTO_FIXO_DIARIO': fixo_diario}
+            })
+            for vigente_desde, consumo, tipo, preco, fixo_diario in rows
+        ]
 
 
     # --- MÉTODOS DE LOG DIÁRIO ---
-    
-    def upsert_daily_log(self, user_id, data, km_rodados, faturamento_total, horas_trabalhadas):
+
+    @instrumented(KIND_DB)
+    def upsert_daily_log(self, user_id, data, km_rodados, faturamento_total, horas_trabalhadas,
+                         custo_combustivel=None, custo_fixo=None, lucro_liquido=None):
         """
         Atualiza ou insere um registro diário para o usuário e data específicos (UPSERT).
+        As métricas (custo de combustível, custo fixo e lucro líquido) são opcionais e ficam
+        gravadas com o log para que os relatórios não precisem recalculá-las.
         """
-        query = """
-        INSERT OR REPLACE INTO LogDiario (user_id, data, km_rodados, faturamento_total, horas_trabalhadas)
-        VALUES (?, ?, ?, ?, ?);
-        """
-        params = (user_id, data, km_rodados, faturamento_total, horas_trabalhadas) 
-        
-        print(f"\nTentando atualizar/inserir log para o Usuário {user_id}, Data: {data}")
-        
-        result = self._execute_query(query, params)
-        
-        if result:
-            print("✅ Log diário atualizado/inserido com sucesso.")
-            return True
-        return False
+        params = (user_id, data, km_rodados, faturamento_total, horas_trabalhadas, custo_combustivel, custo_fixo, lucro_liquido)
+
+        logger.debug("Tentando atualizar/inserir log.", extra={"user_id": user_id, "data": data})
+
+        try:
+            # Mesma transação: grava o log e atualiza os rollups da semana e do mês
+            self._write_log_rows([params])
+        except sqlite3.Error as e:
+            logger.error("Erro na execução da query: %s", e)
+            return False
+
+        # Mensagem de sucesso a cada gravação: sujeita à amostragem (DDL_LOG_AMOSTRAGEM)
+        logger.info("✅ Log diário atualizado/inserido com sucesso.", extra={"user_id": user_id, "data": data, "amostrado": True})
+        return True
 
+    @instrumented(KIND_DB)
     def get_daily_log(self, user_id, target_date):
         """Busca o log de um dia específico para o usuário."""
-        self._connect()
         try:
-            self.cursor.execute("SELECT km_rodados, faturamento_total, horas_trabalhadas FROM LogDiario WHERE user_id = ? AND data = ?", (user_id, target_date,))
-            log = self.cursor.fetchone()
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT km_rodados, faturamento_total, horas_trabalhadas FROM LogDiario WHERE user_id = ? AND data = ?", (user_id, target_date,))
+                log = cursor.fetchone()
             return log # Retorna (km, faturamento, horas) ou None
         except sqlite3.Error as e:
-            print(f"Erro ao buscar log: {e}")
+            logger.error("Erro ao buscar log: %s", e)
             return None
-        finally:
-            self._disconnect()
 
-    
+
+    @instrumented(KIND_DB)
     def get_all_logs_by_user(self, user_id):
         """Busca todos os logs de todos os dias para o usuário logado."""
-        self._connect()
+        # logs será uma lista de tuplas: [('data', km, fat, hrs), ...]
+        return self.get_logs_by_user_range(user_id)
+
+    @instrumented(KIND_DB)
+    def get_logs_by_user_range(self, user_id, start_date=None, end_date=None, with_metrics=False):
+        """
+        Busca os logs do usuário no intervalo [start_date, end_date] (datas opcionais), do mais recente ao mais antigo.
+        Com `with_metrics`, cada tupla traz também (custo_combustivel, custo_fixo, lucro_liquido) gravados.
+        """
+        query = f"SELECT {_log_columns(with_metrics)} FROM LogDiario WHERE user_id = ?"
+        range_clause, params = _date_range_clause(start_date, end_date)
+        query += range_clause + " ORDER BY data DESC"
         try:
-            query = "SELECT data, km_rodados, faturamento_total, horas_trabalhadas FROM LogDiario WHERE user_id = ? ORDER BY data DESC"
-            self.cursor.execute(query, (user_id,))
-            logs = self.cursor.fetchall()
-            # logs será uma lista de tuplas: [('data', km, fat, hrs), ...]
-            return logs
+            with self._connection() as conn:
+                return conn.execute(query, [user_id, *params]).fetchall()
         except sqlite3.Error as e:
-            print(f"Erro ao buscar todos os logs: {e}")
+            logger.error("Erro ao buscar todos os logs: %s", e)
             return []
-        finally:
-            self._disconnect()
\ No newline at end of file
+
+    def iter_logs_by_user(self, user_id, start_date=None, end_date=None, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Percorre os logs do usuário (do mais antigo ao mais recente) em lotes de `batch_size`
+        tuplas com as métricas gravadas, no formato de get_logs_by_user_range(with_metrics=True).
+        Cada lote é uma consulta por chave (data > última data do lote anterior, pelo índice
+        (user_id, data)) numa conexão emprestada só durante a consulta: quem consome devagar (ex.:
+        download da exportação) não retém conexão do pool nem transação de leitura aberta.
+        Logs gravados durante a leitura aparecem se a data ainda não tiver sido percorrida.
+        """
+        query = f"SELECT {_log_columns(with_metrics=True)} FROM LogDiario WHERE user_id = ?"
+        range_clause, params = _date_range_clause(start_date, end_date)
+        query += range_clause
+        last_date = None
+        while True:
+            try:
+                with self._connection() as conn:
+                    if last_date is None:
+                        batch = conn.execute(query + " ORDER BY data LIMIT ?", [user_id, *params, batch_size]).fetchall()
+                    else:
+                        batch = conn.execute(
+                            query + " AND data > ? ORDER BY data LIMIT ?", [user_id, *params, last_date, batch_size]
+                        ).fetchall()
+            except sqlite3.Error as e:
+                logger.error("Erro ao percorrer os logs: %s", e)
+                return
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last_date = batch[-1][0]
+
+    @instrumented(KIND_DB)
+    def get_logs_page(self, user_id, before_date=None, limit=50, start_date=None, end_date=None, with_metrics=False):
+        """
+        Busca uma página de logs (do mais recente ao mais antigo) usando paginação por chave:
+        o cursor é a data do último log da página anterior, e a consulta parte dele pelo
+        índice (user_id, data), sem OFFSET.
+        Retorna (logs, proximo_cursor); proximo_cursor é None quando não há mais páginas.
+        `with_metrics` tem o mesmo significado que em get_logs_by_user_range.
+        """
+        query = f"SELECT {_log_columns(with_metrics)} FROM LogDiario WHERE user_id = ?"
+        range_clause, params = _date_range_clause(start_date, end_date)
+        query += range_clause
+        if before_date:
+            query += " AND data < ?"
+            params.append(before_date)
+        query += " ORDER BY data DESC LIMIT ?"
+        try:
+            with self._connection() as conn:
+                logs = conn.execute(query, [user_id, *params, limit]).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Erro ao buscar página de logs: %s", e)
+            return [], None
+
+        next_cursor = logs[-1][0] if len(logs) == limit else None
+        return logs, next_cursor
+
+    @instrumented(KIND_DB)
+    def get_log_totals(self, user_id, start_date=None, end_date=None):
+        """
+        Agrega os logs do usuário direto no SQL (SUM/COUNT/MIN/MAX), opcionalmente
+        limitado ao intervalo [start_date, end_date]. Usa o índice UNIQUE(user_id, data).
+        Inclui as somas das métricas gravadas e quantos dias já as possuem.
+        Retorna um dicionário com os totais, ou None se não houver logs.
+        """
+        query = """
+        SELECT COUNT(*), SUM(km_rodados), SUM(faturamento_total), SUM(horas_trabalhadas), MIN(data), MAX(data),
+               COUNT(lucro_liquido), SUM(custo_combustivel), SUM(custo_fixo), SUM(lucro_liquido)
+        FROM LogDiario
+        WHERE user_id = ?
+        """
+        range_clause, params = _date_range_clause(start_date, end_date)
+        query += range_clause
+
+        try:
+            with self._connection() as conn:
+                result = conn.execute(query, [user_id, *params]).fetchone()
+        except sqlite3.Error as e:
+            logger.error("Erro ao agregar logs: %s", e)
+            return None
+
+        if not result or not result[0]:
+            return None
+
+        num_dias, total_km, total_fat, total_hrs, primeira, ultima, com_metricas, custo_comb, custo_fixo, lucro = result
+        return {
+            "total_dias": num_dias,
+            "total_km": total_km,
+            "total_faturamento": total_fat,
+            "total_horas": total_hrs,
+            "primeira_data": primeira,
+            "ultima_data": ultima,
+            # Somas das métricas gravadas (consideram apenas os dias que já têm métricas)
+            "dias_com_metricas": com_metricas,
+            "total_custo_combustivel": custo_comb or 0.0,
+            "total_custo_fixo": custo_fixo or 0.0,
+            "total_lucro_liquido": lucro or 0.0
+        }
+
+    @instrumented(KIND_DB)
+    def upsert_daily_logs_bulk(self, user_id, rows):
+        """
+        UPSERT em lote: grava vários dias do usuário numa única transação (executemany).
+        `rows` é uma sequência de (data, km_rodados, faturamento_total, horas_trabalhadas).
+
+        Retorna uma lista com o resultado de cada linha, na ordem recebida:
+        {"data", "km", "fat", "horas", "ok", "erro"}. Linhas inválidas são rejeitadas
+        sem impedir a gravação das demais; se a transação falhar, nenhuma é gravada.
+        """
+        outcomes, valid_rows = validate_log_rows(rows)
+        params = [(user_id, *row) for row in valid_rows]
+
+        if not params:
+            return outcomes
+
+        try:
+            self._write_log_rows(params)
+        except sqlite3.Error as e:
+            logger.error("Erro ao gravar logs em lote: %s", e)
+            for outcome in outcomes:
+                if outcome["ok"]:
+                    outcome["ok"] = False
+                    outcome["erro"] = f"Falha na transação: {e}"
+            return outcomes
+
+        logger.info(
+            "✅ Log(s) diário(s) atualizados/inseridos em lote.",
+            extra={"user_id": user_id, "linhas": len(params), "amostrado": True}
+        )
+        return outcomes
+
+    @instrumented(KIND_DB)
+    def upsert_log_rows(self, rows):
+        """
+        Grava numa única transação linhas já validadas de qualquer usuário:
+        (user_id, data, km_rodados, faturamento_total, horas_trabalhadas), opcionalmente
+        seguidas das métricas (custo_combustivel, custo_fixo, lucro_liquido).
+        Retorna True se todas foram gravadas, False se a transação falhou.
+        """
+        return self.upsert_log_rows_with_stamp(rows) is not None
+
+    @instrumented(KIND_DB)
+    def upsert_log_rows_with_stamp(self, rows):
+        """
+        Igual a upsert_log_rows, mas retorna {user_id: versão dos dados} lida na própria transação
+        da gravação (a versão que estas linhas produziram, mesmo que outra gravação venha logo
+        depois), ou None se a transação falhou.
+        """
+        try:
+            return self._write_log_rows(rows)
+        except sqlite3.Error as e:
+            logger.error("Erro ao gravar logs em lote: %s", e)
+            return None
+
+    def _write_log_rows(self, rows):
+        """
+        Executa o UPSERT das linhas (e dos rollups) com executemany e um único commit.
+        Retorna {user_id: versão dos dados após a gravação}. Lança sqlite3.Error.
+        """
+        # Linhas sem métricas ficam com NULL (calculadas depois, na primeira leitura)
+        padding = (None,) * len(LOG_METRIC_COLUMNS)
+        rows = [tuple(row) if len(row) == 8 else (*row, *padding) for row in rows]
+        with self._connection() as conn:
+            with conn: # Commit único ao final (ou rollback em caso de erro)
+                return self._apply_log_writes(conn, rows)
+
+    def _fetch_existing_logs(self, conn, keys):
+        """
+        Busca os valores atuais dos logs (user_id, data) informados, para calcular os deltas dos rollups.
+        Retorna {(user_id, data): (km, fat, hrs, custo_comb, lucro)}.
+        """
+        dates_by_user = defaultdict(set)
+        for user_id, data in keys:
+            dates_by_user[user_id].add(data)
+
+        existing = {}
+        for user_id, dates in dates_by_user.items():
+            dates = sorted(dates)
+            # Consultas em blocos para respeitar o limite de parâmetros do SQLite
+            for start in range(0, len(dates), 500):
+                block = dates[start:start + 500]
+                query = f"""
+                SELECT data, km_rodados, faturamento_total, horas_trabalhadas, custo_combustivel, lucro_liquido
+                FROM LogDiario WHERE user_id = ? AND data IN ({", ".join("?" for _ in block)})
+                """
+                for data, *values in conn.execute(query, (user_id, *block)):
+                    existing[(user_id, data)] = tuple(values)
+        return existing
+
+    def _apply_log_writes(self, conn, rows):
+        """
+        Grava as linhas completas (user_id, data, km, fat, hrs, custo_comb, custo_fixo, lucro) no
+        LogDiario, aplica nos rollups semanal e mensal a diferença entre a linha substituída
+        e a nova e registra as alterações no feed. Roda dentro da transação aberta em `conn`.
+        Retorna {user_id: versão dos dados} lida na mesma transação.
+        """
+        current = self._fetch_existing_logs(conn, ((row[0], row[1]) for row in rows))
+        deltas = _new_rollup_totals()
+
+        for user_id, data, km, fat, hrs, custo_comb, _, lucro in rows:
+            new_values = (km, fat, hrs, custo_comb, lucro)
+            old_values = current.get((user_id, data))
+            added = _rollup_contribution(*new_values)
+            removed = _rollup_contribution(*old_values) if old_values is not None else (0,) * len(added)
+            for table, period in zip(ROLLUP_TABLES, period_keys(data)):
+                delta = deltas[table][(user_id, period)]
+                for i in range(len(added)):
+                    delta[i] += added[i] - removed[i]
+            # Se a mesma data aparecer de novo no lote, o delta parte desta linha
+            current[(user_id, data)] = new_values
+
+        # UPSERT que atualiza a linha no lugar: o id do log não muda (INSERT OR REPLACE apagaria e recriaria)
+        conn.executemany("""
+        INSERT INTO LogDiario
+            (user_id, data, km_rodados, faturamento_total, horas_trabalhadas, custo_combustivel, custo_fixo, lucro_liquido)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, data) DO UPDATE SET
+            km_rodados = excluded.km_rodados,
+            faturamento_total = excluded.faturamento_total,
+            horas_trabalhadas = excluded.horas_trabalhadas,
+            custo_combustivel = excluded.custo_combustivel,
+            custo_fixo = excluded.custo_fixo,
+            lucro_liquido = excluded.lucro_liquido;
+        """, rows)
+
+        # Uma alteração por log gravado, com o estado final (a mesma data repetida no lote conta uma vez)
+        conn.executemany(
+            _RECORD_CHANGE_QUERY + " WHERE user_id = ? AND data = ?",
+            dict.fromkeys((row[0], row[1]) for row in rows)
+        )
+
+        for table, table_deltas in deltas.items():
+            conn.executemany(
+                _rollup_upsert_query(table),
+                [(user_id, period, *delta) for (user_id, period), delta in table_deltas.items() if any(delta)]
+            )
+
+        # A primeira versão é aleatória: um banco recriado não repete as versões do anterior
+        conn.executemany("""
+        INSERT INTO VersaoDados (user_id, versao) VALUES (?, abs(random() % 1000000000000))
+        ON CONFLICT(user_id) DO UPDATE SET versao = versao + 1;
+        """, [(user_id,) for user_id in {row[0] for row in rows}])
+
+        # Lida antes do commit: outra gravação logo depois não pode ser confundida com esta
+        user_ids = list({row[0] for row in rows})
+        versions = {}
+        for start in range(0, len(user_ids), 500):
+            block = user_ids[start:start + 500]
+            versions.update(conn.execute(
+                f"SELECT user_id, versao FROM VersaoDados WHERE user_id IN ({', '.join('?' for _ in block)})", block
+            ))
+        return versions
+
+    @instrumented(KIND_DB)
+    def get_data_stamp(self, user_id):
+        """Versão atual dos logs do usuário (muda a cada gravação, inclusive de outros processos); 0 se nunca gravou."""
+        try:
+            with self._connection() as conn:
+                result = conn.execute("SELECT versao FROM VersaoDados WHERE user_id = ?", (user_id,)).fetchone()
+            return result[0] if result else 0
+        except sqlite3.Error as e:
+            logger.error("Erro ao buscar a versão dos dados: %s", e)
+            return None
+
+    @instrumented(KIND_DB)
+    def get_logs_with_stamp(self, user_id):
+        """
+        Lê, numa única transação de leitura, a versão dos dados e todos os logs do usuário
+        (do mais antigo ao mais recente, com as métricas gravadas): os logs correspondem
+        exatamente àquela versão. Retorna (versao, logs), ou (None, []) em caso de erro.
+        """
+        try:
+            with self._connection() as conn:
+                conn.execute("BEGIN")
+                try:
+                    result = conn.execute("SELECT versao FROM VersaoDados WHERE user_id = ?", (user_id,)).fetchone()
+                    logs = conn.execute(
+                        f"SELECT {_log_columns(with_metrics=True)} FROM LogDiario WHERE user_id = ? ORDER BY data",
+                        (user_id,)
+                    ).fetchall()
+                finally:
+                    conn.rollback()
+            return (result[0] if result else 0), logs
+        except sqlite3.Error as e:
+            logger.error("Erro ao buscar os logs com a versão: %s", e)
+            return None, []
+
+    @instrumented(KIND_DB)
+    def get_changes(self, after_seq=0, limit=1000, user_id=None):
+        """
+        Busca as alterações do LogDiario com seq maior que `after_seq`, em ordem de seq: tuplas
+        no formato de CHANGE_COLUMNS, com o estado do log gravado em cada alteração.
+        Com `user_id`, só as alterações dos logs do usuário.
+        """
+        query = """
+        SELECT seq, user_id, log_id, data, km_rodados, faturamento_total, horas_trabalhadas,
+               custo_combustivel, custo_fixo, lucro_liquido
+        FROM LogAlteracoes WHERE seq > ?
+        """
+        params = [after_seq]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        query += " ORDER BY seq LIMIT ?"
+        try:
+            with self._connection() as conn:
+                return conn.execute(query, [*params, limit]).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Erro ao buscar as alterações dos logs: %s", e)
+            return []
+
+    @instrumented(KIND_DB)
+    def get_logs_missing_metrics(self, user_id):
+        """Busca (data, km, fat, hrs) dos logs do usuário que ainda não têm métricas gravadas."""
+        query = """
+        SELECT data, km_rodados, faturamento_total, horas_trabalhadas
+        FROM LogDiario WHERE user_id = ? AND lucro_liquido IS NULL
+        """
+        try:
+            with self._connection() as conn:
+                return conn.execute(query, (user_id,)).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Erro ao buscar logs sem métricas: %s", e)
+            return []
+
+    @instrumented(KIND_DB)
+    def update_log_metrics(self, user_id, rows):
+        """
+        Grava as métricas calculadas de logs já existentes (e ajusta os rollups), numa única transação.
+        `rows` é uma sequência de (data, custo_combustivel, custo_fixo, lucro_liquido).
+        """
+        rows = list(rows)
+        try:
+            with self._connection() as conn:
+                with conn:
+                    existing = self._fetch_existing_logs(conn, ((user_id, row[0]) for row in rows))
+                    full_rows = [
+                        (user_id, data, *existing[(user_id, data)][:3], custo_comb, custo_fixo, lucro)
+                        for data, custo_comb, custo_fixo, lucro in rows
+                        if (user_id, data) in existing
+                    ]
+                    self._apply_log_writes(conn, full_rows)
+            return True
+        except sqlite3.Error as e:
+            logger.error("Erro ao gravar métricas dos logs: %s", e)
+            return False
+
+    # --- MÉTODOS DE ROLLUP (TOTAIS POR PERÍODO) ---
+
+    @instrumented(KIND_DB)
+    def get_rollups(self, user_id, table="RollupSemanal", limit=None, start_period=None, end_period=None):
+        """
+        Lê os totais por período do usuário, do mais recente ao mais antigo: uma linha por
+        semana/mês, sem percorrer os logs diários. `table` é uma das ROLLUP_TABLES.
+        Retorna [(periodo, km, fat, hrs, custo_comb, lucro, dias, dias_sem_metricas), ...].
+        """
+        period_column = ROLLUP_TABLES[table]
+        query = f"""
+        SELECT {period_column}, {", ".join(ROLLUP_VALUE_COLUMNS)}
+        FROM {table} WHERE user_id = ? AND dias > 0
+        """
+        params = [user_id]
+        if start_period:
+            query += f" AND {period_column} >= ?"
+            params.append(start_period)
+        if end_period:
+            query += f" AND {period_column} <= ?"
+            params.append(end_period)
+        query += f" ORDER BY {period_column} DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        try:
+            with self._connection() as conn:
+                return conn.execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Erro ao buscar totais por período: %s", e)
+            return []
+
+    @instrumented(KIND_DB)
+    def rebuild_rollups(self):
+        """Recalcula do zero as tabelas de rollup a partir do LogDiario (manutenção)."""
+        try:
+            with self._connection() as conn:
+                with conn:
+                    _rebuild_rollups(conn.cursor())
+            return True
+        except sqlite3.Error as e:
+            logger.error("Erro ao recalcular os rollups: %s", e)
+            return False
@@ -0,0 +1,208 @@
+# fleet_analytics.py
+# Análise da frota inteira (todos os motoristas) num intervalo de datas.
+#
+# O LogDiario é dividido em faixas de user_id com a mesma quantidade de motoristas. Cada faixa
+# é agregada por motorista (GROUP BY user_id, pelo índice de cobertura idx_logdiario_relatorio)
+# num processo do pool, com a sua própria conexão SQLite somente leitura. O processo principal
+# só junta os parciais (uma linha por motorista) e calcula totais, rankings e percentis.
+#
+# O pool de processos é criado uma vez e reaproveitado entre as chamadas. Os processos saem de
+# um forkserver (ou spawn), nunca de um fork do processo principal, que já tem threads rodando
+# (log, pools de conexão e de hash, workers HTTP, write-behind).
+import atexit
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import numpy as np
+
+import database_manager
+from log_utils import get_logger
+
+logger = get_logger("fleet")
+
+# Processos do pool (um por núcleo)
+FLEET_WORKERS = os.cpu_count() or 1
+
+# Faixas por processo: faixas menores equilibram a carga quando alguns motoristas têm mais dias
+PARTITIONS_PER_WORKER = 4
+
+# Motoristas em cada ranking
+RANKING_SIZE = 10
+
+# Percentis das distribuições por motorista
+FLEET_PERCENTILES = (10, 25, 50, 75, 90)
+
+# Colunas de cada motorista nos parciais, na ordem da consulta
+DRIVER_COLUMNS = ("user_id", "dias", "km", "fat", "horas", "custo_comb", "custo_fixo", "lucro_liquido", "dias_sem_metricas")
+
+# Métricas com ranking e distribuição (percentis) entre os motoristas
+RANKED_METRICS = ("fat", "km", "lucro_liquido", "reais_por_km", "reais_por_hora")
+
+# Contexto dos processos do pool: forkserver onde existe, senão spawn
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# Pools já iniciados, por quantidade de processos
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+_PARTITION_QUERY = """
+SELECT user_id, COUNT(*), SUM(km_rodados), SUM(faturamento_total), SUM(horas_trabalhadas),
+       TOTAL(custo_combustivel), TOTAL(custo_fixo), TOTAL(lucro_liquido), COUNT(*) - COUNT(lucro_liquido)
+FROM LogDiario
+WHERE user_id BETWEEN ? AND ?
+"""
+
+
+def _read_only_connection(db_file):
+    """Conexão somente leitura (mode=ro): os workers nunca escrevem nem disputam locks de escrita."""
+    conn = sqlite3.connect(f"{Path(db_file).resolve().as_uri()}?mode=ro", uri=True)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def scan_partition(db_file, first_user_id, last_user_id, start_date=None, end_date=None):
+    """
+    Agrega os logs dos motoristas com user_id em [first_user_id, last_user_id] (e no intervalo
+    de datas, se informado). Retorna uma tupla por motorista no formato de DRIVER_COLUMNS.
+    Roda nos processos do pool.
+    """
+    range_clause, params = database_manager._date_range_clause(start_date, end_date)
+    conn = _read_only_connection(db_file)
+    try:
+        return conn.execute(
+            _PARTITION_QUERY + range_clause + " GROUP BY user_id",
+            [first_user_id, last_user_id, *params]
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def partition_user_ids(db_file, partitions):
+    """Divide os user_ids existentes em até `partitions` faixas [primeiro, último] de tamanho igual."""
+    conn = _read_only_connection(db_file)
+    try:
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM Usuarios ORDER BY id")]
+    finally:
+        conn.close()
+    if not user_ids:
+        return []
+    chunks = np.array_split(user_ids, min(partitions, len(user_ids)))
+    return [(int(chunk[0]), int(chunk[-1])) for chunk in chunks if len(chunk)]
+
+
+def _usernames(db_file, user_ids):
+    conn = _read_only_connection(db_file)
+    try:
+        placeholders = ", ".join("?" for _ in user_ids)
+        return dict(conn.execute(f"SELECT id, username FROM Usuarios WHERE id IN ({placeholders})", list(user_ids)))
+    finally:
+        conn.close()
+
+
+def _process_pool(workers):
+    """Pool de `workers` processos, criado na primeira chamada e reaproveitado depois."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(workers)
+        if pool is None:
+            pool = _POOLS[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT)
+        return pool
+
+
+def _discard_pool(workers, pool):
+    """Descarta um pool quebrado (processo morto); a próxima chamada cria outro."""
+    with _POOLS_LOCK:
+        if _POOLS.get(workers) is pool:
+            del _POOLS[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pools():
+    """Encerra os processos dos pools."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def scan_fleet(db_file, start_date=None, end_date=None, workers=FLEET_WORKERS):
+    """Parciais de todas as faixas (uma tupla por motorista com logs no período)."""
+    ranges = partition_user_ids(db_file, workers * PARTITIONS_PER_WORKER)
+    if workers <= 1 or len(ranges) <= 1:
+        partials = [scan_partition(db_file, first, last, start_date, end_date) for first, last in ranges]
+    else:
+        pool = _process_pool(workers)
+        try:
+            futures = [pool.submit(scan_partition, db_file, first, last, start_date, end_date) for first, last in ranges]
+            partials = [future.result() for future in futures]
+        except BrokenProcessPool:
+            _discard_pool(workers, pool)
+            raise
+    return [row for partial in partials for row in partial]
+
+
+def _per_driver_columns(rows):
+    """Colunas NumPy por motorista, incluindo as médias R$/km e R$/hora."""
+    columns = {name: np.array([row[i] for row in rows], dtype=float) for i, name in enumerate(DRIVER_COLUMNS)}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        columns["reais_por_km"] = np.where(columns["km"] > 0, columns["fat"] / columns["km"], 0.0)
+        columns["reais_por_hora"] = np.where(columns["horas"] > 0, columns["fat"] / columns["horas"], 0.0)
+    return columns
+
+
+def fleet_summary(db_file, start_date=None, end_date=None, workers=FLEET_WORKERS, ranking_size=RANKING_SIZE):
+    """
+    Totais da frota, ranking dos motoristas e percentis (FLEET_PERCENTILES) de cada métrica de
+    RANKED_METRICS entre os motoristas, no intervalo [start_date, end_date].
+    `sem_metricas` lista os user_ids com dias ainda sem métricas gravadas (o lucro e os custos
+    desses dias não entram nas somas). Retorna None se não houver logs no período.
+    """
+    try:
+        rows = scan_fleet(db_file, start_date, end_date, workers)
+    except (sqlite3.Error, BrokenProcessPool) as e:
+        logger.error("Erro ao agregar a frota: %s", e)
+        return None
+    if not rows:
+        return None
+
+    columns = _per_driver_columns(rows)
+    totals = {key: round(float(columns[key].sum()), 2) for key in ("km", "fat", "horas", "custo_comb", "custo_fixo", "lucro_liquido")}
+    totals["dias"] = int(columns["dias"].sum())
+    totals["motoristas"] = len(rows)
+
+    rankings = {}
+    ranked_ids = set()
+    for metric in RANKED_METRICS:
+        order = np.argsort(-columns[metric], kind="stable")[:ranking_size]
+        rankings[metric] = [(int(columns["user_id"][i]), round(float(columns[metric][i]), 2)) for i in order]
+        ranked_ids.update(user_id for user_id, _ in rankings[metric])
+
+    names = _usernames(db_file, ranked_ids)
+    for metric, ranking in rankings.items():
+        rankings[metric] = [
+            {"user_id": user_id, "username": names.get(user_id), "valor": value} for user_id, value in ranking
+        ]
+
+    percentiles = {
+        metric: dict(zip(
+            (f"p{pct}" for pct in FLEET_PERCENTILES),
+            (round(float(value), 2) for value in np.percentile(columns[metric], FLEET_PERCENTILES))
+        ))
+        for metric in RANKED_METRICS
+    }
+
+    return {
+        "periodo": (start_date, end_date),
+        "totais": totals,
+        "rankings": rankings,
+        "percentis": percentiles,
+        "sem_metricas": [int(user_id) for user_id, missing in zip(columns["user_id"], columns["dias_sem_metricas"]) if missing],
+    }
@@ -0,0 +1,598 @@
+# http_server.py
+# Serviço HTTP/JSON (somente biblioteca padrão) que expõe o api_core para frontends externos
+# (ex.: o app mobile). Conexões keep-alive (HTTP/1.1), gzip nas respostas grandes, ETag com
+# If-None-Match nos relatórios e um pool fixo de workers que atende requisições: entre uma
+# requisição e outra, as conexões keep-alive esperam num seletor, sem ocupar worker.
+#
+# Uso:
+#   python http_server.py [--host 127.0.0.1] [--porta 8000] [--workers 16]
+#
+# Endpoints (JSON):
+#   POST /api/registro            {"username", "password"}
+#   POST /api/login               {"username", "password"}     -> {"token", "user_id"}
+#   GET  /api/config                                            (autenticado)
+#   PUT  /api/config              {"consumo", "preco", "tipo", "aluguel_semanal", "vigente_desde"?}
+#   POST /api/logs                {"data", "km_rodados", "faturamento_total", "horas_trabalhadas"}
+#   POST /api/logs/lote           {"linhas": [[data, km, fat, horas], ...]}
+#   GET  /api/relatorio           ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD
+#   GET  /api/relatorio/resumo    ?inicio=&fim=
+#   GET  /api/relatorio/pagina    ?cursor=&limite=&inicio=&fim=
+#   GET  /api/relatorio/semanal   ?limite=
+#   GET  /api/relatorio/mensal    ?limite=
+#   GET  /api/relatorio/moveis    ?inicio=&fim=               (médias móveis de 7/30 dias e percentis)
+#   GET  /api/exportar            ?formato=csv|jsonl&inicio=&fim=   (resposta em streaming, chunked)
+#   GET  /api/saude
+#   POST /api/logout                                            (autenticado; revoga o token)
+# Autenticação: cabeçalho "Authorization: Bearer <token>" com o token devolvido pelo login
+# (token assinado do api_core, validado em memória sem consultar o banco).
+import argparse
+import gzip
+import hashlib
+import json
+import selectors
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import api_core
+import database_manager
+from cache_utils import LRUCache
+from log_utils import get_logger
+
+logger = get_logger("http")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+
+# Requisições atendidas ao mesmo tempo (conexões ociosas não ocupam worker)
+HTTP_WORKERS = 16
+
+# Segundos que uma conexão keep-alive ociosa fica aberta esperando a próxima requisição
+KEEPALIVE_TIMEOUT = 5
+
+# Segundos que um worker espera o restante de uma requisição já começada
+REQUEST_TIMEOUT = 5
+
+# Tamanho máximo do corpo de uma requisição (bytes)
+MAX_BODY_SIZE = 1024 * 1024
+
+# Respostas menores que isso não compensam o gzip (bytes)
+GZIP_MIN_SIZE = 1024
+
+# Respostas de relatório já serializadas (JSON, gzip e ETag), pela mesma chave/validade
+# do cache de relatórios do api_core
+RESPONSE_CACHE = LRUCache(api_core.REPORT_CACHE_SIZE, ttl=api_core.REPORT_CACHE_TTL)
+
+
+class ApiError(Exception):
+    """Erro de requisição devolvido ao cliente como {"erro": mensagem} com o status informado."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --- SESSÕES ---
+
+def _bearer_token(headers):
+    scheme, _, token = headers.get("Authorization", "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else None
+
+
+def authenticate(headers):
+    """Retorna o user_id do token "Authorization: Bearer ..." ou levanta ApiError 401."""
+    user_id = api_core.authenticate_web(_bearer_token(headers))
+    if user_id is None:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Token ausente, inválido ou expirado.")
+    return user_id
+
+
+# --- RESPOSTAS SERIALIZADAS ---
+
+class Payload:
+    """Corpo JSON pronto para envio, com a versão gzip (quando compensa) e o ETag."""
+
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.gzipped = gzip.compress(self.body, compresslevel=5) if len(self.body) >= GZIP_MIN_SIZE else None
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+
+
+class Stream:
+    """Resposta enviada em trechos (Transfer-Encoding: chunked) conforme são gerados."""
+
+    __slots__ = ("chunks", "content_type")
+
+    def __init__(self, chunks, content_type):
+        self.chunks = chunks
+        self.content_type = content_type
+
+
+def cached_payload(name, user_id, args, compute):
+    """Payload de um relatório: serializado uma vez por versão dos dados do usuário."""
+    key = (name, user_id, api_core.get_data_version(user_id), args)
+    payload = RESPONSE_CACHE.get(key)
+    if payload is None:
+        payload = Payload(compute())
+        RESPONSE_CACHE.put(key, payload)
+    return payload
+
+
+# --- ENDPOINTS ---
+
+def _require(body, *fields):
+    missing = [field for field in fields if body.get(field) in (None, "")]
+    if missing:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Campos ausentes: {', '.join(missing)}.")
+    return [body[field] for field in fields]
+
+
+def _query_int(query, name, default=None):
+    value = query.get(name, default)
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Parâmetro '{name}' deve ser um inteiro.")
+
+
+def _query_limit(query, default, maximum):
+    """Parâmetro `limite` ajustado a [1, maximum]."""
+    return min(max(_query_int(query, "limite", default), 1), maximum)
+
+
+def register(body, query, headers):
+    username, password = _require(body, "username", "password")
+    if not api_core.register_user_web(username, password):
+        raise ApiError(HTTPStatus.CONFLICT, "Usuário já existe.")
+    return HTTPStatus.CREATED, {"ok": True}
+
+
+def login(body, query, headers):
+    username, password = _require(body, "username", "password")
+    session = api_core.login_web(username, password)
+    if session is None:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Usuário ou senha inválidos.")
+    return HTTPStatus.OK, session
+
+
+def logout(body, query, headers):
+    if not api_core.logout_web(_bearer_token(headers)):
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Token ausente, inválido ou expirado.")
+    return HTTPStatus.OK, {"ok": True}
+
+
+def get_config(body, query, headers):
+    return HTTPStatus.OK, api_core.get_config_for_display(authenticate(headers))
+
+
+def update_config(body, query, headers):
+    user_id = authenticate(headers)
+    consumo, preco, tipo, aluguel = _require(body, "consumo", "preco", "tipo", "aluguel_semanal")
+    try:
+        consumo, preco, aluguel = float(consumo), float(preco), float(aluguel)
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "consumo, preco e aluguel_semanal devem ser números.")
+    vigente_desde = body.get("vigente_desde")
+    if vigente_desde not in (None, ""):
+        # Gravada como AAAA-MM-DD: a vigência é comparada como texto com as datas dos logs
+        try:
+            vigente_desde = date.fromisoformat(str(vigente_desde)).isoformat()
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "vigente_desde deve ser uma data AAAA-MM-DD.")
+    if not api_core.update_config_web(consumo, preco, str(tipo), aluguel, user_id, vigente_desde or None):
+        raise ApiError(HTTPStatus.INTERNAL_SERVER_ERROR, "Falha ao salvar as configurações.")
+    return HTTPStatus.OK, api_core.get_config_for_display(user_id)
+
+
+def upsert_log(body, query, headers):
+    user_id = authenticate(headers)
+    fields = _require(body, "data", "km_rodados", "faturamento_total", "horas_trabalhadas")
+    try:
+        row = database_manager.normalize_log_row(*fields)
+    except ValueError as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+    metrics = api_core.upsert_log_web(user_id, *row)
+    if metrics is None:
+        raise ApiError(HTTPStatus.INTERNAL_SERVER_ERROR, "Falha ao salvar o log.")
+    return HTTPStatus.OK, metrics
+
+
+def upsert_logs_bulk(body, query, headers):
+    user_id = authenticate(headers)
+    (rows,) = _require(body, "linhas")
+    if not isinstance(rows, list) or not all(isinstance(row, (list, tuple)) for row in rows):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "'linhas' deve ser uma lista de [data, km, faturamento, horas].")
+    return HTTPStatus.OK, {"resultados": api_core.upsert_logs_bulk_web(user_id, rows)}
+
+
+def get_report(body, query, headers):
+    user_id = authenticate(headers)
+    start, end = query.get("inicio"), query.get("fim")
+    return HTTPStatus.OK, cached_payload("relatorio", user_id, (start, end),
+                                         lambda: api_core.get_report_web(user_id, start, end))
+
+
+def get_report_summary(body, query, headers):
+    user_id = authenticate(headers)
+    start, end = query.get("inicio"), query.get("fim")
+    return HTTPStatus.OK, cached_payload("resumo", user_id, (start, end),
+                                         lambda: api_core.get_report_summary_web(user_id, start, end))
+
+
+def get_report_page(body, query, headers):
+    user_id = authenticate(headers)
+    cursor, start, end = query.get("cursor"), query.get("inicio"), query.get("fim")
+    limit = _query_limit(query, api_core.REPORT_PAGE_SIZE, api_core.MAX_REPORT_PAGE_SIZE)
+    return HTTPStatus.OK, cached_payload("pagina", user_id, (cursor, limit, start, end),
+                                         lambda: api_core.get_report_page_web(user_id, cursor, limit, start, end))
+
+
+def get_weekly_summary(body, query, headers):
+    user_id = authenticate(headers)
+    limit = _query_limit(query, api_core.MAX_ROLLUP_PERIODS, api_core.MAX_ROLLUP_PERIODS)
+    return HTTPStatus.OK, cached_payload("semanal", user_id, (limit,),
+                                         lambda: api_core.get_weekly_summary_web(user_id, limit))
+
+
+def get_monthly_summary(body, query, headers):
+    user_id = authenticate(headers)
+    limit = _query_limit(query, api_core.MAX_ROLLUP_PERIODS, api_core.MAX_ROLLUP_PERIODS)
+    return HTTPStatus.OK, cached_payload("mensal", user_id, (limit,),
+                                         lambda: api_core.get_monthly_summary_web(user_id, limit))
+
+
+def get_rolling_stats(body, query, headers):
+    user_id = authenticate(headers)
+    start, end = query.get("inicio"), query.get("fim")
+    return HTTPStatus.OK, cached_payload("moveis", user_id, (start, end),
+                                         lambda: api_core.get_rolling_stats_web(user_id, start, end))
+
+
+def get_changes(body, query, headers):
+    user_id = authenticate(headers)
+    seq = _query_int(query, "desde", 0)
+    limit = _query_limit(query, api_core.CHANGE_FEED_PAGE_SIZE, api_core.CHANGE_FEED_PAGE_SIZE)
+    return HTTPStatus.OK, api_core.get_changes_since(seq, limit, user_id)
+
+
+def export_history(body, query, headers):
+    user_id = authenticate(headers)
+    fmt = query.get("formato", "csv")
+    try:
+        chunks = api_core.export_report_web(user_id, fmt, query.get("inicio"), query.get("fim"))
+    except ValueError as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return HTTPStatus.OK, Stream(chunks, f"{content_type}; charset=utf-8")
+
+
+def health(body, query, headers):
+    return HTTPStatus.OK, {"ok": True, "pool": api_core.get_db_pool_stats()}
+
+
+ROUTES = {
+    ("POST", "/api/registro"): register,
+    ("POST", "/api/login"): login,
+    ("POST", "/api/logout"): logout,
+    ("GET", "/api/config"): get_config,
+    ("PUT", "/api/config"): update_config,
+    ("POST", "/api/logs"): upsert_log,
+    ("POST", "/api/logs/lote"): upsert_logs_bulk,
+    ("GET", "/api/relatorio"): get_report,
+    ("GET", "/api/relatorio/resumo"): get_report_summary,
+    ("GET", "/api/relatorio/pagina"): get_report_page,
+    ("GET", "/api/relatorio/semanal"): get_weekly_summary,
+    ("GET", "/api/relatorio/mensal"): get_monthly_summary,
+    ("GET", "/api/relatorio/moveis"): get_rolling_stats,
+    ("GET", "/api/alteracoes"): get_changes,
+    ("GET", "/api/exportar"): export_history,
+    ("GET", "/api/saude"): health,
+}
+
+
+# --- SERVIDOR ---
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive por padrão
+    timeout = REQUEST_TIMEOUT       # Cliente parado no meio de uma requisição libera o worker
+    disable_nagle_algorithm = True  # Cabeçalhos e corpo saem em escritas separadas: sem TCP_NODELAY,
+                                    # o Nagle + ACK atrasado do cliente somam ~40 ms por resposta
+    server_version = "DriversDailyLog/1.0"
+
+    def handle(self):
+        # Uma requisição por vez: depois dela, o servidor decide se a conexão volta ao seletor
+        self.close_connection = True
+        self.handle_one_request()
+
+    def finish(self):
+        # Chamado ao fim de cada requisição: os arquivos da conexão só são fechados em close()
+        try:
+            self.wfile.flush()
+        except OSError:
+            self.close_connection = True
+
+    def close(self):
+        """Fecha os arquivos da conexão (a conexão não será mais usada)."""
+        super().finish()
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Sem saber onde o corpo termina, a conexão não pode ser reaproveitada
+            self.close_connection = True
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length inválido.")
+        if length > MAX_BODY_SIZE:
+            # O corpo não será lido: a conexão não pode ser reaproveitada
+            self.close_connection = True
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Corpo da requisição muito grande.")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "JSON inválido.")
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "O corpo deve ser um objeto JSON.")
+        return body
+
+    def _dispatch(self, method):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/") or "/"
+        try:
+            # Lê o corpo antes de tudo: mesmo em caso de erro a conexão keep-alive fica consistente
+            body = self._read_body()
+            handler = ROUTES.get((method, path))
+            if handler is None:
+                allowed = any(route_path == path for _, route_path in ROUTES)
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED if allowed else HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+            status, data = handler(body, query, self.headers)
+        except ApiError as e:
+            status, data = e.status, {"erro": e.message}
+        except Exception:
+            logger.exception("Erro inesperado ao atender a requisição.", extra={"rota": url.path})
+            status, data = HTTPStatus.INTERNAL_SERVER_ERROR, {"erro": "Erro interno."}
+
+        if isinstance(data, Stream):
+            self._send_stream(status, data)
+        else:
+            self._send(status, data if isinstance(data, Payload) else Payload(data))
+        logger.debug(
+            "Requisição atendida.",
+            extra={"metodo": method, "rota": url.path, "status": int(status), "ms": round((time.perf_counter() - start) * 1000, 2)}
+        )
+
+    def _send(self, status, payload):
+        # ETag: o cliente que já tem esta versão recebe 304 sem corpo
+        if status == HTTPStatus.OK and payload.etag in self.headers.get("If-None-Match", ""):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", payload.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = payload.body
+        use_gzip = payload.gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            body = payload.gzipped
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if self.close_connection:
+            # Corpo da requisição não lido (ou de tamanho desconhecido): avisa o cliente
+            self.send_header("Connection", "close")
+        if status == HTTPStatus.OK:
+            self.send_header("ETag", payload.etag)
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, status, stream):
+        self.send_response(status)
+        self.send_header("Content-Type", stream.content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in stream.chunks:
+                data = chunk.encode("utf-8")
+                if data:
+                    self.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+        except Exception:
+            # Cabeçalhos já enviados: a única forma de sinalizar a falha é fechar a conexão
+            logger.exception("Erro ao enviar a resposta em streaming.")
+            self.close_connection = True
+        finally:
+            stream.chunks.close()
+
+    def log_message(self, format, *args):
+        # O log de acesso vai para o logger estruturado (nível DEBUG), não para o stderr direto
+        pass
+
+
+class WorkerPoolHTTPServer(HTTPServer):
+    """
+    HTTPServer com um pool fixo de workers que atendem requisições, não conexões. Depois de
+    cada resposta, a conexão keep-alive vai para um seletor (numa thread própria) e só volta a
+    um worker quando chegam dados; conexões ociosas por KEEPALIVE_TIMEOUT são fechadas. Assim,
+    muitos clientes conectados e parados não impedem que outros sejam atendidos.
+    """
+
+    def __init__(self, address, handler_class=ApiRequestHandler, workers=HTTP_WORKERS):
+        super().__init__(address, handler_class)
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ddl-http")
+        self._selector = selectors.DefaultSelector()
+        self._idle = {}  # socket -> (handler, endereço, ociosa desde)
+        self._idle_lock = threading.Lock()
+        self._closing = False
+        # Acorda o seletor quando uma conexão entra nele (ou o servidor fecha)
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_recv, selectors.EVENT_READ)
+        self._idle_watcher = threading.Thread(target=self._watch_idle, name="ddl-http-keepalive", daemon=True)
+        self._idle_watcher.start()
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._serve_connection, request, client_address, None)
+
+    def _serve_connection(self, request, client_address, handler):
+        """Atende as requisições que já chegaram na conexão e a devolve ao seletor (ou a fecha)."""
+        try:
+            if handler is None:
+                # setup() da conexão + a primeira requisição
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                handler.handle_one_request()
+                handler.finish()
+            while not handler.close_connection and self._has_buffered_request(request, handler):
+                handler.handle_one_request()
+                handler.finish()
+        except Exception:
+            self.handle_error(request, client_address)
+            self._close_connection(request, handler)
+            return
+        if handler.close_connection or self._closing:
+            self._close_connection(request, handler)
+        else:
+            self._park(request, handler, client_address)
+
+    def _has_buffered_request(self, request, handler):
+        """Se o cliente já enviou a próxima requisição (pipelining), ela pode estar no buffer de leitura."""
+        request.settimeout(0.0)
+        try:
+            return bool(handler.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            request.settimeout(handler.timeout)
+
+    def _park(self, request, handler, client_address):
+        with self._idle_lock:
+            self._idle[request] = (handler, client_address, time.monotonic())
+            self._selector.register(request, selectors.EVENT_READ)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wakeup_send.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Já há um aviso pendente
+
+    def _close_connection(self, request, handler):
+        if handler is not None:
+            try:
+                handler.close()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+
+    def _watch_idle(self):
+        """Thread do seletor: devolve aos workers as conexões com dados e fecha as ociosas."""
+        while not self._closing:
+            events = self._selector.select(timeout=1.0)
+            ready, expired = [], []
+            now = time.monotonic()
+            with self._idle_lock:
+                for key, _ in events:
+                    if key.fileobj is self._wakeup_recv:
+                        try:
+                            while self._wakeup_recv.recv(4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        continue
+                    entry = self._idle.pop(key.fileobj, None)
+                    if entry is not None:
+                        self._selector.unregister(key.fileobj)
+                        ready.append((key.fileobj, entry))
+                for request, entry in list(self._idle.items()):
+                    if now - entry[2] > KEEPALIVE_TIMEOUT:
+                        del self._idle[request]
+                        self._selector.unregister(request)
+                        expired.append((request, entry))
+            for request, (handler, client_address, _) in ready:
+                try:
+                    self._executor.submit(self._serve_connection, request, client_address, handler)
+                except RuntimeError:
+                    # Servidor fechando: o executor não aceita mais trabalho
+                    self._close_connection(request, handler)
+            for request, (handler, _, _) in expired:
+                self._close_connection(request, handler)
+
+    def server_close(self):
+        super().server_close()
+        self._closing = True
+        self._wake()
+        self._idle_watcher.join()
+        with self._idle_lock:
+            idle, self._idle = self._idle, {}
+        for request, (handler, _, _) in idle.items():
+            self._close_connection(request, handler)
+        self._selector.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=HTTP_WORKERS):
+    """Cria o servidor (porta 0 = porta livre qualquer; veja server.server_address)."""
+    return WorkerPoolHTTPServer((host, port), workers=workers)
+
+
+def serve_in_thread(host=DEFAULT_HOST, port=0, workers=HTTP_WORKERS):
+    """Inicia o servidor numa thread em segundo plano (testes de carga). Retorna o servidor."""
+    server = make_server(host, port, workers)
+    threading.Thread(target=server.serve_forever, name="ddl-http-server", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP/JSON do Driver's Daily Log.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--porta", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=HTTP_WORKERS)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.porta, args.workers)
+    host, port = server.server_address[:2]
+    print(f"🚗 Servindo em http://{host}:{port} ({args.workers} workers). Ctrl+C para parar.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
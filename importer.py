@@ -0,0 +1,230 @@
+# importer.py
+# Importação em lote de logs históricos (exportações de plataformas parceiras).
+#
+# Uso:
+#   python importer.py historico.csv [--formato csv|jsonl] [--lote 5000] [--db daily_log.db] [--rejeitados rejeitados.csv]
+#
+# Cada linha deve ter: username OU user_id, data, km_rodados, faturamento_total, horas_trabalhadas.
+# O arquivo é processado em streaming (geradores) e gravado em transações de `--lote` linhas,
+# então o uso de memória não depende do tamanho do arquivo.
+import argparse
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+import database_manager
+
+# Quantidade de linhas por transação
+DEFAULT_CHUNK_SIZE = 5000
+
+# Quantos exemplos de linhas rejeitadas guardar para o resumo final
+MAX_REJECTED_SAMPLES = 10
+
+# Limite do cache username -> user_id (evita crescer sem limite em arquivos enormes)
+MAX_USER_CACHE = 100_000
+
+LOG_FIELDS = ('data', 'km_rodados', 'faturamento_total', 'horas_trabalhadas')
+
+
+# --- ETAPAS DO PIPELINE (GERADORES) ---
+
+def read_records(path, fmt):
+    """Lê o arquivo linha a linha e gera (numero_linha, registro, erro)."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for record in reader:
+                # reader.line_num aponta para a linha física atual do arquivo
+                yield reader.line_num, record, None
+        else:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, None, f"JSON inválido: {e}"
+                    continue
+                if not isinstance(record, dict):
+                    yield line_no, None, "Cada linha JSONL deve ser um objeto."
+                    continue
+                yield line_no, record, None
+
+
+def validate_records(records, db_manager):
+    """
+    Resolve o usuário e valida/converte os campos de cada registro.
+    Gera (numero_linha, linha_valida, None) ou (numero_linha, registro, motivo_da_rejeicao).
+    """
+    usernames = {}   # username -> user_id
+    known_ids = {}   # user_id -> existe?
+
+    for line_no, record, error in records:
+        if error:
+            yield line_no, record, error
+            continue
+
+        # 1. Resolve o usuário (username ou user_id)
+        user_id = None
+        raw_user_id = record.get('user_id')
+        username = record.get('username')
+        if raw_user_id not in (None, ''):
+            try:
+                user_id = int(raw_user_id)
+            except (TypeError, ValueError):
+                yield line_no, record, f"user_id inválido: '{raw_user_id}'."
+                continue
+            if user_id not in known_ids:
+                if len(known_ids) >= MAX_USER_CACHE:
+                    known_ids.clear()
+                known_ids[user_id] = db_manager.user_exists(user_id)
+            if not known_ids[user_id]:
+                yield line_no, record, f"Usuário {user_id} não encontrado."
+                continue
+        elif username:
+            if username not in usernames:
+                if len(usernames) >= MAX_USER_CACHE:
+                    usernames.clear()
+                usernames[username] = db_manager.get_user_id(username)
+            user_id = usernames[username]
+            if user_id is None:
+                yield line_no, record, f"Usuário '{username}' não encontrado."
+                continue
+        else:
+            yield line_no, record, "Linha sem username ou user_id."
+            continue
+
+        # 2. Valida data e números
+        missing = [field for field in LOG_FIELDS if record.get(field) in (None, '')]
+        if missing:
+            yield line_no, record, f"Campos ausentes: {', '.join(missing)}."
+            continue
+        try:
+            row = database_manager.normalize_log_row(*(record[field] for field in LOG_FIELDS))
+        except ValueError as e:
+            yield line_no, record, str(e)
+            continue
+
+        yield line_no, (user_id, *row), None
+
+
+def chunked(iterable, size):
+    """Agrupa os itens em listas de no máximo `size` elementos."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# --- ENTRADA PRINCIPAL ---
+
+def detect_format(path):
+    """Deduz o formato pelo nome do arquivo (padrão: CSV)."""
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def import_file(path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE, db_manager=None, rejected_path=None):
+    """
+    Importa o arquivo para o LogDiario em transações de `chunk_size` linhas.
+    Retorna um dicionário com o resumo: linhas lidas, importadas, rejeitadas,
+    tempo total, linhas/segundo e alguns exemplos de rejeição.
+    """
+    fmt = fmt or detect_format(path)
+    db_manager = db_manager or database_manager.DatabaseManager(pool_size=1)
+
+    summary = {
+        "lidas": 0,
+        "importadas": 0,
+        "rejeitadas": 0,
+        "exemplos_rejeitadas": [],
+    }
+
+    rejected_file = open(rejected_path, 'w', encoding='utf-8', newline='') if rejected_path else None
+    rejected_writer = csv.writer(rejected_file) if rejected_file else None
+    if rejected_writer:
+        rejected_writer.writerow(['linha', 'motivo', 'registro'])
+
+    def reject(line_no, record, reason):
+        summary["rejeitadas"] += 1
+        if len(summary["exemplos_rejeitadas"]) < MAX_REJECTED_SAMPLES:
+            summary["exemplos_rejeitadas"].append({"linha": line_no, "motivo": reason})
+        if rejected_writer:
+            rejected_writer.writerow([line_no, reason, json.dumps(record, ensure_ascii=False)])
+
+    start = time.perf_counter()
+    try:
+        pipeline = validate_records(read_records(path, fmt), db_manager)
+        for chunk in chunked(pipeline, chunk_size):
+            valid = []
+            valid_lines = []
+            for line_no, row, reason in chunk:
+                summary["lidas"] += 1
+                if reason:
+                    reject(line_no, row, reason)
+                else:
+                    valid.append(row)
+                    valid_lines.append(line_no)
+
+            if not valid:
+                continue
+            if db_manager.upsert_log_rows(valid):
+                summary["importadas"] += len(valid)
+            else:
+                for line_no, row in zip(valid_lines, valid):
+                    reject(line_no, row, "Falha ao gravar o lote no banco de dados.")
+    finally:
+        if rejected_file:
+            rejected_file.close()
+
+    elapsed = time.perf_counter() - start
+    summary["segundos"] = round(elapsed, 3)
+    summary["linhas_por_segundo"] = round(summary["lidas"] / elapsed, 1) if elapsed > 0 else 0.0
+    return summary
+
+
+def print_summary(summary):
+    """Exibe o resumo da importação no terminal."""
+    print("\n--- 📥 Resumo da Importação ---")
+    print(f"Linhas lidas: {summary['lidas']}")
+    print(f"✅ Importadas: {summary['importadas']}")
+    print(f"❌ Rejeitadas: {summary['rejeitadas']}")
+    print(f"⏱️ Tempo: {summary['segundos']:.2f}s ({summary['linhas_por_segundo']:.0f} linhas/s)")
+    if summary["exemplos_rejeitadas"]:
+        print("\nExemplos de linhas rejeitadas:")
+        for sample in summary["exemplos_rejeitadas"]:
+            print(f"  Linha {sample['linha']}: {sample['motivo']}")
+    print("-" * 50)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa logs diários históricos de um arquivo CSV ou JSONL.")
+    parser.add_argument('arquivo', help="Caminho do arquivo CSV ou JSONL")
+    parser.add_argument('--formato', choices=['csv', 'jsonl'], help="Formato do arquivo (padrão: deduzido pela extensão)")
+    parser.add_argument('--lote', type=int, default=DEFAULT_CHUNK_SIZE, help="Linhas por transação")
+    parser.add_argument('--db', default=database_manager.DB_FILE, help="Arquivo do banco SQLite")
+    parser.add_argument('--rejeitados', help="Grava as linhas rejeitadas (com o motivo) neste arquivo CSV")
+    args = parser.parse_args(argv)
+
+    if args.lote < 1:
+        parser.error("--lote deve ser pelo menos 1.")
+
+    db_manager = database_manager.DatabaseManager(args.db, pool_size=1)
+    try:
+        summary = import_file(args.arquivo, args.formato, args.lote, db_manager, args.rejeitados)
+    except OSError as e:
+        print(f"❌ Erro ao abrir o arquivo: {e}")
+        return 1
+    finally:
+        db_manager.close()
+
+    print_summary(summary)
+    return 0 if summary["importadas"] or not summary["lidas"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# instrumentation.py
+# Instrumentação opcional dos caminhos críticos: contagem de chamadas, histograma de latência,
+# linhas retornadas e tempo gasto no banco vs. em Python, por função.
+#
+# Desligada por padrão (o custo é um teste de booleano por chamada). Para ligar:
+#   - variável de ambiente DDL_INSTRUMENTACAO=1, ou
+#   - instrumentation.enable() (ex.: app.py --instrumentacao).
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# Limites superiores (ms) das faixas do histograma de latência; a última faixa é "acima de"
+HISTOGRAM_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+KIND_API = "api"  # Pontos de entrada do api_core
+KIND_DB = "db"    # Consultas do DatabaseManager
+
+_enabled = os.environ.get("DDL_INSTRUMENTACAO", "").lower() in ("1", "true", "sim")
+_lock = threading.Lock()
+_stats = {}
+_started_at = datetime.now()
+
+# Por thread: profundidade de chamadas ao banco e tempo de banco das chamadas de API em andamento
+_local = threading.local()
+
+
+def enable():
+    """Liga a instrumentação (os contadores anteriores são mantidos)."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Desliga a instrumentação."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Zera todos os contadores."""
+    global _started_at
+    with _lock:
+        _stats.clear()
+        _started_at = datetime.now()
+
+
+def _count_rows(result):
+    """Quantidade de linhas de um retorno típico (lista, página (lista, cursor) ou relatório)."""
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, dict) and isinstance(result.get("logs_diarios"), list):
+        return len(result["logs_diarios"])
+    return None
+
+
+def _new_entry(kind):
+    return {
+        "tipo": kind,
+        "chamadas": 0,
+        "erros": 0,
+        "tempo_total": 0.0,
+        "tempo_max": 0.0,
+        "tempo_db": 0.0,
+        "linhas": 0,
+        "histograma": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+    }
+
+
+def _record(name, kind, elapsed, db_time, rows, failed):
+    elapsed_ms = elapsed * 1000
+    bucket = len(HISTOGRAM_BUCKETS_MS)
+    for i, limit in enumerate(HISTOGRAM_BUCKETS_MS):
+        if elapsed_ms <= limit:
+            bucket = i
+            break
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = _new_entry(kind)
+        entry["chamadas"] += 1
+        entry["erros"] += failed
+        entry["tempo_total"] += elapsed
+        entry["tempo_db"] += db_time
+        if elapsed > entry["tempo_max"]:
+            entry["tempo_max"] = elapsed
+        if rows is not None:
+            entry["linhas"] += rows
+        entry["histograma"][bucket] += 1
+
+
+def instrumented(kind):
+    """
+    Decorador que mede a função quando a instrumentação está ligada.
+    - KIND_DB: o tempo da chamada conta como tempo de banco (só a mais externa, se aninhadas)
+      e é somado ao tempo de banco da chamada de API em andamento na thread.
+    - KIND_API: registra quanto do tempo total foi gasto no banco e quanto em Python.
+    """
+    def decorator(func):
+        name = f"{kind}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            if kind == KIND_DB:
+                depth = getattr(_local, "db_depth", 0)
+                _local.db_depth = depth + 1
+            else:
+                api_stack = getattr(_local, "api_db_time", None)
+                if api_stack is None:
+                    api_stack = _local.api_db_time = []
+                api_stack.append(0.0)
+
+            failed = False
+            result = None
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                return result
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                if kind == KIND_DB:
+                    _local.db_depth = depth
+                    db_time = elapsed
+                    # Só a chamada mais externa conta para a API (evita somar duas vezes)
+                    api_stack = getattr(_local, "api_db_time", None)
+                    if depth == 0 and api_stack:
+                        api_stack[-1] += elapsed
+                else:
+                    db_time = _local.api_db_time.pop()
+                    if _local.api_db_time:
+                        # API chamando API: o tempo de banco também é da chamada externa
+                        _local.api_db_time[-1] += db_time
+                _record(name, kind, elapsed, db_time, _count_rows(result), failed)
+
+        return wrapper
+    return decorator
+
+
+def _histogram_percentile(histogram, total, pct):
+    """Estimativa do percentil: limite superior da faixa do histograma que o contém."""
+    target = total * pct / 100
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if seen >= target and count:
+            return HISTOGRAM_BUCKETS_MS[i] if i < len(HISTOGRAM_BUCKETS_MS) else float("inf")
+    return 0.0
+
+
+def snapshot():
+    """Retorna um dicionário com os contadores atuais de cada função instrumentada."""
+    labels = [f"<={limit}ms" for limit in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+    with _lock:
+        entries = {name: dict(entry, histograma=list(entry["histograma"])) for name, entry in _stats.items()}
+        started_at = _started_at
+
+    functions = {}
+    for name, entry in sorted(entries.items()):
+        calls = entry["chamadas"]
+        total = entry["tempo_total"]
+        functions[name] = {
+            "tipo": entry["tipo"],
+            "chamadas": calls,
+            "erros": entry["erros"],
+            "tempo_total_ms": round(total * 1000, 3),
+            "media_ms": round(total / calls * 1000, 3) if calls else 0.0,
+            "max_ms": round(entry["tempo_max"] * 1000, 3),
+            "p50_ms": _histogram_percentile(entry["histograma"], calls, 50),
+            "p95_ms": _histogram_percentile(entry["histograma"], calls, 95),
+            "p99_ms": _histogram_percentile(entry["histograma"], calls, 99),
+            "tempo_db_ms": round(entry["tempo_db"] * 1000, 3),
+            "tempo_python_ms": round(max(total - entry["tempo_db"], 0.0) * 1000, 3),
+            "linhas": entry["linhas"],
+            "histograma": dict(zip(labels, entry["histograma"])),
+        }
+
+    return {
+        "habilitado": _enabled,
+        "desde": started_at.isoformat(timespec="seconds"),
+        "funcoes": functions,
+    }
+
+
+def dump(path=None):
+    """Grava o snapshot em JSON no arquivo `path` ou, sem caminho, retorna o JSON como texto."""
+    text = json.dumps(snapshot(), indent=2, ensure_ascii=False)
+    if path is None:
+        return text
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+def print_summary(snap=None):
+    """Exibe no terminal uma tabela resumida do snapshot."""
+    snap = snap or snapshot()
+    print("\n--- 📊 Instrumentação ---")
+    print(f"{'Função':<36}{'Chamadas':>9}{'Média ms':>10}{'p95 ms':>9}{'DB ms':>11}{'Python ms':>11}{'Linhas':>8}")
+    for name, stats in snap["funcoes"].items():
+        print(f"{name:<36}{stats['chamadas']:>9}{stats['media_ms']:>10.2f}{stats['p95_ms']:>9}"
+              f"{stats['tempo_db_ms']:>11.1f}{stats['tempo_python_ms']:>11.1f}{stats['linhas']:>8}")
+    print("-" * 94)
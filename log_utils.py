@@ -0,0 +1,152 @@
+# log_utils.py
+# Logging estruturado sem bloquear quem registra: os registros vão para uma fila em memória e
+# uma thread separada (QueueListener) faz a escrita em stderr.
+#
+# Configuração por variáveis de ambiente (ou configure_logging()):
+#   DDL_LOG_NIVEL       DEBUG | INFO | WARNING | ERROR   (padrão: INFO)
+#   DDL_LOG_AMOSTRAGEM  fração (0 a 1) das mensagens de sucesso por gravação exibidas (padrão: 1)
+#   DDL_LOG_FORMATO     texto | json                     (padrão: texto)
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+LOGGER_NAME = "ddl"
+
+# Limite da fila: se a escrita não acompanhar, os registros excedentes são descartados (e contados)
+LOG_QUEUE_SIZE = 10_000
+
+# Campos-padrão de um LogRecord; o que vier além disso (extra=...) vai para a saída estruturada
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "amostrado"}
+
+_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formata o registro como texto 'nível logger: mensagem campo=valor' ou como uma linha JSON."""
+
+    def __init__(self, fmt="texto"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record):
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+        if self.fmt == "json":
+            return json.dumps({
+                "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                "nivel": record.levelname,
+                "logger": record.name,
+                "msg": record.getMessage(),
+                **fields,
+            }, ensure_ascii=False, default=str)
+
+        text = f"{record.levelname} {record.name}: {record.getMessage()}"
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deixa passar só uma fração dos registros marcados com extra={"amostrado": True}
+    (as mensagens de sucesso repetidas a cada gravação); os demais passam sempre.
+    """
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        rate = min(max(float(rate), 0.0), 1.0)
+        self.rate = rate
+        self._every = round(1 / rate) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if not getattr(record, "amostrado", False):
+            return True
+        if not self._every:
+            return False
+        return next(self._counter) % self._every == 0
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que nunca espera: com a fila cheia, descarta o registro e conta o descarte."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level=None, sample_rate=None, fmt=None, stream=None):
+    """
+    (Re)configura o logger do projeto: nível, fração de amostragem das mensagens de sucesso
+    e formato. Sem argumentos, usa as variáveis de ambiente DDL_LOG_*.
+    """
+    global _listener, _queue_handler
+
+    level = (level or os.environ.get("DDL_LOG_NIVEL") or "INFO").upper()
+    sample_rate = sample_rate if sample_rate is not None else float(os.environ.get("DDL_LOG_AMOSTRAGEM", 1.0))
+    fmt = fmt or os.environ.get("DDL_LOG_FORMATO") or "texto"
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(StructuredFormatter(fmt))
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(SamplingFilter(sample_rate))
+
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.handlers = [_queue_handler]
+        logger.setLevel(level)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+
+
+def flush_logging():
+    """Espera a thread de escrita esvaziar a fila (ex.: antes de sair do programa)."""
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener.start()
+
+
+def _shutdown():
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+
+def dropped_records():
+    """Quantos registros foram descartados por fila cheia."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def get_logger(name):
+    """Logger de um módulo do projeto (ex.: get_logger('database')), configurado na primeira chamada."""
+    if _listener is None:
+        configure_logging()
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+atexit.register(_shutdown)
@@ -0,0 +1,160 @@
+# password_hashing.py
+# Hash de senhas com scrypt (hashlib) num pool dedicado de workers.
+#
+# Cada hash/verificação custa dezenas de milissegundos de CPU de propósito. Para que uma
+# rajada de logins (troca de turno) não trave o resto da aplicação, o trabalho roda num pool
+# com no máximo `workers` cálculos simultâneos: threads (o hashlib.scrypt libera o GIL
+# enquanto calcula) ou processos. Quem chama só espera o resultado.
+#
+# Formato gravado em Usuarios.password_hash:  scrypt$<n>$<r>$<p>$<salt base64>$<chave base64>
+# Qualquer valor fora desse formato é uma senha legada em texto puro; ela é aceita uma última
+# vez no login e regravada como hash (o mesmo vale para hashes com parâmetros antigos).
+import base64
+import hmac
+import hashlib
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+HASH_ALGORITHM = "scrypt"
+
+# Custo do scrypt: n (CPU/memória, potência de 2), r (tamanho do bloco) e p (paralelismo).
+# n=2**14, r=8 usa 16 MB e ~50 ms por hash num núcleo típico
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+SALT_SIZE = 16
+KEY_SIZE = 32
+
+HASH_POOL_THREAD = "thread"
+HASH_POOL_PROCESS = "process"
+
+# Cálculos simultâneos: no máximo metade dos núcleos, para sobrar CPU para os relatórios
+HASH_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+
+# Contexto dos processos do modo 'process': forkserver onde existe, senão spawn (um fork da
+# aplicação levaria junto conexões abertas e locks de outras threads)
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem: memória exata exigida pelos parâmetros (o padrão do OpenSSL é 32 MB) + folga
+    maxmem = 128 * r * (n + p + 2) + 1024 * 1024
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=KEY_SIZE)
+
+
+def _b64encode(raw):
+    return base64.b64encode(raw).decode("ascii")
+
+
+def parse_hash(stored):
+    """Retorna (n, r, p, salt, chave) de um hash no formato scrypt$..., ou None (senha legada)."""
+    parts = stored.split("$") if stored else ()
+    if len(parts) != 6 or parts[0] != HASH_ALGORITHM:
+        return None
+    try:
+        n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+        return n, r, p, base64.b64decode(parts[4]), base64.b64decode(parts[5])
+    except ValueError:
+        return None
+
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Calcula o hash (com salt aleatório) no formato gravado no banco. Roda no worker."""
+    salt = secrets.token_bytes(SALT_SIZE)
+    key = _scrypt(password, salt, n, r, p)
+    return f"{HASH_ALGORITHM}${n}${r}${p}${_b64encode(salt)}${_b64encode(key)}"
+
+
+def verify_password(password, stored):
+    """Confere a senha com o valor gravado (hash scrypt ou texto puro legado). Roda no worker."""
+    parsed = parse_hash(stored)
+    if parsed is None:
+        return hmac.compare_digest((stored or "").encode("utf-8"), password.encode("utf-8"))
+    n, r, p, salt, key = parsed
+    return hmac.compare_digest(_scrypt(password, salt, n, r, p), key)
+
+
+def _verify_and_rehash(password, stored, n, r, p):
+    """Verifica e, se a senha confere mas o valor gravado está desatualizado, já calcula o novo hash."""
+    if not verify_password(password, stored):
+        return False, None
+    parsed = parse_hash(stored)
+    if parsed is None or parsed[:3] != (n, r, p):
+        return True, hash_password(password, n, r, p)
+    return True, None
+
+
+class PasswordHasher:
+    """
+    Calcula e verifica hashes scrypt com o custo configurado, num pool dedicado
+    (modo 'thread' ou 'process') de até `workers` cálculos simultâneos.
+    """
+
+    def __init__(self, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, workers=HASH_WORKERS, mode=HASH_POOL_THREAD):
+        if n < 2 or n & (n - 1):
+            raise ValueError("O custo n do scrypt deve ser uma potência de 2 maior que 1.")
+        if r < 1 or p < 1:
+            raise ValueError("Os parâmetros r e p do scrypt devem ser pelo menos 1.")
+        if workers < 1:
+            raise ValueError("O pool de hash deve ter pelo menos 1 worker.")
+        if mode not in (HASH_POOL_THREAD, HASH_POOL_PROCESS):
+            raise ValueError(f"Modo de pool de hash inválido: {mode}")
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self.mode = mode
+        self._executor = None  # Criado no primeiro uso
+        self._dummy_hash = None
+        self._lock = threading.Lock()
+
+    def _submit(self, func, *args):
+        with self._lock:
+            if self._executor is None:
+                if self.mode == HASH_POOL_PROCESS:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_MP_CONTEXT)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ddl-hash")
+            executor = self._executor
+        return executor.submit(func, *args).result()
+
+    def hash(self, password):
+        """Hash da senha com os parâmetros atuais."""
+        return self._submit(hash_password, password, self.n, self.r, self.p)
+
+    def verify(self, password, stored):
+        """True se a senha confere com o valor gravado."""
+        return self._submit(verify_password, password, stored)
+
+    def verify_and_update(self, password, stored):
+        """
+        Verifica a senha e retorna (ok, novo_hash). novo_hash vem preenchido quando a senha
+        confere mas o valor gravado é legado (texto puro) ou tem outros parâmetros de custo.
+        """
+        return self._submit(_verify_and_rehash, password, stored, self.n, self.r, self.p)
+
+    def verify_dummy(self, password):
+        """
+        Faz uma verificação com o mesmo custo contra um hash descartável: usada quando o
+        usuário não existe, para que a resposta não revele (pelo tempo) quais usuários existem.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(secrets.token_urlsafe(16))
+        self.verify(password, self._dummy_hash)
+        return False
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+# Hasher compartilhado pelos DatabaseManager que não recebem um próprio
+DEFAULT_HASHER = PasswordHasher()
@@ -0,0 +1,91 @@
+# sessions.py
+# Tokens de sessão assinados (HMAC-SHA256), validados só em memória.
+#
+# Token: <user_id>.<expira_em>.<nonce>.<assinatura>
+# A assinatura cobre os três primeiros campos com o segredo do servidor, então validar um token
+# não consulta o banco: basta conferir o HMAC, a expiração e o registro de revogações.
+#
+# O segredo vem de DDL_SESSAO_SEGREDO. Sem ele, cada processo sorteia o seu: os tokens deixam de
+# valer ao reiniciar e não são aceitos por outros processos (defina a variável se houver vários).
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+from cache_utils import LRUCache
+
+SESSION_SECRET_ENV = "DDL_SESSAO_SEGREDO"
+
+# Validade de um token (segundos)
+SESSION_TTL = 12 * 60 * 60
+
+# Tokens revogados (logout) guardados até expirarem; o limite protege a memória
+REVOCATION_STORE_SIZE = 100_000
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+class SessionManager:
+    """
+    Emite e valida tokens de sessão assinados com HMAC.
+
+    `revoke(token)` invalida um token antes da expiração (logout). As revogações ficam num
+    cache LRU com TTL igual à validade dos tokens: depois disso o próprio token já expirou.
+    """
+
+    def __init__(self, secret=None, ttl=SESSION_TTL, revocation_size=REVOCATION_STORE_SIZE):
+        if ttl <= 0:
+            raise ValueError("A validade da sessão deve ser positiva.")
+        secret = secret or os.environ.get(SESSION_SECRET_ENV) or secrets.token_bytes(32)
+        self._secret = secret.encode("utf-8") if isinstance(secret, str) else secret
+        self.ttl = ttl
+        self._revoked = LRUCache(revocation_size, ttl=ttl)  # nonce -> True
+
+    def _sign(self, message):
+        return _b64(hmac.new(self._secret, message.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, user_id):
+        """Emite um token para o usuário, válido por `ttl` segundos."""
+        message = f"{int(user_id)}.{int(time.time()) + self.ttl}.{secrets.token_urlsafe(12)}"
+        return f"{message}.{self._sign(message)}"
+
+    def _parse(self, token):
+        """Retorna (user_id, expira_em, nonce) de um token com assinatura válida e não expirado, ou None."""
+        if not token or token.count(".") != 3:
+            return None
+        message, _, signature = token.rpartition(".")
+        if not hmac.compare_digest(self._sign(message), signature):
+            return None
+        user_id, expires_at, nonce = message.split(".")
+        try:
+            user_id, expires_at = int(user_id), int(expires_at)
+        except ValueError:
+            return None
+        if expires_at <= time.time():
+            return None
+        return user_id, expires_at, nonce
+
+    def validate(self, token):
+        """Retorna o user_id de um token válido (assinado, não expirado e não revogado), ou None."""
+        parsed = self._parse(token)
+        if parsed is None:
+            return None
+        user_id, _, nonce = parsed
+        if self._revoked.get(nonce):
+            return None
+        return user_id
+
+    def revoke(self, token):
+        """Revoga um token (logout). Retorna False se ele já não era válido."""
+        parsed = self._parse(token)
+        if parsed is None:
+            return False
+        self._revoked.put(parsed[2], True)
+        return True
+
+    def stats(self):
+        return {"revogados": len(self._revoked), "ttl": self.ttl}
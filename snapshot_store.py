@@ -0,0 +1,218 @@
+# snapshot_store.py
+# Cópia colunar em disco do histórico de cada usuário, lida por memory-map (NumPy), para que
+# relatórios e análises usem arrays direto do arquivo em vez de tuplas do sqlite3.
+#
+# Layout (um diretório por usuário):
+#   <diretorio>/<user_id>/meta.json              {"versao", "linhas", "geracao"}
+#   <diretorio>/<user_id>/<geracao>.<coluna>.bin  valores crus (dtype de SNAPSHOT_COLUMNS), em ordem de data
+#
+# A `versao` é a de DatabaseManager.get_data_stamp no momento da cópia; se o banco estiver em
+# outra versão (gravação por outro caminho ou processo), o snapshot é refeito na leitura.
+# Gravações conhecidas são aplicadas de forma incremental (apply_rows): dias novos no fim são
+# acrescentados nos arquivos atuais; alterações de dias existentes geram uma nova geração dos
+# arquivos, então quem já mapeou a anterior nunca vê uma linha pela metade. A geração anterior
+# à atual fica no disco, para quem acabou de ler a meta ainda conseguir mapeá-la.
+import json
+import os
+import threading
+
+import numpy as np
+
+from cache_utils import LRUCache
+from log_utils import get_logger
+
+logger = get_logger("snapshots")
+
+# Diretório dos snapshots; sem ele, os snapshots ficam desligados
+SNAPSHOT_DIR_ENV = "DDL_SNAPSHOTS"
+
+# Colunas gravadas e seus tipos, na ordem das tuplas de logs com métricas
+SNAPSHOT_COLUMNS = {
+    "data": "datetime64[D]",
+    "km": "float64",
+    "fat": "float64",
+    "horas": "float64",
+    "custo_comb": "float64",
+    "custo_fixo": "float64",
+    "lucro_liquido": "float64",
+}
+
+# Conjuntos de colunas mapeadas mantidos abertos
+SNAPSHOT_CACHE_SIZE = 256
+
+# Locks por faixa de user_id (refazer o snapshot de um usuário não bloqueia os demais)
+_LOCK_STRIPES = 64
+
+
+class SnapshotStore:
+    """
+    Snapshots colunares por usuário.
+
+    `stamp_loader(user_id)` devolve a versão atual dos dados no banco e `rows_loader(user_id)`
+    devolve (versao, logs) lidos juntos, com os logs em ordem de data no formato
+    (data, km, fat, horas, custo_comb, custo_fixo, lucro_liquido), todos com métricas.
+    """
+
+    def __init__(self, directory, stamp_loader, rows_loader, cache_size=SNAPSHOT_CACHE_SIZE):
+        self.directory = directory
+        self._stamp_loader = stamp_loader
+        self._rows_loader = rows_loader
+        self._mapped = LRUCache(cache_size)  # (user_id, geracao, linhas) -> colunas
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self.rebuilds = 0
+        self.appends = 0
+        self.rewrites = 0
+        os.makedirs(directory, exist_ok=True)
+
+    # --- ARQUIVOS ---
+
+    def _user_dir(self, user_id):
+        return os.path.join(self.directory, str(int(user_id)))
+
+    def _column_path(self, user_id, generation, column):
+        return os.path.join(self._user_dir(user_id), f"{generation}.{column}.bin")
+
+    def _read_meta(self, user_id):
+        try:
+            with open(os.path.join(self._user_dir(user_id), "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, user_id, meta):
+        # Troca atômica: quem lê vê a meta anterior ou a nova, nunca um arquivo pela metade
+        path = os.path.join(self._user_dir(user_id), "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def _write_generation(self, user_id, version, columns, previous=None):
+        """Grava as colunas numa geração nova, aponta a meta para ela e apaga a penúltima."""
+        os.makedirs(self._user_dir(user_id), exist_ok=True)
+        generation = previous["geracao"] + 1 if previous else 1
+        for column, dtype in SNAPSHOT_COLUMNS.items():
+            np.asarray(columns[column], dtype=dtype).tofile(self._column_path(user_id, generation, column))
+        meta = {"versao": version, "linhas": len(columns["data"]), "geracao": generation}
+        self._write_meta(user_id, meta)
+        if previous and previous["geracao"] > 1:
+            # A anterior fica para quem leu a meta antiga e ainda vai mapeá-la; quem já mapeou
+            # a penúltima continua lendo do arquivo aberto
+            for column in SNAPSHOT_COLUMNS:
+                try:
+                    os.remove(self._column_path(user_id, previous["geracao"] - 1, column))
+                except OSError:
+                    pass
+        return meta
+
+    def _map(self, user_id, meta):
+        key = (user_id, meta["geracao"], meta["linhas"])
+        columns = self._mapped.get(key)
+        if columns is None:
+            rows = meta["linhas"]
+            columns = {
+                column: np.memmap(self._column_path(user_id, meta["geracao"], column), dtype=dtype, mode="r", shape=(rows,))
+                if rows else np.empty(0, dtype=dtype)
+                for column, dtype in SNAPSHOT_COLUMNS.items()
+            }
+            self._mapped.put(key, columns)
+        return columns
+
+    # --- LEITURA ---
+
+    def _rebuild(self, user_id, previous):
+        version, logs = self._rows_loader(user_id)
+        if version is None:
+            return None
+        columns = dict(zip(SNAPSHOT_COLUMNS, zip(*logs))) if logs else {column: () for column in SNAPSHOT_COLUMNS}
+        self.rebuilds += 1
+        return self._write_generation(user_id, version, columns, previous)
+
+    def load(self, user_id):
+        """
+        Colunas do usuário (arrays somente leitura mapeados do disco, em ordem de data),
+        atualizadas com a versão atual do banco. Retorna None se o banco não puder ser lido.
+        """
+        meta = self._read_meta(user_id)
+        if meta is None or meta["versao"] != self._stamp_loader(user_id):
+            with self._locks[user_id % _LOCK_STRIPES]:
+                meta = self._read_meta(user_id)
+                if meta is None or meta["versao"] != self._stamp_loader(user_id):
+                    try:
+                        meta = self._rebuild(user_id, meta)
+                    except OSError as e:
+                        logger.error("Erro ao gravar o snapshot: %s", e)
+                        return None
+                    if meta is None:
+                        return None
+        try:
+            return self._map(user_id, meta)
+        except OSError:
+            pass
+        # A geração lida foi apagada por duas regravações seguidas antes do mapeamento: relê
+        # a meta sob o lock, quando nenhuma regravação pode acontecer
+        with self._locks[user_id % _LOCK_STRIPES]:
+            meta = self._read_meta(user_id)
+            if meta is None:
+                return None
+            try:
+                return self._map(user_id, meta)
+            except OSError as e:
+                logger.error("Erro ao ler o snapshot: %s", e)
+                return None
+
+    # --- ATUALIZAÇÃO INCREMENTAL ---
+
+    def apply_rows(self, user_id, version, rows):
+        """
+        Aplica no snapshot as linhas (data, km, fat, horas, custo_comb, custo_fixo, lucro_liquido)
+        que acabaram de ser gravadas e levaram o banco à versão `version`. Só vale se o snapshot
+        estava exatamente na versão anterior; caso contrário não faz nada (a próxima leitura
+        refaz o snapshot). Retorna True se aplicou.
+        """
+        with self._locks[user_id % _LOCK_STRIPES]:
+            meta = self._read_meta(user_id)
+            if meta is None or version is None or meta["versao"] != version - 1:
+                return False
+            rows = sorted({row[0]: row for row in rows}.values())  # Última linha de cada data
+            try:
+                new = {column: np.asarray(values, dtype=SNAPSHOT_COLUMNS[column]) for column, values in zip(SNAPSHOT_COLUMNS, zip(*rows))}
+            except (TypeError, ValueError):
+                return False
+            try:
+                current = self._map(user_id, meta)
+                if not meta["linhas"] or new["data"][0] > current["data"][-1]:
+                    self._append(user_id, meta, version, new)
+                else:
+                    self._merge(user_id, meta, version, current, new)
+            except OSError as e:
+                logger.error("Erro ao atualizar o snapshot: %s", e)
+                return False
+        return True
+
+    def _append(self, user_id, meta, version, new):
+        """Dias novos depois do último: acrescenta no fim dos arquivos da geração atual."""
+        for column, dtype in SNAPSHOT_COLUMNS.items():
+            offset = meta["linhas"] * np.dtype(dtype).itemsize
+            with open(self._column_path(user_id, meta["geracao"], column), "r+b" if offset else "wb") as f:
+                # Bytes além de `linhas` (gravação interrompida) são sobrescritos
+                f.seek(offset)
+                new[column].tofile(f)
+                f.truncate()
+        self._write_meta(user_id, {**meta, "versao": version, "linhas": meta["linhas"] + len(new["data"])})
+        self.appends += 1
+
+    def _merge(self, user_id, meta, version, current, new):
+        """Dias alterados ou no meio do histórico: monta as colunas novas numa nova geração."""
+        positions = np.searchsorted(current["data"], new["data"])
+        exists = positions < len(current["data"])
+        exists[exists] = current["data"][positions[exists]] == new["data"][exists]
+        columns = {}
+        for column in SNAPSHOT_COLUMNS:
+            values = np.array(current[column])
+            values[positions[exists]] = new[column][exists]
+            columns[column] = np.insert(values, positions[~exists], new[column][~exists])
+        self._write_generation(user_id, version, columns, meta)
+        self.rewrites += 1
+
+    def stats(self):
+        return {"refeitos": self.rebuilds, "acrescimos": self.appends, "regravacoes": self.rewrites, "mapeados": len(self._mapped)}
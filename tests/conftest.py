@@ -0,0 +1,32 @@
+# conftest.py
+# Os módulos do projeto ficam na raiz do repositório (sem pacote).
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import shutil
+
+import pytest
+
+import database_manager
+from analytics import AnalyticsManager
+from cache_utils import LRUCache
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """api_core ligado a um banco novo em `tmp_path` (com uma cópia do config.json), sem write-behind nem snapshots."""
+    shutil.copy(os.path.join(ROOT, "config.json"), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    import api_core
+
+    db = database_manager.DatabaseManager(db_file=str(tmp_path / "teste.db"), pool_size=2)
+    monkeypatch.setattr(api_core, "DB_MANAGER", db)
+    monkeypatch.setattr(api_core, "ANALYTICS_MANAGER", AnalyticsManager(history_loader=db.get_cost_history))
+    monkeypatch.setattr(api_core, "REPORT_CACHE", LRUCache(api_core.REPORT_CACHE_SIZE, ttl=api_core.REPORT_CACHE_TTL))
+    monkeypatch.setattr(api_core, "SNAPSHOTS", None)
+    monkeypatch.setattr(api_core, "WRITE_BEHIND", None)
+    yield api_core
+    db.close()
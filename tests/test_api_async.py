@@ -0,0 +1,61 @@
+# test_api_async.py
+import asyncio
+import threading
+
+import pytest
+
+import database_manager
+from api_async import BoundedExecutor
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = database_manager.DatabaseManager(db_file=str(tmp_path / "teste.db"), pool_size=1, pool_timeout=1.0)
+    yield db
+    db.close()
+
+
+def test_workers_usam_conexoes_exclusivas(db):
+    executor = BoundedExecutor(workers=2, db_manager=db)
+    barrier = threading.Barrier(2, timeout=5)
+
+    def hold_connection():
+        # Com o pool de 1 conexão, a segunda chamada esperaria a primeira devolver a dela
+        with db._connection() as conn:
+            barrier.wait()
+            return id(conn)
+
+    async def main():
+        return await asyncio.gather(executor.run(hold_connection), executor.run(hold_connection))
+
+    try:
+        first, second = asyncio.run(main())
+        assert first != second
+        assert db.pool_stats()["open_connections"] == 0
+    finally:
+        executor.shutdown()
+    assert not db._thread_connections
+
+
+def test_timeout_interrompe_a_consulta_do_worker(db):
+    executor = BoundedExecutor(workers=1, db_manager=db)
+    slow_query = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n"
+
+    def run_slow_query():
+        with db._connection() as conn:
+            return conn.execute(slow_query).fetchone()
+
+    def run_fast_query():
+        with db._connection() as conn:
+            return conn.execute("SELECT 1").fetchone()[0]
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(run_slow_query, timeout=0.2)
+        # O worker fica livre (a consulta foi interrompida) e a conexão continua utilizável
+        return await executor.run(run_fast_query, timeout=5)
+
+    try:
+        assert asyncio.run(main()) == 1
+    finally:
+        executor.shutdown()
@@ -0,0 +1,22 @@
+# test_connection_pool.py
+import sqlite3
+
+import pytest
+
+from database_manager import POOL_MODE_CHECKOUT, POOL_MODE_THREAD, ConnectionPool
+
+
+def _pool(mode):
+    return ConnectionPool(lambda: sqlite3.connect(":memory:", check_same_thread=False), size=2, mode=mode, timeout=1.0)
+
+
+@pytest.mark.parametrize("mode", [POOL_MODE_CHECKOUT, POOL_MODE_THREAD])
+def test_conexao_descartada_libera_a_vaga(mode):
+    pool = _pool(mode)
+    for _ in range(5):
+        pool.release(pool.acquire(), broken=True)
+    assert pool._open_count == 0
+    assert pool.stats()["open_connections"] == 0
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    pool.close_all()
@@ -0,0 +1,27 @@
+# test_cost_history.py
+DAYS = ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]
+
+
+def _stored_metrics(api, user_id):
+    """{data: (custo_comb, custo_fixo, lucro)} gravados no banco."""
+    return {log[0]: tuple(log[4:]) for log in api.DB_MANAGER.get_logs_by_user_range(user_id, with_metrics=True)}
+
+
+def test_novo_perfil_recalcula_so_a_partir_da_vigencia(api):
+    assert api.register_user_web("motorista", "senha-segura")
+    user_id = api.verify_login_web("motorista", "senha-segura")
+    assert api.update_config_web(10.0, 5.0, "GASOLINA", 350.0, user_id, vigente_desde="2024-01-01")
+    for data in DAYS:
+        assert api.upsert_log_web(user_id, data, 100.0, 300.0, 8.0) is not None
+    before = _stored_metrics(api, user_id)
+
+    assert api.update_config_web(20.0, 6.0, "GASOLINA", 700.0, user_id, vigente_desde="2024-01-03")
+    after = _stored_metrics(api, user_id)
+
+    for data in DAYS[:2]:
+        assert after[data] == before[data]
+    for data in DAYS[2:]:
+        # 100 km / 20 km/l * R$ 6,00 e R$ 700,00 / 7 por dia
+        assert after[data] == (30.0, 100.0, 170.0)
+    report = {row["data"]: row["lucro_liquido"] for row in api.get_report_web(user_id)["logs_diarios"]}
+    assert report == {data: stored[2] for data, stored in after.items()}
@@ -0,0 +1,81 @@
+# test_http_server.py
+import http.client
+import json
+import socket
+
+import pytest
+
+from cache_utils import LRUCache
+
+
+@pytest.fixture
+def server(api, monkeypatch):
+    import http_server
+    monkeypatch.setattr(http_server, "RESPONSE_CACHE", LRUCache(api.REPORT_CACHE_SIZE, ttl=api.REPORT_CACHE_TTL))
+    server = http_server.serve_in_thread("127.0.0.1", 0, workers=2)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def token(api):
+    assert api.register_user_web("motorista", "senha-segura")
+    return api.login_web("motorista", "senha-segura")["token"]
+
+
+def _request(server, method, path, body=None, token=None):
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        conn.request(method, path, body=None if body is None else json.dumps(body), headers=headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def _raw_request(server, content_length):
+    """Envia um POST com o Content-Length informado; retorna (status, a conexão foi fechada)."""
+    with socket.create_connection(server.server_address[:2], timeout=5) as sock:
+        sock.sendall(
+            b"POST /api/login HTTP/1.1\r\nHost: teste\r\nConnection: keep-alive\r\n"
+            b"Content-Length: " + content_length + b"\r\n\r\n"
+        )
+        response = http.client.HTTPResponse(sock)
+        response.begin()
+        response.read()
+        return response.status, response.will_close and sock.recv(1) == b""
+
+
+CONFIG = {"consumo": 10, "preco": 5, "tipo": "GASOLINA", "aluguel_semanal": 350}
+
+
+@pytest.mark.parametrize("content_length", [b"abc", b"-1"])
+def test_content_length_invalido_responde_400_e_fecha(server, content_length):
+    assert _raw_request(server, content_length) == (400, True)
+
+
+def test_vigente_desde_invalida_responde_400(server, token):
+    status, body = _request(server, "PUT", "/api/config", {**CONFIG, "vigente_desde": "2024-13-01"}, token)
+    assert status == 400
+    assert "vigente_desde" in body["erro"]
+
+
+def test_vigente_desde_gravada_normalizada(api, server, token):
+    status, _ = _request(server, "PUT", "/api/config", {**CONFIG, "vigente_desde": "20240103"}, token)
+    assert status == 200
+    user_id = api.authenticate_web(token)
+    assert [start for start, _ in api.DB_MANAGER.get_cost_history(user_id)] == ["2024-01-03"]
+
+
+def test_limite_dos_resumos_e_ajustado(api, server, token, monkeypatch):
+    limits = []
+    monkeypatch.setattr(api, "_rollup_rows", lambda user_id, table, limit, *args: limits.append(limit) or [])
+    for path in ("/api/relatorio/semanal", "/api/relatorio/mensal"):
+        for limite in ("0", "100000"):
+            status, _ = _request(server, "GET", f"{path}?limite={limite}", token=token)
+            assert status == 200
+    assert limits == [1, api.MAX_ROLLUP_PERIODS] * 2
@@ -0,0 +1,81 @@
+# test_snapshot_store.py
+import database_manager
+from snapshot_store import SnapshotStore
+
+USER_ID = 1
+
+
+def _row(data, km):
+    # (user_id, data, km, fat, hrs, custo_comb, custo_fixo, lucro)
+    return (USER_ID, data, km, 200.0, 8.0, 10.0, 5.0, 185.0)
+
+
+def _setup(tmp_path):
+    db = database_manager.DatabaseManager(db_file=str(tmp_path / "teste.db"))
+    snapshots = SnapshotStore(str(tmp_path / "snapshots"), db.get_data_stamp, db.get_logs_with_stamp)
+    return db, snapshots
+
+
+def test_versao_retornada_e_a_da_propria_gravacao(tmp_path):
+    db, _ = _setup(tmp_path)
+    first = db.upsert_log_rows_with_stamp([_row("2024-01-01", 100.0)])
+    second = db.upsert_log_rows_with_stamp([_row("2024-01-02", 120.0)])
+    assert second[USER_ID] == first[USER_ID] + 1
+    assert db.get_data_stamp(USER_ID) == second[USER_ID]
+
+
+def test_snapshot_nao_perde_gravacao_concorrente(tmp_path):
+    db, snapshots = _setup(tmp_path)
+    db.upsert_log_rows_with_stamp([_row("2024-01-01", 100.0)])
+    snapshots.load(USER_ID)
+
+    # A grava; o snapshot é refeito com A; B grava antes de A aplicar as suas linhas
+    row_a = _row("2024-01-02", 110.0)
+    version_a = db.upsert_log_rows_with_stamp([row_a])[USER_ID]
+    snapshots.load(USER_ID)
+    row_b = _row("2024-01-03", 130.0)
+    version_b = db.upsert_log_rows_with_stamp([row_b])[USER_ID]
+
+    # A chega atrasado: com a versão da sua transação, não pode marcar o snapshot como atual
+    assert not snapshots.apply_rows(USER_ID, version_a, [row_a[1:]])
+    assert snapshots.apply_rows(USER_ID, version_b, [row_b[1:]])
+
+    columns = snapshots.load(USER_ID)
+    assert [str(d) for d in columns["data"]] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert columns["km"].tolist() == [100.0, 110.0, 130.0]
+
+
+def test_load_refaz_o_snapshot_se_o_banco_mudou(tmp_path):
+    db, snapshots = _setup(tmp_path)
+    db.upsert_log_rows_with_stamp([_row("2024-01-01", 100.0)])
+    assert snapshots.load(USER_ID)["km"].tolist() == [100.0]
+    db.upsert_log_rows_with_stamp([_row("2024-01-01", 150.0)])
+    assert snapshots.load(USER_ID)["km"].tolist() == [150.0]
+
+
+def test_regravacao_mantem_a_geracao_anterior(tmp_path):
+    db, snapshots = _setup(tmp_path)
+    db.upsert_log_rows_with_stamp([_row("2024-01-01", 100.0), _row("2024-01-02", 100.0)])
+    snapshots.load(USER_ID)
+    for km in (110.0, 120.0):
+        row = _row("2024-01-01", km)
+        version = db.upsert_log_rows_with_stamp([row])[USER_ID]
+        assert snapshots.apply_rows(USER_ID, version, [row[1:]])
+
+    user_dir = tmp_path / "snapshots" / str(USER_ID)
+    assert not list(user_dir.glob("1.*.bin"))
+    assert len(list(user_dir.glob("2.*.bin"))) == len(list(user_dir.glob("3.*.bin"))) > 0
+
+
+def test_load_com_geracao_apagada_rele_a_meta(tmp_path, monkeypatch):
+    db, snapshots = _setup(tmp_path)
+    db.upsert_log_rows_with_stamp([_row("2024-01-01", 100.0)])
+    snapshots.load(USER_ID)
+    snapshots._mapped.clear()
+
+    # A primeira leitura da meta devolve uma geração que outra thread já apagou do disco
+    read_meta = snapshots._read_meta
+    stale = [{**read_meta(USER_ID), "geracao": 99}]
+    monkeypatch.setattr(snapshots, "_read_meta", lambda user_id: stale.pop() if stale else read_meta(user_id))
+
+    assert snapshots.load(USER_ID)["km"].tolist() == [100.0]
@@ -0,0 +1,82 @@
+# test_write_behind.py
+import threading
+import time
+
+from write_behind import WriteBehindQueue
+
+
+def _row(data, km, user_id=1):
+    return (user_id, data, km, 200.0, 8.0, 10.0, 5.0, 185.0)
+
+
+class FakeDatabase:
+    """apply_batch de teste: grava num dicionário, ou falha enquanto `failing` estiver ligado."""
+
+    def __init__(self, failing=False):
+        self.failing = failing
+        self.rows = {}
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def apply_batch(self, rows):
+        self.release.wait(5)
+        if self.failing:
+            return None
+        self.batches.append(rows)
+        for row in rows:
+            self.rows[(row[0], row[1])] = row
+        return {row[0]: len(self.batches) for row in rows}
+
+
+def _queue(tmp_path, db, **kwargs):
+    return WriteBehindQueue(str(tmp_path / "journal.log"), db.apply_batch, fsync=False, **kwargs)
+
+
+def test_flush_espera_a_gravacao_e_o_retorno(tmp_path):
+    db = FakeDatabase()
+    applied = []
+    queue = _queue(tmp_path, db, on_applied=lambda rows, result: applied.append((rows, result)))
+    queue.submit(_row("2024-01-01", 100.0))
+    queue.submit(_row("2024-01-01", 150.0))  # Mesmo dia: só a última vale
+    queue.submit(_row("2024-01-02", 120.0))
+
+    assert queue.flush(timeout=5)
+    assert db.rows[(1, "2024-01-01")][2] == 150.0
+    assert sum(len(rows) for rows, _ in applied) == 2
+    assert all(result for _, result in applied)
+    assert queue.stats()["pendentes"] == 0
+    assert queue.close()
+    assert (tmp_path / "journal.log").stat().st_size == 0
+
+
+def test_flush_com_timeout_retorna_false(tmp_path):
+    db = FakeDatabase()
+    db.release.clear()
+    queue = _queue(tmp_path, db)
+    queue.submit(_row("2024-01-01", 100.0))
+
+    assert not queue.flush(timeout=0.1)
+    db.release.set()
+    assert queue.flush(timeout=5)
+    assert queue.close()
+
+
+def test_close_com_banco_falhando_mantem_o_journal(tmp_path):
+    db = FakeDatabase(failing=True)
+    queue = _queue(tmp_path, db)
+    queue.submit(_row("2024-01-01", 100.0))
+
+    start = time.monotonic()
+    assert not queue.close(timeout=5)
+    assert time.monotonic() - start < 2
+    assert not queue.flush(timeout=5)
+
+    # No próximo início, o journal é reaplicado
+    db.failing = False
+    applied = []
+    queue = _queue(tmp_path, db, on_applied=lambda rows, result: applied.append(rows))
+    assert db.rows[(1, "2024-01-01")][2] == 100.0
+    assert applied == [[_row("2024-01-01", 100.0)]]
+    assert queue.stats()["reaplicadas"] == 1
+    assert queue.close()
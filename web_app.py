@@ -1,4 +1,5 @@
 # web_app.py
+import json
 import streamlit as st
 import pandas as pd
 from datetime import date
@@ -18,8 +19,16 @@ if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
 if 'user_id' not in st.session_state:
     st.session_state.user_id = None
+    st.session_state.session_token = None     # Token assinado emitido no login
 if 'page' not in st.session_state:
     st.session_state.page = 'login'
+if 'report_rows' not in st.session_state:
+    st.session_state.report_rows = []         # Páginas do relatório já carregadas
+    st.session_state.report_cursor = None     # Cursor (data) da próxima página
+    st.session_state.report_loaded = False
+    st.session_state.report_filter = (None, None)
+    st.session_state.report_version = None    # Versão dos dados das páginas carregadas
+    st.session_state.report_tables = {}       # DataFrames já montados, por chave
 
 
 # --- FUNÇÕES DE NAVEGAÇÃO ---
@@ -31,9 +40,12 @@ def navigate_to_app():
     st.session_state.page = 'register' # Começa na página de Registro
 
 def logout():
+    core.logout_web(st.session_state.session_token)
     st.session_state.logged_in = False
     st.session_state.user_id = None
+    st.session_state.session_token = None
     st.session_state.page = 'login'
+    reset_report_pages()
     st.rerun()
 
 
@@ -55,9 +67,10 @@ def render_login_page():
         login_submit = login_form.form_submit_button("Entrar no Sistema")
 
         if login_submit:
-            user_id = core.verify_login_web(login_username, login_password)
-            if user_id:
-                st.session_state.user_id = user_id
+            session = core.login_web(login_username, login_password)
+            if session:
+                st.session_state.user_id = session['user_id']
+                st.session_state.session_token = session['token']
                 navigate_to_app()
                 st.success(f"Login bem-sucedido! Bem-vindo(a), {login_username}!")
             else:
@@ -102,6 +115,7 @@ def render_register_log_page():
             )
             
             if metrics:
+                reset_report_pages() # O relatório precisa refletir o novo log
                 st.success(f"✅ Log do dia {data_log.strftime('%d/%m/%Y')} salvo e calculado!")
                 st.subheader("📊 Resumo e Análise do Dia")
                 
@@ -118,20 +132,76 @@ def render_register_log_page():
 
 
 # 3. PÁGINA DE RELATÓRIO
+def reset_report_pages():
+    """Descarta as páginas de logs já carregadas (ex: após salvar um log ou mudar o filtro)."""
+    st.session_state.report_rows = []
+    st.session_state.report_cursor = None
+    st.session_state.report_loaded = False
+    st.session_state.report_tables = {}
+
+def cached_dataframe(key, build):
+    """
+    Devolve o DataFrame guardado na sessão para `key` ou o monta com `build()`.
+    Reruns sem mudança nos dados (ex.: cliques na barra lateral) não remontam as tabelas.
+    """
+    tables = st.session_state.report_tables
+    if key not in tables:
+        tables[key] = build()
+    return tables[key]
+
+def period_dataframe(rows):
+    """Tabela de totais por semana/mês com os nomes das colunas em português."""
+    keys = ['periodo', 'dias', 'km', 'fat', 'horas', 'custo_comb', 'lucro_liquido', 'reais_por_km', 'reais_por_hora']
+    labels = ['Período', 'Dias', 'KM', 'Faturamento Bruto', 'Horas', 'Custo Combustível', 'Lucro Líquido', 'R$/KM', 'R$/Hora']
+    return pd.DataFrame(rows, columns=keys).set_axis(labels, axis=1)
+
+def export_file(fmt, start_date=None, end_date=None):
+    """
+    Monta os bytes da exportação para o botão de download (o st.download_button precisa do
+    conteúdo inteiro). Os logs são lidos lote a lote e só o texto final fica na memória.
+    """
+    return b''.join(chunk.encode('utf-8') for chunk in core.export_report_web(st.session_state.user_id, fmt, start_date, end_date))
+
+def load_next_report_page(start_date=None, end_date=None):
+    """Busca a próxima página (dias mais antigos) e acumula na sessão."""
+    page = core.get_report_page_web(
+        st.session_state.user_id,
+        cursor=st.session_state.report_cursor,
+        start_date=start_date,
+        end_date=end_date
+    )
+    st.session_state.report_rows.extend(page['logs_diarios'])
+    st.session_state.report_cursor = page['proximo_cursor']
+    st.session_state.report_loaded = True
+
 def render_full_report_page():
     st.header("📑 Relatório Completo de Logs")
-    
-    # Chama a função do nosso Backend
-    report = core.get_report_web(st.session_state.user_id)
-    
-    if not report['logs_diarios']:
+
+    # Filtro opcional de período
+    with st.expander("🗓️ Filtrar período"):
+        col_f1, col_f2 = st.columns(2)
+        start_date = col_f1.date_input("De", value=None, key='report_start')
+        end_date = col_f2.date_input("Até", value=None, key='report_end')
+    start_date = start_date.isoformat() if start_date else None
+    end_date = end_date.isoformat() if end_date else None
+
+    # Mudou o filtro ou os dados (log/configuração salvos, inclusive em outra sessão):
+    # recomeça a paginação do dia mais recente
+    version = core.get_data_version(st.session_state.user_id)
+    if st.session_state.report_filter != (start_date, end_date) or st.session_state.report_version != version:
+        st.session_state.report_filter = (start_date, end_date)
+        st.session_state.report_version = version
+        reset_report_pages()
+
+    # Chama a função do nosso Backend (apenas os totais agregados; em cache até os dados mudarem)
+    geral = core.get_report_summary_web(st.session_state.user_id, start_date, end_date)
+
+    if not geral:
         st.info("Nenhum registro de log encontrado. Comece registrando seu primeiro dia!")
         return
 
     st.subheader("📈 Totais e Médias Gerais")
-    
-    geral = report['geral']
-    
+
     # Exibe os totais com formatação
     col_g1, col_g2, col_g3 = st.columns(3)
     col_g1.metric("Dias Registrados", geral['total_dias'])
@@ -141,7 +211,7 @@ def render_full_report_page():
     col_c1, col_c2, col_c3 = st.columns(3)
     col_c1.metric("Custo Comb. Total", f"R$ {geral['custo_total_estimado']:.2f}")
     col_c2.metric("Custo Fixo Total", f"R$ {geral['custo_fixo_total']:.2f}")
-    
+
     # Destaque para o Lucro Líquido
     col_c3.metric("LUCRO LÍQUIDO TOTAL", f"R$ {geral['total_lucro_liquido']:.2f}")
 
@@ -152,16 +222,71 @@ def render_full_report_page():
     col_m1.metric("R$/KM Médio GERAL (Bruto)", f"R$ {geral['reais_por_km_medio']:.2f}")
     col_m2.metric("R$/HORA Média GERAL (Bruta)", f"R$ {geral['reais_por_hora_medio']:.2f}")
 
+    # Totais por semana e por mês (tabelas de rollup, sem somar os dias)
+    st.markdown("---")
+    st.subheader("Resumo por Período")
+    tab_week, tab_month = st.tabs(["Semanal", "Mensal"])
+    with tab_week:
+        weeks = cached_dataframe('semanal', lambda: period_dataframe(core.get_weekly_summary_web(st.session_state.user_id, limit=12)))
+        st.dataframe(weeks, use_container_width=True)
+    with tab_month:
+        months = cached_dataframe('mensal', lambda: period_dataframe(core.get_monthly_summary_web(st.session_state.user_id, limit=12)))
+        st.dataframe(months, use_container_width=True)
+
+
+    # Médias móveis de 7/30 dias e distribuição dos valores diários
+    st.markdown("---")
+    st.subheader("Médias Móveis")
+    rolling = core.get_rolling_stats_web(st.session_state.user_id, start_date, end_date)
+    if rolling:
+        latest = rolling['dias'][-1]
+        col_r1, col_r2, col_r3 = st.columns(3)
+        col_r1.metric("R$/KM (7 dias)", f"R$ {latest['reais_por_km_7d']:.2f}", f"30 dias: R$ {latest['reais_por_km_30d']:.2f}", delta_color="off")
+        col_r2.metric("R$/HORA (7 dias)", f"R$ {latest['reais_por_hora_7d']:.2f}", f"30 dias: R$ {latest['reais_por_hora_30d']:.2f}", delta_color="off")
+        col_r3.metric("Lucro Líquido (7 dias)", f"R$ {latest['lucro_liquido_7d']:.2f}", f"30 dias: R$ {latest['lucro_liquido_30d']:.2f}", delta_color="off")
+
+        faturamento, lucro = rolling['percentis']['faturamento'], rolling['percentis']['lucro_liquido']
+        col_p1, col_p2, col_p3, col_p4 = st.columns(4)
+        col_p1.metric("Faturamento Diário (mediana)", f"R$ {faturamento['p50']:.2f}")
+        col_p2.metric("Faturamento Diário (p90)", f"R$ {faturamento['p90']:.2f}")
+        col_p3.metric("Lucro Diário (mediana)", f"R$ {lucro['p50']:.2f}")
+        col_p4.metric("Lucro Diário (p90)", f"R$ {lucro['p90']:.2f}")
+
+        chart = cached_dataframe('moveis', lambda: pd.DataFrame(rolling['dias']).set_index('data')[
+            ['lucro_liquido_7d', 'lucro_liquido_30d']
+        ].set_axis(['Lucro Líquido (7 dias)', 'Lucro Líquido (30 dias)'], axis=1))
+        st.line_chart(chart)
 
     st.markdown("---")
     st.subheader("Detalhes Diários")
-    
-    # Cria um DataFrame do Pandas para exibir a tabela bonita
-    df = pd.DataFrame(report['logs_diarios'])
-    # Renomeia colunas para o português
-    df.columns = ['Data', 'KM', 'Faturamento Bruto', 'Custo Combustível', 'Lucro Líquido', 'Horas']
-    
+
+    # Carrega apenas a página mais recente; as mais antigas vêm sob demanda
+    if not st.session_state.report_loaded:
+        load_next_report_page(start_date, end_date)
+
+    # Cria um DataFrame do Pandas para exibir a tabela bonita (remontado só quando chega uma página nova)
+    def build_daily_table():
+        df = pd.DataFrame(st.session_state.report_rows)
+        # Renomeia colunas para o português
+        df.columns = ['Data', 'KM', 'Faturamento Bruto', 'Custo Combustível', 'Lucro Líquido', 'Horas']
+        return df
+    df = cached_dataframe(('diario', len(st.session_state.report_rows)), build_daily_table)
+
     st.dataframe(df, use_container_width=True)
+    st.caption(f"Exibindo {len(df)} de {geral['total_dias']} dias.")
+
+    if st.session_state.report_cursor:
+        st.button("⬇️ Carregar dias anteriores", on_click=load_next_report_page, args=[start_date, end_date])
+
+    # Exportação do histórico do período (todos os dias, não só as páginas carregadas)
+    st.markdown("---")
+    st.subheader("💾 Exportar Histórico")
+    col_e1, col_e2 = st.columns(2)
+    fmt = col_e1.selectbox("Formato", core.EXPORT_FORMATS, format_func=str.upper)
+    if col_e2.button("Preparar arquivo"):
+        mime = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        st.download_button(f"⬇️ Baixar {fmt.upper()}", export_file(fmt, start_date, end_date),
+                           file_name=f"historico.{fmt}", mime=mime)
 
 
 # 4. PÁGINA DE CONFIGURAÇÕES
@@ -193,11 +318,15 @@ def render_config_page():
 
         st.markdown("#### 💸 Custo Fixo Semanal")
         new_aluguel_semanal = st.number_input("Custo Fixo SEMANAL (Aluguel, Taxas, etc.) - Digite 0 se for carro próprio.", min_value=0.0, value=current_config['fixo_semanal'], format="%.2f", step=1.0)
+
+        st.markdown("#### 🗓️ Vigência")
+        vigente_desde = st.date_input("Valores válidos a partir de (os dias anteriores mantêm os custos da época)", value=date.today())
         
         submitted = st.form_submit_button("Salvar Configurações")
         
         if submitted:
-            if core.update_config_web(new_consumo, new_preco, new_tipo, new_aluguel_semanal):
+            if core.update_config_web(new_consumo, new_preco, new_tipo, new_aluguel_semanal, st.session_state.user_id, vigente_desde.isoformat()):
+                reset_report_pages() # Os dias a partir da vigência foram recalculados
                 st.success(f"✅ Configurações atualizadas! Custo Diário Calculado: R$ {new_aluguel_semanal/7:.2f}")
                 st.session_state.page = 'config' # Força recarregar a página para mostrar os novos valores
                 st.rerun()
@@ -205,10 +334,84 @@ def render_config_page():
                 st.error("❌ Falha ao salvar as configurações.")
 
 
+# 5. PÁGINA DE DIAGNÓSTICO (só aparece com a instrumentação ligada: DDL_INSTRUMENTACAO=1)
+def render_diagnostics_page():
+    st.header("📊 Diagnóstico de Desempenho")
+
+    snapshot = core.get_instrumentation_snapshot()
+    st.caption(f"Contadores desde {snapshot['desde']}.")
+
+    pool = core.get_db_pool_stats()
+    if pool:
+        col_p1, col_p2, col_p3, col_p4 = st.columns(4)
+        col_p1.metric("Conexões abertas", pool['open_connections'])
+        col_p2.metric("Em uso", pool['in_use'])
+        col_p3.metric("Esperas no pool", pool['waits'])
+        col_p4.metric("Espera média", f"{pool['wait_time_avg'] * 1000:.1f} ms")
+
+    cache = core.get_report_cache_stats()
+    col_r1, col_r2, col_r3 = st.columns(3)
+    col_r1.metric("Relatórios em cache", f"{cache['size']} / {cache['maxsize']}")
+    col_r2.metric("Hits do cache", cache['hits'])
+    col_r3.metric("Misses do cache", cache['misses'])
+
+    snapshots = core.get_snapshot_stats()
+    if snapshots:
+        col_s1, col_s2, col_s3 = st.columns(3)
+        col_s1.metric("Snapshots refeitos", snapshots['refeitos'])
+        col_s2.metric("Dias acrescentados", snapshots['acrescimos'])
+        col_s3.metric("Snapshots regravados", snapshots['regravacoes'])
+
+    writes = core.get_write_behind_stats()
+    if writes:
+        col_w1, col_w2, col_w3, col_w4 = st.columns(4)
+        col_w1.metric("Logs no journal", writes['pendentes'])
+        col_w2.metric("Logs coalescidos", writes['coalescidas'])
+        col_w3.metric("Lotes gravados", writes['lotes'])
+        col_w4.metric("Falhas de gravação", writes['falhas'])
+
+    if not snapshot['funcoes']:
+        st.info("Nenhuma chamada registrada ainda.")
+        return
+
+    rows = [
+        {
+            "Função": name,
+            "Chamadas": stats['chamadas'],
+            "Erros": stats['erros'],
+            "Média (ms)": stats['media_ms'],
+            "p95 (ms)": stats['p95_ms'],
+            "Máx (ms)": stats['max_ms'],
+            "Banco (ms)": stats['tempo_db_ms'],
+            "Python (ms)": stats['tempo_python_ms'],
+            "Linhas": stats['linhas'],
+        }
+        for name, stats in snapshot['funcoes'].items()
+    ]
+    st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+    with st.expander("Histogramas de latência"):
+        histograms = {name: stats['histograma'] for name, stats in snapshot['funcoes'].items()}
+        st.dataframe(pd.DataFrame(histograms).T, use_container_width=True)
+
+    col_b1, col_b2 = st.columns(2)
+    col_b1.download_button("⬇️ Baixar JSON", json.dumps(snapshot, indent=2, ensure_ascii=False),
+                           file_name="instrumentacao.json", mime="application/json")
+    col_b2.button("🔄 Zerar contadores", on_click=core.reset_instrumentation)
+
+
 # --- FUNÇÃO PRINCIPAL ---
 def main_web_app():
     """Gerencia a navegação e o layout do aplicativo."""
 
+    # A cada rerun o token da sessão é conferido em memória (sem consultar o banco):
+    # expirado ou revogado, volta para o login
+    if st.session_state.logged_in and core.authenticate_web(st.session_state.session_token) != st.session_state.user_id:
+        st.session_state.logged_in = False
+        st.session_state.user_id = None
+        st.session_state.session_token = None
+        st.warning("Sua sessão expirou. Entre novamente.")
+
     # Se não estiver logado, sempre mostra o login
     if not st.session_state.logged_in:
         render_login_page()
@@ -220,6 +423,8 @@ def main_web_app():
         st.button("📝 Novo Log", on_click=set_page, args=['register'])
         st.button("📑 Relatório Geral", on_click=set_page, args=['report'])
         st.button("⚙️ Configurações", on_click=set_page, args=['config'])
+        if core.get_instrumentation_snapshot()['habilitado']:
+            st.button("📊 Diagnóstico", on_click=set_page, args=['diagnostics'])
         st.markdown("---")
         st.button("❌ Logout", on_click=logout)
         st.markdown("---")
@@ -232,6 +437,8 @@ def main_web_app():
         render_full_report_page()
     elif st.session_state.page == 'config':
         render_config_page()
+    elif st.session_state.page == 'diagnostics':
+        render_diagnostics_page()
     else:
         render_register_log_page() # Default
 
@@ -0,0 +1,243 @@
+# write_behind.py
+# Gravação assíncrona (write-behind) dos logs diários com journal durável.
+#
+# submit() acrescenta a linha num journal em disco (append + fsync) e retorna na hora; uma
+# thread gravadora junta as linhas pendentes, mantendo só a última de cada (user_id, data), e
+# grava tudo no banco numa única transação (group commit). Quando não sobra nada pendente, o
+# journal é zerado. Se o processo cair antes disso, o journal é reaplicado ao iniciar.
+#
+# Um journal deve ser usado por um único processo.
+import json
+import os
+import threading
+import time
+
+from log_utils import get_logger
+
+logger = get_logger("write_behind")
+
+# Variável de ambiente com o caminho do journal; sem ela, as gravações são síncronas
+WRITE_BEHIND_ENV = "DDL_WRITE_BEHIND"
+
+# Espera máxima (s) da thread gravadora antes de gravar o que estiver pendente
+FLUSH_INTERVAL = 0.05
+
+# Linhas por transação
+MAX_BATCH = 1000
+
+# Espera (s) antes de tentar de novo um lote que falhou
+RETRY_DELAY = 1.0
+
+# Espera máxima (s) de close() pela gravação do que estiver pendente; o que sobrar fica no
+# journal e é reaplicado ao iniciar
+CLOSE_TIMEOUT = 10.0
+
+
+class WriteBehindQueue:
+    """
+    Fila de gravação com journal. `apply_batch(rows)` grava as linhas completas
+    (user_id, data, km, fat, hrs, custo_comb, custo_fixo, lucro) numa transação e retorna um
+    resultado verdadeiro se gravou (ou None/False se falhou); `on_applied(rows, resultado)`
+    (opcional) é chamada depois de cada lote gravado, com o resultado da gravação.
+    """
+
+    def __init__(self, journal_path, apply_batch, on_applied=None, flush_interval=FLUSH_INTERVAL,
+                 max_batch=MAX_BATCH, fsync=True):
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self._apply_batch = apply_batch
+        self._on_applied = on_applied
+        self._pending = {}         # (user_id, data) -> (seq, linha)
+        self._in_flight = 0        # Linhas do lote sendo gravado
+        self._seq = 0              # Última sequência escrita no journal
+        self._applied_seq = 0      # Maior sequência já gravada no banco
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._flush_waiters = 0    # Chamadas de flush() esperando: a thread não espera juntar mais linhas
+        self.submitted = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.replayed = 0
+
+        self._recover()
+        self._journal = open(journal_path, "ab")
+        self._writer = threading.Thread(target=self._run, name="ddl-write-behind", daemon=True)
+        self._writer.start()
+
+    # --- JOURNAL ---
+
+    def _recover(self):
+        """Reaplica as linhas de um journal deixado por uma execução interrompida."""
+        if not os.path.exists(self.journal_path):
+            return
+        entries = {}
+        with open(self.journal_path, "rb") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    seq, *row = json.loads(line)
+                except ValueError:
+                    # Última linha pela metade (queda durante a escrita): nunca foi confirmada
+                    logger.warning("Linha inválida ignorada no journal.", extra={"linha": number})
+                    continue
+                self._seq = max(self._seq, seq)
+                entries[(row[0], row[1])] = (seq, tuple(row))
+        if not entries:
+            return
+
+        rows = [row for _, row in sorted(entries.values())]
+        result = self._apply_batch(rows)
+        if result:
+            self._applied_seq = self._seq
+            self._notify_applied(rows, result)
+            os.truncate(self.journal_path, 0)
+        else:
+            # O banco não aceitou agora: a thread gravadora tenta de novo
+            self._pending = entries
+        self.replayed = len(rows)
+        logger.info("Journal reaplicado.", extra={"linhas": len(rows)})
+
+    def submit(self, row):
+        """Registra a linha no journal (durável ao retornar) e a deixa pendente para a thread gravadora."""
+        row = tuple(row)
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("A fila de gravação foi encerrada.")
+            self._seq += 1
+            self._journal.write(json.dumps([self._seq, *row], separators=(",", ":")).encode("utf-8") + b"\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            key = (row[0], row[1])
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = (self._seq, row)
+            self.submitted += 1
+            self._cond.notify_all()
+
+    # --- THREAD GRAVADORA ---
+
+    def _take_batch(self):
+        batch = {}
+        for key in list(self._pending)[:self.max_batch]:
+            batch[key] = self._pending.pop(key)
+        self._in_flight = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending and self._stopping:
+                    self._cond.notify_all()
+                    return
+                # Pequena espera para juntar mais linhas no mesmo commit
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and not self._flush_waiters and len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+
+            entries = sorted(batch.values())
+            rows = [row for _, row in entries]
+            result = self._apply_batch(rows)
+            ok = bool(result)
+            if ok:
+                # Ainda com o lote em andamento: quando flush() retorna, o retorno já rodou
+                self._notify_applied(rows, result)
+
+            with self._cond:
+                self._in_flight = 0
+                if ok:
+                    self.batches += 1
+                    self.rows_written += len(rows)
+                    self._applied_seq = max(self._applied_seq, entries[-1][0])
+                    if not self._pending and self._applied_seq == self._seq and not self._journal.closed:
+                        # Tudo o que está no journal já está no banco
+                        self._journal.truncate(0)
+                else:
+                    self.failures += 1
+                    for key, entry in batch.items():
+                        # Uma versão mais nova enviada enquanto o lote gravava tem prioridade
+                        if key not in self._pending:
+                            self._pending[key] = entry
+                self._cond.notify_all()
+
+            if ok:
+                continue
+            with self._cond:
+                if self._stopping:
+                    # Encerrando: não insiste; as linhas continuam no journal para o próximo início
+                    logger.error("Falha ao gravar lote do write-behind; linhas mantidas no journal.", extra={"linhas": len(self._pending)})
+                    self._cond.notify_all()
+                    return
+                logger.error("Falha ao gravar lote do write-behind; nova tentativa em breve.", extra={"linhas": len(rows)})
+                retry_at = time.monotonic() + RETRY_DELAY
+                while not self._stopping and time.monotonic() < retry_at:
+                    self._cond.wait(retry_at - time.monotonic())
+
+    def _notify_applied(self, rows, result):
+        if self._on_applied is None:
+            return
+        try:
+            self._on_applied(rows, result)
+        except Exception:
+            logger.exception("Erro no retorno de lote gravado do write-behind.")
+
+    # --- CONTROLE ---
+
+    def flush(self, timeout=None):
+        """
+        Espera até que tudo o que foi enviado esteja gravado no banco. Retorna False se o timeout
+        estourar ou se a fila foi encerrada com linhas ainda não gravadas.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                while self._pending or self._in_flight:
+                    if self._stopping and not self._writer.is_alive():
+                        return False
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flush_waiters -= 1
+        return True
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """
+        Tenta gravar o que estiver pendente (uma vez, sem novas tentativas se o banco falhar) e
+        encerra a thread gravadora, esperando no máximo `timeout` segundos. Retorna True se
+        nada ficou pendente; o que não foi gravado continua no journal.
+        """
+        with self._cond:
+            if self._stopping:
+                return not (self._pending or self._in_flight)
+            self._stopping = True
+            self._cond.notify_all()
+        self._writer.join(timeout)
+        with self._cond:
+            if not self._writer.is_alive():
+                self._journal.close()
+            return not (self._pending or self._in_flight)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enviadas": self.submitted,
+                "coalescidas": self.coalesced,
+                "pendentes": len(self._pending) + self._in_flight,
+                "lotes": self.batches,
+                "linhas_gravadas": self.rows_written,
+                "falhas": self.failures,
+                "reaplicadas": self.replayed,
+            }